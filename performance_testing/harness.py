@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+""" Micro-benchmark harness shared by the performance_testing scripts
+
+The scripts register their variants as cases of a group. Every case is a function that processes
+a whole input (created by the case's setup function, outside the timing), so a trial does not
+include a function call per element. A case is run a number of warmup times, then timed over
+repeated trials. Its peak memory is measured in a separate run with tracemalloc.
+
+Usage:
+    python harness.py list
+    python harness.py run [--group square_number] [-n 1000000] [--repeats 5] [--output results.json]
+    python harness.py compare base.json new.json [--tolerance 0.1]
+"""
+import argparse
+import gc
+import importlib
+import json
+import platform
+import statistics
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+# The scripts whose cases are registered when the harness is run from the command line
+MODULES = ('square_number', 'square_root_number', 'list_initialisation', 'sorting')
+
+CASES = {}  # group name -> list of cases
+
+
+class Case:
+    """ A benchmark variant: fun(setup(n)) is timed """
+
+    def __init__(self, group, name, fun, setup, n):
+        self.group = group
+        self.name = name
+        self.fun = fun
+        self.setup = setup
+        self.n = n
+
+
+def case(group, setup=None, n=10 ** 6, name=None):
+    """ Decorator that registers a function as a case of a group
+
+    :param group: the group of cases that are compared with each other
+    :type group: str
+    :param setup: creates the input of the function from the problem size, defaults to the size itself
+    :type setup: callable
+    :param n: the default problem size
+    :type n: int
+    :param name: the name of the case, defaults to the function name
+    :type name: str
+    """
+    def register(fun):
+        CASES.setdefault(group, []).append(Case(group, name or fun.__name__, fun, setup or (lambda size: size), n))
+        return fun
+    return register
+
+
+def run_case(c, n=None, warmup=1, repeats=5):
+    """ Runs a case and returns its timing statistics (in seconds) and peak memory (in bytes)
+
+    :param c: the case to run
+    :type c: Case
+    :param n: the problem size, defaults to the case's size
+    :type n: int
+    :param warmup: the number of untimed runs
+    :type warmup: int
+    :param repeats: the number of timed trials
+    :type repeats: int
+    :rtype: dict
+    """
+    n = c.n if n is None else n
+    data = c.setup(n)
+    for _ in range(0, warmup):
+        c.fun(data)
+
+    times = []
+    gc_enabled = gc.isenabled()
+    gc.disable()  # no collections in the middle of a trial
+    try:
+        for _ in range(0, repeats):
+            start = perf_counter()
+            c.fun(data)
+            times.append(perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    c.fun(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'group': c.group,
+        'name': c.name,
+        'n': n,
+        'repeats': repeats,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'stdev': statistics.stdev(times) if repeats > 1 else 0.0,
+        'ns_per_item': 1e9 * statistics.median(times) / n,
+        'peak_memory': peak,
+    }
+
+
+def run_cases(groups=None, n=None, warmup=1, repeats=5):
+    """ Runs the cases of the given groups (all groups if None) and returns their results """
+    groups = list(CASES) if groups is None else groups
+    return [run_case(c, n, warmup, repeats) for group in groups for c in CASES[group]]
+
+
+def print_results(results):
+    """ Prints the results of every group, with the speed relative to the group's slowest case. The speed is
+    compared per item, since the cases of a group can run with different problem sizes """
+    print(f"{'group':>20} {'case':>24} {'n':>10} {'median (s)':>11} {'stdev (s)':>10} {'ns/item':>9} "
+          f"{'peak (MB)':>10} {'speedup':>8}")
+    slowest = {}
+    for r in results:
+        slowest[r['group']] = max(slowest.get(r['group'], 0), r['ns_per_item'])
+    for r in results:
+        speedup = slowest[r['group']] / r['ns_per_item']
+        print(f"{r['group']:>20} {r['name']:>24} {r['n']:>10} {r['median']:>11.5f} {r['stdev']:>10.5f} "
+              f"{r['ns_per_item']:>9.2f} {r['peak_memory'] / 2 ** 20:>10.2f} {speedup:>8.1f}")
+
+
+def save_results(path, results):
+    """ Saves the results, together with the versions they were measured with, as JSON """
+    metadata = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                'processor': platform.processor(), 'system': platform.platform()}
+    with open(path, 'w') as file:
+        json.dump({'metadata': metadata, 'results': results}, file, indent=1)
+
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def compare(base, new, tolerance=0.1):
+    """ Compares the median times of the cases that two result lists have in common
+
+    :param base: the reference results
+    :type base: list[dict]
+    :param new: the results to check
+    :type new: list[dict]
+    :param tolerance: the relative slowdown that is still accepted
+    :type tolerance: float
+    :return: (group, name, n, base median, new median, ratio, regression) of every common case
+    :rtype: list[tuple]
+    """
+    reference = {(r['group'], r['name'], r['n']): r for r in base}
+    comparison = []
+    for r in new:
+        key = (r['group'], r['name'], r['n'])
+        if key in reference:
+            ratio = r['median'] / reference[key]['median']
+            comparison.append(key + (reference[key]['median'], r['median'], ratio, ratio > 1 + tolerance))
+    return comparison
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="lists the registered cases")
+    run = commands.add_parser('run', help="runs the cases")
+    run.add_argument('--group', action='append', help="group to run (repeatable), all groups by default")
+    run.add_argument('-n', type=int, help="problem size, overrides the size of every case")
+    run.add_argument('--warmup', type=int, default=1)
+    run.add_argument('--repeats', type=int, default=5)
+    run.add_argument('--output', help="JSON file for the results")
+    diff = commands.add_parser('compare', help="flags the cases that became slower than in a reference file")
+    diff.add_argument('base')
+    diff.add_argument('new')
+    diff.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(args)
+
+    for module in MODULES:
+        importlib.import_module(module)
+
+    if args.command == 'list':
+        for group, cases in CASES.items():
+            print(f"{group}: {', '.join(c.name for c in cases)}")
+    elif args.command == 'run':
+        results = run_cases(args.group, args.n, args.warmup, args.repeats)
+        print_results(results)
+        if args.output:
+            save_results(args.output, results)
+    else:
+        comparison = compare(load_results(args.base), load_results(args.new), args.tolerance)
+        print(f"{'group':>20} {'case':>24} {'n':>10} {'base (s)':>10} {'new (s)':>10} {'ratio':>6}")
+        for group, name, n, base, new, ratio, regression in comparison:
+            print(f"{group:>20} {name:>24} {n:>10} {base:>10.5f} {new:>10.5f} {ratio:>6.2f}"
+                  + ("  REGRESSION" if regression else ""))
+        if any(c[-1] for c in comparison):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    import harness  # the scripts register their cases in the imported module, not in __main__
+    harness.main()
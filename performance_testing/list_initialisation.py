@@ -2,27 +2,23 @@
 
 """ Compares the performance of creating lists """
 
-import inspect
-from time import time
+import numpy as np
 
+from harness import case, print_results, run_cases
 
-def tester(fun, n):
-    """ Measures the time to run the list creation function for n elements """
-    start = time()
-    fun(n)
-    print(f"{inspect.getsource(fun)}{time() - start} sec\n")
+GROUP = 'list_initialisation'
 
 
-def main(n):
-    tester(list_comprehension, n)
-    tester(list_append, n)
-    tester(list_initialisation, n)
+def main():
+    print_results(run_cases([GROUP]))
 
 
+@case(GROUP)
 def list_comprehension(n):
     return [i for i in range(0, n)]
 
 
+@case(GROUP)
 def list_append(n):
     lst = []
     for i in range(0, n):
@@ -30,6 +26,7 @@ def list_append(n):
     return lst
 
 
+@case(GROUP)
 def list_initialisation(n):
     lst = [0] * n
     for i in range(0, n):
@@ -37,5 +34,15 @@ def list_initialisation(n):
     return lst
 
 
+@case(GROUP)
+def list_constructor(n):
+    return list(range(0, n))
+
+
+@case(GROUP)
+def numpy_arange(n):
+    return np.arange(0, n)
+
+
 if __name__ == '__main__':
-    main(100000000)
+    main()
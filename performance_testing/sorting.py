@@ -1,30 +1,40 @@
 #!/usr/bin/env python3
 
 """A comparison between python standard library and numpy performance.
-In the first case a list of random numbers is generated and sorted.
-In the second case an array of random numbers is generated and sorted """
+In the first case a list of random numbers is sorted.
+In the second case an array of random numbers is sorted """
 import numpy as np
 from random import random
-import cProfile
+
+from harness import case, print_results, run_cases
+
+GROUP = 'sorting'
 
 
 def main():
-    cProfile.run('list_tester()')
-    cProfile.run('array_tester()')
+    print_results(run_cases([GROUP]))
+
+
+def random_list(n):
+    """Creates a list of random numbers"""
+    return [random() for i in range(0, n)]
+
+
+def random_array(n):
+    """Creates an array of random numbers"""
+    return np.random.rand(n)
 
 
-def list_tester():
-    """Creates a list of random numbers, and sorts it"""
-    list_container = [random() for i in range(0, 1000000)]
-    list_container = sorted(list_container)
-    return list_container
+@case(GROUP, setup=random_list)
+def list_tester(list_container):
+    """Sorts a list of random numbers"""
+    return sorted(list_container)
 
 
-def array_tester():
-    """Creates an array of random numbers and sorts it"""
-    array_container = np.random.rand(1000000)
-    array_container = np.sort(array_container)
-    return array_container
+@case(GROUP, setup=random_array)
+def array_tester(array_container):
+    """Sorts an array of random numbers"""
+    return np.sort(array_container)
 
 
 if __name__ == '__main__':
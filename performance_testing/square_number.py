@@ -4,24 +4,63 @@
 import math
 
 import numpy as np
-from time import time
 from math import pow
 
+from harness import case, print_results, run_cases
 
-def tester(fun):
-    """Measures the time to run the function 10000000 times"""
-    start = time()
-    for i in range(0, 10000000):
-        fun(i)
-    print(time() - start)
+GROUP = 'square_number'
+
+
+def integers(n):
+    return list(range(0, n))
+
+
+def integer_array(n):
+    return np.arange(0, n)
+
+
+@case(GROUP, setup=integers)
+def power_operator(values):
+    return [i ** 2 for i in values]
+
+
+@case(GROUP, setup=integers)
+def math_pow(values):
+    return [math.pow(i, 2) for i in values]
+
+
+@case(GROUP, setup=integers)
+def imported_pow(values):
+    return [pow(i, 2) for i in values]
+
+
+@case(GROUP, setup=integers)
+def multiplication(values):
+    return [i * i for i in values]
+
+
+@case(GROUP, setup=integers, n=10 ** 5)
+def numpy_power_per_item(values):
+    return [np.power(i, 2) for i in values]
+
+
+@case(GROUP, setup=integer_array)
+def numpy_power(values):
+    return np.power(values, 2)
+
+
+@case(GROUP, setup=integer_array)
+def numpy_multiplication(values):
+    return values * values
+
+
+@case(GROUP, setup=integer_array)
+def numpy_square(values):
+    return np.square(values)
 
 
 def main():
-    tester(fun=lambda i: i ** 2)
-    tester(fun=lambda i: math.pow(i, 2))
-    tester(fun=lambda i: pow(i, 2))
-    tester(fun=lambda i: i * i)
-    tester(fun=lambda i: np.power(i, 2))
+    print_results(run_cases([GROUP]))
 
 
 if __name__ == '__main__':
@@ -2,28 +2,70 @@
 
 """A comparison of different ways to calculate the square root of an integer"""
 import math
-import inspect
 import numpy as np
-from time import time
 from math import pow
 
+from harness import case, print_results, run_cases
 
-def tester(fun):
-    """Measures the time to run the function 10000000 times"""
-    start = time()
-    for i in range(0, 10000000):
-        fun(i)
-    print(f"{inspect.getsource(fun)}{time() - start} sec\n")
+GROUP = 'square_root_number'
+
+
+def integers(n):
+    return list(range(0, n))
+
+
+def integer_array(n):
+    return np.arange(0, n)
+
+
+@case(GROUP, setup=integers)
+def power_operator(values):
+    return [i ** 0.5 for i in values]
+
+
+@case(GROUP, setup=integers)
+def math_pow(values):
+    return [math.pow(i, 0.5) for i in values]
+
+
+@case(GROUP, setup=integers)
+def math_sqrt(values):
+    return [math.sqrt(i) for i in values]
+
+
+@case(GROUP, setup=integers)
+def imported_pow_square(values):
+    """ Not a square root, the square with the same function, for reference """
+    return [pow(i, 2) for i in values]
+
+
+@case(GROUP, setup=integers)
+def imported_pow(values):
+    return [pow(i, 0.5) for i in values]
+
+
+@case(GROUP, setup=integers, n=10 ** 5)
+def numpy_power_per_item(values):
+    return [np.power(i, 0.5) for i in values]
+
+
+@case(GROUP, setup=integers, n=10 ** 5)
+def numpy_sqrt_per_item(values):
+    return [np.sqrt(i) for i in values]
+
+
+@case(GROUP, setup=integer_array)
+def numpy_power(values):
+    return np.power(values, 0.5)
+
+
+@case(GROUP, setup=integer_array)
+def numpy_sqrt(values):
+    return np.sqrt(values)
 
 
 def main():
-    tester(fun=lambda i: i ** 0.5)
-    tester(fun=lambda i: math.pow(i, 0.5))
-    tester(fun=lambda i: math.sqrt(i))
-    tester(fun=lambda i: pow(i, 2))
-    tester(fun=lambda i: pow(i, 0.5))
-    tester(fun=lambda i: np.power(i, 0.5))
-    tester(fun=lambda i: np.sqrt(i))
+    print_results(run_cases([GROUP]))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+""" Compares the frame time of the full red-black relaxation of nano_imprint with the active region
+mode (only the particles near the ones that moved are relaxed) for parts of growing volume. The first
+frame relaxes every particle in both modes and is timed separately """
+from time import perf_counter
+
+import numpy as np
+
+import nano_imprint
+
+
+def tester(sim, frames):
+    """ Returns the time of the first frame and the mean time of the following frames """
+    start = perf_counter()
+    sim.step()
+    first = perf_counter() - start
+    start = perf_counter()
+    sim.step(frames - 1)
+    return first, (perf_counter() - start) / (frames - 1)
+
+
+def main(frames=300):
+    print(f"{'radius':>7} {'particles':>10} {'first (s)':>10} {'full (s)':>9} {'active (s)':>11} {'speedup':>8} "
+          f"{'identical':>10}")
+    for radius in (0.1, 0.05, 0.025):
+        full = nano_imprint.FreeParticlesSimulator(particle_radius=radius)
+        active = nano_imprint.FreeParticlesSimulator(particle_radius=radius, active_region=True)
+        first, t_full = tester(full, frames)
+        _, t_active = tester(active, frames)
+        for sim in (full, active):
+            assert np.isfinite(sim.particles.pos).all(), f"Non-finite positions at radius {radius}"
+        identical = np.array_equal(full.particles.pos, active.particles.pos)
+        print(f"{radius:>7} {len(full.particles):>10} {first:>10.4f} {t_full:>9.4f} {t_active:>11.4f} "
+              f"{t_full / t_active:>8.1f} {identical!s:>10}")
+
+
+if __name__ == '__main__':
+    main()
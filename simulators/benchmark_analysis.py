@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+""" Compares the streaming analysis of nano_imprint (statistics sampled every few steps while the simulation
+runs) with recording every frame to a trajectory file and analysing the frames afterwards. Reports the time
+per frame, the storage of the results and the time of every analyser, checks that both give the same dent
+depths, and shows that the time series stays within its capacity for any number of samples """
+import os
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+import nano_imprint
+from particle_simulator.analysis import Snapshot
+
+RADIUS = 0.025
+
+
+def get_dent_depth(pos, pos0, shape):
+    """ The dent depth of recorded positions (as analysis.SurfaceProfile) """
+    heights = np.fmax.reduce(pos[2, 1:1 + int(np.prod(shape))].reshape(shape), axis=2)
+    return max(0.0, -np.nanmin(heights - pos0[2, 1:1 + int(np.prod(shape))].reshape(shape).max(axis=2)))
+
+
+def main(frames=200, every=10):
+    plain = nano_imprint.FreeParticlesSimulator(particle_radius=RADIUS)
+    start = perf_counter()
+    plain.step(frames)
+    t_plain = (perf_counter() - start) / frames
+
+    streaming = nano_imprint.FreeParticlesSimulator(particle_radius=RADIUS)
+    analysis = streaming.enable_analysis(every=every)
+    start = perf_counter()
+    streaming.step(frames)
+    t_streaming = (perf_counter() - start) / frames
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'nano_imprint.traj')
+        recorded = nano_imprint.FreeParticlesSimulator(particle_radius=RADIUS)
+        start = perf_counter()
+        reader = recorded.record(path, frames, velocities=False, locked=False)
+        t_record = (perf_counter() - start) / frames
+        start = perf_counter()
+        depths = [get_dent_depth(reader.positions[f], reader.pos0, recorded.part_shape) for f in range(0, len(reader))]
+        t_post = perf_counter() - start
+        size = os.path.getsize(path)
+        sampled = np.array(depths)[analysis.series.frames - 1]
+        same = np.array_equal(sampled, analysis.series['dent_depth'])
+        del reader
+
+    print(f"{len(plain.particles)} particles, {frames} frames, a sample every {every} frames")
+    print(f"{'mode':>22} {'frame (s)':>10} {'overhead':>9} {'results (MB)':>13}")
+    print(f"{'no analysis':>22} {t_plain:>10.4f} {0:>9.1%} {0:>13.2f}")
+    print(f"{'streaming':>22} {t_streaming:>10.4f} {t_streaming / t_plain - 1:>9.1%} "
+          f"{analysis.series.nbytes / 2 ** 20:>13.2f}")
+    print(f"{'record + post-process':>22} {t_record + t_post / frames:>10.4f} "
+          f"{(t_record + t_post / frames) / t_plain - 1:>9.1%} {size / 2 ** 20:>13.2f}")
+    print(f"same dent depths: {same}")
+
+    print("time per sample of every analyser (s):")
+    for analyser in analysis.analysers:
+        snapshot = Snapshot(streaming, analysis.index)
+        snapshot.displacement  # shared by the analysers, timed separately
+        start = perf_counter()
+        analyser(snapshot)
+        print(f"  {type(analyser).__name__:>22} {perf_counter() - start:.5f}")
+    start = perf_counter()
+    Snapshot(streaming, analysis.index).displacement
+    print(f"  {'displacement':>22} {perf_counter() - start:.5f}")
+
+    # The series keeps at most its capacity of samples for any length of run
+    for samples in (1000, 10000, 100000):
+        analysis = streaming.enable_analysis(every=1, capacity=256)
+        analysis.analysers = [lambda snapshot: {'depth': snapshot.simulator.frame * 1.0, 'profile': np.zeros(200)}]
+        for _ in range(0, samples):
+            streaming.frame += 1
+            analysis.update(streaming)
+        series = analysis.series
+        print(f"{samples:>7} samples: {len(series)} kept (every {series.stride}), {series.nbytes / 1024:.1f} kB")
+
+
+if __name__ == '__main__':
+    main()
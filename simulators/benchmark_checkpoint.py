@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+""" Measures checkpoints of a nano_imprint state with about a million particles: the time the simulation
+is stalled to capture the state, the time to write it (in the calling thread and in the background), the
+size of the file and the time to resume from it. The resumed run is checked to be bit-identical to the
+uninterrupted one """
+import os
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+import nano_imprint
+from particle_simulator.checkpoint import resume
+
+SHAPE = (200, 200, 25)  # 1e6 part particles
+
+
+def get_simulator():
+    return nano_imprint.FreeParticlesSimulator(part_shape=SHAPE, active_region=True, tool_velocity=(0.5, -0.5))
+
+
+def get_frame_time(sim, frames):
+    start = perf_counter()
+    sim.step(frames)
+    return (perf_counter() - start) / frames
+
+
+def main(frames=40, every=10):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'nano_imprint.ckpt')
+        sim = get_simulator()
+        sim.step(frames)
+        print(f"{len(sim.particles)} particles")
+
+        start = perf_counter()
+        sim.get_state()
+        capture = perf_counter() - start
+        start = perf_counter()
+        size = sim.save_checkpoint(path)
+        write = perf_counter() - start
+        print(f"capture {capture:.4f} s, write {write:.4f} s ({size / 2 ** 20:.1f} MB, "
+              f"{size / 2 ** 20 / write:.0f} MB/s)")
+
+        start = perf_counter()
+        resumed = resume(path)
+        print(f"resume {perf_counter() - start:.4f} s")
+
+        # The resumed simulator steps the same frames without checkpoints
+        plain = get_frame_time(resumed, frames)
+        writer = sim.enable_checkpoints(path, every)
+        background = get_frame_time(sim, frames)
+        sim.close()
+        stall = np.mean([w[1] for w in writer.writes])
+        written = np.mean([w[2] for w in writer.writes])
+        print(f"frame {plain:.4f} s, with a checkpoint every {every} frames {background:.4f} s "
+              f"({len(writer.writes)} checkpoints, stall {stall:.4f} s, background write {written:.4f} s)")
+        for simulator in (sim, resumed):
+            assert np.isfinite(simulator.particles.pos).all(), "Non-finite positions"
+        print(f"identical after resume: {np.array_equal(sim.particles.pos, resumed.particles.pos)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+""" Measures how the cost of a particle-particle collision step scales with the number of particles.
+The particle density is kept constant, so the box grows with the number of particles """
+from time import perf_counter
+
+import numpy as np
+
+from particle_simulator import collisions
+from particle_simulator.particle import ParticleSystem
+
+DENSITY = 0.5  # particles per unit volume
+
+
+def get_gas(n, seed=0):
+    """ Creates n particles with the free_particles mass/radius distribution in a box of constant density """
+    rng = np.random.default_rng(seed)
+    box = np.cbrt(n / DENSITY)
+    ps = ParticleSystem(n)
+    ps.mass[:] = 0.01 + 0.1 * rng.random(n)
+    ps.radius[:] = np.cbrt(ps.mass)
+    ps.pos[:] = rng.random((3, n)) * box
+    ps.vel[:] = rng.random((3, n)) - 0.5
+    return ps
+
+
+def brute_force_pairs(ps):
+    """ Returns every overlapping pair (i < j) by testing all pairs """
+    d = ps.pos[:, :, None] - ps.pos[:, None, :]
+    overlap = np.einsum('kij,kij->ij', d, d) < (ps.radius[:, None] + ps.radius[None, :]) ** 2
+    return {(i, j) for i, j in zip(*np.nonzero(np.triu(overlap, 1)))}
+
+
+def check_broad_phase(n=2000):
+    """ Checks that the grid finds the same overlapping pairs as the brute force search """
+    ps = get_gas(n)
+    i, j = collisions.find_candidate_pairs(ps.pos, ps.radius)
+    d = ps.pos[:, i] - ps.pos[:, j]
+    overlap = np.einsum('ij,ij->j', d, d) < (ps.radius[i] + ps.radius[j]) ** 2
+    found = {(min(a, b), max(a, b)) for a, b in zip(i[overlap], j[overlap])}
+    return found == brute_force_pairs(ps)
+
+
+def check_conservation(n=10000):
+    """ Returns the relative change of momentum and kinetic energy after a collision step """
+    ps = get_gas(n)
+    momentum = (ps.mass * ps.vel).sum(axis=1)
+    energy = (ps.mass * ps.vel * ps.vel).sum()
+    collisions.update_collisions(ps)
+    return (np.abs((ps.mass * ps.vel).sum(axis=1) - momentum).max() / np.abs(momentum).max(),
+            abs((ps.mass * ps.vel * ps.vel).sum() - energy) / energy)
+
+
+def tester(n, repeats=3):
+    """ Returns the best time of a collision step (broad + narrow phase) for n particles """
+    ps = get_gas(n)
+    times = []
+    for _ in range(0, repeats):
+        start = perf_counter()
+        collisions.update_collisions(ps)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def main():
+    print(f"Broad phase finds every overlapping pair: {check_broad_phase()}")
+    print("Relative change of momentum, kinetic energy: %.1e, %.1e" % check_conservation())
+    print(f"{'particles':>10} {'step (s)':>10} {'per particle (us)':>18}")
+    for n in (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6):
+        t = tester(n)
+        print(f"{n:>10} {t:>10.4f} {1e6 * t / n:>18.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+""" Compares the fixed timestep and the event-driven engine of free_particles on a sparse gas.
+Every run simulates the same time span and samples frames at the same times. The accuracy is the
+deepest overlap of two particles and the largest distance of a particle beyond a wall in any frame """
+from time import perf_counter
+
+import numpy as np
+
+import free_particles
+from particle_simulator import collisions
+from particle_simulator.events import EventEngine
+from particle_simulator.simconf import SimConfig
+
+FRAME_TIME = 0.1  # simulated time between two frames
+
+
+def get_errors(ps, bbox_size):
+    """ Returns the deepest overlap of two particles and the largest distance beyond a wall """
+    i, j = collisions.find_overlapping_pairs(ps.pos, ps.radius)
+    d = ps.pos[:, i] - ps.pos[:, j]
+    overlap = (ps.radius[i] + ps.radius[j] - np.sqrt(np.einsum('ij,ij->j', d, d))).max(initial=0)
+    outside = np.maximum(ps.radius - ps.pos, ps.pos - (bbox_size - ps.radius)).max(initial=0)
+    return overlap, max(outside, 0)
+
+
+def tester(n, bbox_size, frames, timestep=None):
+    """ Returns the time, the number of steps or impacts, the errors and the energy drift of a run.
+    The event-driven engine is used if no timestep is given """
+    simconf = SimConfig(free_particles.CONFIG_PATH, particles_count=n, bbox_size=bbox_size,
+                        timestep=timestep or FRAME_TIME)
+    sim = free_particles.FreeParticlesSimulator(simconf, seed=0, event_driven=timestep is None)
+    ps = sim.particles
+    energy = (ps.mass * ps.vel * ps.vel).sum()
+    substeps = 1 if timestep is None else round(FRAME_TIME / timestep)
+    overlap = outside = 0
+    elapsed = 0
+    for _ in range(0, frames):
+        start = perf_counter()
+        sim.step(substeps)
+        elapsed += perf_counter() - start
+        errors = get_errors(ps, bbox_size)
+        overlap, outside = max(overlap, errors[0]), max(outside, errors[1])
+    work = sim.engine.count if timestep is None else frames * substeps
+    drift = abs((ps.mass * ps.vel * ps.vel).sum() - energy) / energy
+    return elapsed, work, overlap, outside, drift
+
+
+def get_scaling(n, steps=10):
+    """ Returns the time to create the engine of a gas of n particles (at the density of 1 particle per 2.5^3)
+    and the time per event (impact or cell crossing) of the following steps """
+    bbox_size = int(np.ceil(np.cbrt(n) * 2.5))
+    ps = free_particles.FreeParticlesSimulator(SimConfig(free_particles.CONFIG_PATH, particles_count=n,
+                                                         bbox_size=bbox_size), seed=0).particles
+    start = perf_counter()
+    engine = EventEngine(ps, bbox_size, FRAME_TIME)
+    setup = perf_counter() - start
+    start = perf_counter()
+    events = engine.step(steps) + engine.crossings
+    return bbox_size, setup, events, (perf_counter() - start) / events
+
+
+def main(frames=100):
+    print(f"{'particles':>10} {'box':>5} {'engine':>14} {'time (s)':>9} {'steps/impacts':>14} {'max overlap':>12} "
+          f"{'max outside':>12} {'energy drift':>13}")
+    for n, bbox_size in ((100, 30), (500, 40)):
+        for timestep in (0.1, 0.01, 0.001, None):
+            engine = 'events' if timestep is None else f'dt={timestep}'
+            elapsed, work, overlap, outside, drift = tester(n, bbox_size, frames, timestep)
+            print(f"{n:>10} {bbox_size:>5} {engine:>14} {elapsed:>9.3f} {work:>14} {overlap:>12.2e} "
+                  f"{outside:>12.2e} {drift:>13.1e}")
+
+    # The particles are only predicted against their neighbouring cells: the setup grows linearly with the
+    # particles and the cost of an event does not grow
+    print(f"{'particles':>10} {'box':>5} {'setup (s)':>10} {'events':>8} {'per event (us)':>15}")
+    for n in (1000, 4000, 16000, 64000):
+        bbox_size, setup, events, per_event = get_scaling(n)
+        print(f"{n:>10} {bbox_size:>5} {setup:>10.3f} {events:>8} {1e6 * per_event:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+""" Compares the throughput (particles updated per second) of the scalar and the batched
+stepping of free_particles """
+from time import perf_counter
+
+import numpy as np
+
+from particle_simulator.simconf import SimConfig
+from particle_simulator.particle import ParticleSystem
+import free_particles
+
+simconf = SimConfig(free_particles.CONFIG_PATH)
+
+
+def get_random_system(n, seed=0):
+    """ Creates a system of n particles with random positions inside the box and random velocities """
+    rng = np.random.default_rng(seed)
+    ps = ParticleSystem(n)
+    ps.mass[:] = 0.01 + 0.1 * rng.random(n)
+    ps.radius[:] = np.cbrt(ps.mass)
+    ps.pos[:] = ps.radius + rng.random((3, n)) * (simconf.bbox_size - 2 * ps.radius)
+    ps.pos0[:] = ps.pos
+    ps.vel[:] = rng.random((3, n))
+    return ps
+
+
+def step_scalar(ps, particles):
+    """ Steps the Particle copies of the system one by one and copies them to the system (as the simulator) """
+    for p in particles:
+        free_particles.update_particle_position(p, simconf.timestep)
+        free_particles.update_wall_collisions(p, simconf.bbox_size)
+    ps.copy_from_particles(particles, ('pos', 'vel'))
+
+
+def step_batched(ps):
+    free_particles.update_particles_position(ps, simconf.timestep)
+    free_particles.update_particles_wall_collisions(ps, simconf.bbox_size)
+
+
+def tester(fun, ps, steps, *args):
+    """ Measures the particles per second that fun updates when it is run for a number of steps """
+    start = perf_counter()
+    for _ in range(0, steps):
+        fun(ps, *args)
+    return len(ps) * steps / (perf_counter() - start)
+
+
+def check_trajectories(n=1000, steps=200):
+    """ Checks that both stepping modes produce the same trajectories """
+    ps_scalar, ps_batched = get_random_system(n), get_random_system(n)
+    particles = ps_scalar.to_particles()
+    for _ in range(0, steps):
+        step_scalar(ps_scalar, particles)
+        step_batched(ps_batched)
+    return np.array_equal(ps_scalar.pos, ps_batched.pos) and np.array_equal(ps_scalar.vel, ps_batched.vel)
+
+
+def main():
+    print(f"Identical trajectories: {check_trajectories()}")
+    print(f"{'particles':>10} {'scalar (p/s)':>14} {'batched (p/s)':>14} {'speedup':>8}")
+    for n in (10 ** 3, 10 ** 5, 10 ** 6):
+        scalar_steps = max(1, 10 ** 4 // n)
+        ps = get_random_system(n)
+        scalar = tester(step_scalar, ps, scalar_steps, ps.to_particles())
+        batched = tester(step_batched, get_random_system(n), max(10, 10 ** 7 // n))
+        print(f"{n:>10} {scalar:>14.3e} {batched:>14.3e} {batched / scalar:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+""" Steps versus error of the integrators of free_particles (soft contacts). Every run simulates the
+same frames. The error is the largest distance of a particle from a reference run (velocity Verlet
+with very short fixed sub-steps) after the frames, and the drift of the total (kinetic + contact) energy """
+from time import perf_counter
+
+import numpy as np
+
+import free_particles
+from particle_simulator.integrators import get_substeps
+from particle_simulator.simconf import SimConfig
+
+PARTICLES = 100
+REFERENCE_SUBSTEPS = 20000
+
+
+def tester(frames, integrator, substeps=None, tolerance=1e-3):
+    """ Returns the time, the number of force evaluations, the final positions and the energy drift of a run """
+    simconf = SimConfig(free_particles.CONFIG_PATH, particles_count=PARTICLES, integrator=integrator,
+                        substeps=substeps, tolerance=tolerance)
+    sim = free_particles.FreeParticlesSimulator(simconf, seed=0)
+    ps = sim.particles
+    energy = free_particles.get_contact_energy(ps, simconf.bbox_size)
+    evaluations = 0
+    start = perf_counter()
+    for _ in range(0, frames):
+        evaluations += sim.integrator.advance(ps, simconf.timestep, sim.update_forces)
+    elapsed = perf_counter() - start
+    drift = abs(free_particles.get_contact_energy(ps, simconf.bbox_size) - energy) / energy
+    return elapsed, evaluations, ps.pos.copy(), drift
+
+
+def main(frames=10):
+    reference = tester(frames, 'verlet', REFERENCE_SUBSTEPS)[2]
+    print(f"{'integrator':>10} {'setting':>16} {'time (s)':>9} {'force evals':>12} {'position error':>15} "
+          f"{'energy drift':>13}")
+    # The fixed step integrators run with multiples of their fewest stable sub-steps
+    simconf = SimConfig(free_particles.CONFIG_PATH, particles_count=PARTICLES)
+    frequency = free_particles.get_contact_frequency(free_particles.FreeParticlesSimulator(simconf, seed=0).particles)
+    runs = [(name, f'substeps={s}', dict(substeps=s)) for name in ('euler', 'verlet')
+            for s in (k * get_substeps(name, simconf.timestep, frequency) for k in (1, 3, 10))]
+    runs += [('adaptive', f'tolerance={t:g}', dict(tolerance=t)) for t in (1e-3, 1e-4, 1e-5, 1e-6)]
+    for integrator, setting, parameters in runs:
+        elapsed, evaluations, pos, drift = tester(frames, integrator, **parameters)
+        error = np.abs(pos - reference).max()
+        print(f"{integrator:>10} {setting:>16} {elapsed:>9.3f} {evaluations:>12} {error:>15.2e} {drift:>13.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+""" Compares the setup time of the nano_imprint part built from Particle objects (get_part_particles,
+copied into a ParticleSystem and referenced by a map of views) and built as whole arrays (get_part_system) """
+from time import perf_counter
+
+import numpy as np
+
+import nano_imprint
+from particle_simulator.particle import ParticleSystem
+
+ATTRIBUTES = ('pos', 'pos0', 'vel', 'mass', 'radius', 'colour', 'neighbour_offsets', 'neighbour_indices')
+
+
+def build_objects(radius, shape):
+    pmap, pflat = nano_imprint.get_part_particles(10, radius, shape[2])
+    ps = ParticleSystem.from_particles([nano_imprint.get_tool()] + pflat)
+    nano_imprint.get_particles_map(shape, ps, offset=1)
+    return ps
+
+
+def build_arrays(radius, shape):
+    return nano_imprint.get_part_system(radius, shape, nano_imprint.get_tool())
+
+
+def tester(fun, radius, shape):
+    """ Returns the setup time and the particles """
+    start = perf_counter()
+    ps = fun(radius, shape)
+    return perf_counter() - start, ps
+
+
+def main():
+    print(f"{'radius':>7} {'particles':>10} {'objects (s)':>12} {'arrays (s)':>11} {'speedup':>8} {'identical':>10}")
+    for radius in (0.1, 0.05, 0.025):
+        count = int(8 / (2 * radius))
+        shape = (count, count, 5)
+        t_objects, objects = tester(build_objects, radius, shape)
+        t_arrays, arrays = tester(build_arrays, radius, shape)
+        identical = all(np.array_equal(getattr(objects, a), getattr(arrays, a)) for a in ATTRIBUTES)
+        print(f"{radius:>7} {len(arrays):>10} {t_objects:>12.4f} {t_arrays:>11.4f} {t_objects / t_arrays:>8.1f} "
+              f"{identical!s:>10}")
+
+    # Non-cubic parts: only the array builder supports extents other than a full box on x and y
+    for shape in ((400, 100, 5), (100, 100, 40)):
+        t_arrays, arrays = tester(build_arrays, 0.01, shape)
+        print(f"part {shape}: {len(arrays)} particles built in {t_arrays:.4f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+""" Measures the cost of the level of detail stage against a physics step of nano_imprint, and the
+frame rate of the raster and matplotlib renderers with and without it, for large lattices """
+from time import perf_counter
+
+import matplotlib
+
+import nano_imprint
+from particle_simulator.lod import LevelOfDetail
+from particle_simulator.renderer import Renderer
+from particle_simulator.simconf import SimConfig
+from particle_simulator.video import RasterRenderer
+
+
+def tester(fun, frames):
+    """ Returns the mean time of fun over the frames """
+    start = perf_counter()
+    for frame in frames:
+        fun(frame)
+    return (perf_counter() - start) / len(frames)
+
+
+def render_matplotlib(sim, frames):
+    renderer = Renderer(sim)
+    renderer.setup()
+    t = tester(renderer.draw_frame, frames)
+    matplotlib.pyplot.close(renderer.fig)
+    return t
+
+
+def main(frames=30):
+    matplotlib.use('Agg')
+    print(f"{'radius':>7} {'particles':>10} {'mode':>10} {'drawn':>8} {'step (s)':>9} {'lod (s)':>8} "
+          f"{'lod/step':>9} {'raster (fps)':>13} {'matplotlib (fps)':>17}")
+    for radius in (0.025, 0.02):
+        sim = nano_imprint.FreeParticlesSimulator(particle_radius=radius)
+        start = perf_counter()
+        recorded = sim.simulate(frames)
+        step = (perf_counter() - start) / frames
+        for mode in ('off', 'voxel', 'subsample'):
+            sim.simconf = SimConfig(nano_imprint.CONFIG_PATH, lod=mode)
+            if mode == 'off':
+                drawn, lod = len(sim.particles), 0
+            else:
+                stage = LevelOfDetail(sim, mode, sim.simconf.lod_pixels)
+                stage.reduce(recorded[0])  # the first frame sorts the particles into voxels
+                lod = tester(stage.reduce, recorded)
+                drawn = stage.reduce(recorded[-1])[1].size
+            raster = RasterRenderer(sim)
+            fps_raster = 1 / tester(raster.draw, recorded)
+            fps_matplotlib = 1 / render_matplotlib(sim, recorded[:5])
+            print(f"{radius:>7} {len(sim.particles):>10} {mode:>10} {drawn:>8} {step:>9.4f} {lod:>8.4f} "
+                  f"{lod / step:>9.1%} {fps_raster:>13.2f} {fps_matplotlib:>17.2f}")
+
+
+if __name__ == '__main__':
+    main()
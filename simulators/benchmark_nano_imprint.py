@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+""" Compares the frame time of the original nano_imprint (Particle objects referenced through a 3D map, as
+before the ParticleSystem) with the sequential, the whole array (red-black) and the active region relaxation.
+The speedups are relative to the original implementation """
+from time import perf_counter
+
+import numpy as np
+
+import nano_imprint
+
+
+class OriginalSimulator:
+    """ The original update of nano_imprint: the tool and the part are Particle objects, the part is relaxed
+    particle by particle with the functions of nano_imprint """
+
+    def __init__(self, simconf, particle_radius):
+        self.simconf = simconf
+        self.particles_map, self.particles = nano_imprint.get_part_particles(simconf.bbox_size, particle_radius)
+        self.particles.insert(0, nano_imprint.get_tool())  # adds the tool at index 0 for easy access
+
+    def update_particles(self):
+        for p in self.particles:
+            p.locked = False
+        nano_imprint.update_tool_position(self.particles[0], self.simconf.timestep)
+        nano_imprint.update_part_position(self.particles[0], self.particles_map)
+
+    def get_positions(self):
+        return np.array([[p.x for p in self.particles], [p.y for p in self.particles], [p.z for p in self.particles]])
+
+
+def tester(sim, frames):
+    """ Returns the mean time to update a frame """
+    start = perf_counter()
+    for _ in range(0, frames):
+        sim.update_particles()
+    return (perf_counter() - start) / frames
+
+
+def main(frames=60):
+    print(f"{'radius':>7} {'particles':>10} {'original (s)':>13} {'sequential (s)':>15} {'red-black (s)':>14} "
+          f"{'active (s)':>11} {'speedup':>8} {'active speedup':>15} {'same as original':>17} {'red-black diff':>15}")
+    for radius in (0.1, 0.05):
+        sequential = nano_imprint.FreeParticlesSimulator(particle_radius=radius, vectorized=False)
+        original = OriginalSimulator(sequential.simconf, radius)
+        red_black = nano_imprint.FreeParticlesSimulator(particle_radius=radius, vectorized=True)
+        active = nano_imprint.FreeParticlesSimulator(particle_radius=radius, active_region=True)
+        t_original = tester(original, frames)
+        t_sequential = tester(sequential, frames)
+        t_red_black = tester(red_black, frames)
+        t_active = tester(active, frames)
+        same = np.array_equal(original.get_positions(), sequential.particles.pos)
+        diff = np.abs(sequential.particles.pos - red_black.particles.pos).max()
+        print(f"{radius:>7} {len(red_black.particles):>10} {t_original:>13.4f} {t_sequential:>15.4f} "
+              f"{t_red_black:>14.4f} {t_active:>11.4f} {t_original / t_red_black:>8.1f} "
+              f"{t_original / t_active:>15.1f} {same!s:>17} {diff:>15.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+""" Strong and weak scaling of the slab-decomposed (multi-process) nano_imprint relaxation.
+Strong scaling keeps the lattice fixed, weak scaling grows the lattice with the number of workers.
+The speedups are relative to the same relaxation in the main process, without workers. The workers need
+a core each, with fewer cores the times only show the cost of the decomposition """
+import os
+from functools import partial
+from time import perf_counter
+
+import numpy as np
+
+import nano_imprint
+from particle_simulator import lattice
+from particle_simulator.parallel import SlabEngine
+from particle_simulator.particle import ParticleSystem
+
+RADIUS = 0.05
+
+
+def get_lattice_system(shape, radius=RADIUS):
+    """ Creates the tool and a lattice part of the given shape directly as arrays """
+    ps = ParticleSystem(1 + int(np.prod(shape)))
+    ps.radius[:] = radius
+    ps.pos[:, 1:] = 1 + 2 * radius * np.indices(shape).reshape(3, -1)
+    tool = nano_imprint.get_tool()
+    ps.pos[:, 0] = tool.x, tool.y, tool.z
+    ps.vel[:, 0] = tool.vx, tool.vy, tool.vz
+    ps.radius[0] = tool.radius
+    ps.pos0[:] = ps.pos
+    return ps
+
+
+def tester(shape, workers, steps=5, warmup=15):
+    """ Returns the mean step time. The first steps bring the tool into contact with the part """
+    update_tool = partial(nano_imprint.update_tool_position, timestep=1.0)
+    with SlabEngine(get_lattice_system(shape), shape, update_tool, workers) as engine:
+        engine.step(warmup)
+        start = perf_counter()
+        engine.step(steps)
+        return (perf_counter() - start) / steps
+
+
+def tester_serial(shape, steps=5, warmup=15):
+    """ Returns the mean step time of the relaxation of the whole lattice in the main process """
+    ps = get_lattice_system(shape)
+    part_pos, part_locked = ps.pos[:, 1:].reshape((3,) + shape), ps.locked[1:].reshape(shape)
+    lo, hi = (0, 0, 0), shape
+    parity = lattice.get_parity(shape, lo, hi)
+    tool = ps[0]
+    start = None
+    for n in range(0, warmup + steps):
+        if n == warmup:
+            start = perf_counter()
+        nano_imprint.update_tool_position(tool, timestep=1.0)
+        part_locked[:] = False
+        lattice.update_tool_collisions(part_pos, part_locked, RADIUS, ps.pos[:, 0], ps.radius[0], lo, hi)
+        lattice.relax(part_pos, part_locked, RADIUS, parity, 0, lo, hi)
+        lattice.relax(part_pos, part_locked, RADIUS, parity, 1, lo, hi)
+        part_locked[:] = True
+    return (perf_counter() - start) / steps
+
+
+def check_equivalence(frames=40):
+    """ Checks that the parallel engine reproduces the single process red-black relaxation """
+    serial = nano_imprint.FreeParticlesSimulator()
+    parallel = nano_imprint.FreeParticlesSimulator(workers=3)
+    serial.step(frames)
+    parallel.step(frames)
+    parallel.close()
+    return np.array_equal(serial.particles.pos, parallel.particles.pos)
+
+
+def main():
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    print(f"cores: {cores}")
+    if cores < 2:
+        print("Only one core: the workers share it, so the speedups below are not a measurement of the "
+              "parallel speedup (unverified on this machine).")
+    print(f"Parallel engine reproduces the red-black relaxation: {check_equivalence()}")
+    workers = sorted({1, 2, 4, cores} | {w for w in (8, 16, 32) if w <= cores})
+
+    shape = (320, 160, 20)
+    print(f"\nStrong scaling, lattice {shape}")
+    print(f"{'workers':>8} {'step (s)':>9} {'speedup':>8} {'efficiency':>11}")
+    base = tester_serial(shape)
+    print(f"{0:>8} {base:>9.4f} {1:>8.2f} {'':>11}")
+    for w in workers:
+        t = tester(shape, w)
+        print(f"{w:>8} {t:>9.4f} {base / t:>8.2f} {base / t / w:>11.1%}")
+
+    print(f"\nWeak scaling, lattice (80 * workers, 160, 20)")
+    print(f"{'workers':>8} {'particles':>10} {'step (s)':>9} {'efficiency':>11}")
+    base = tester_serial((80, 160, 20))
+    print(f"{0:>8} {80 * 160 * 20:>10} {base:>9.4f} {'':>11}")
+    for w in workers:
+        shape = (80 * w, 160, 20)
+        t = tester(shape, w)
+        print(f"{w:>8} {int(np.prod(shape)):>10} {t:>9.4f} {base / t:>11.1%}")
+
+
+if __name__ == '__main__':
+    main()
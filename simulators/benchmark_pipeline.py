@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+""" Compares the wall time of exporting a video with physics and rendering in series against the
+pipelined mode, where a worker process advances the simulation while the main process renders
+and encodes. The overlap needs at least two cores: the bound is the speedup of a perfect overlap of
+the simulation and the output (render and encode) phases of the serial run. With fewer cores the
+pipelined time only shows the cost of the worker process """
+import os
+import tempfile
+from time import perf_counter
+
+import free_particles
+import nano_imprint
+from particle_simulator.simconf import SimConfig
+from particle_simulator.pipeline import FramePipeline
+from particle_simulator.video import export_video
+
+
+OUTPUT_PHASES = ('render', 'encode')
+
+
+def tester(sim, frames, pipelined):
+    """ Returns the wall time to export the frames of a simulation """
+    start = perf_counter()
+    if pipelined:
+        with FramePipeline(sim, frames) as pipeline:
+            export_video(sim, pipeline)
+    else:
+        sim.simconf = sim.simconf.replace(total_frames=frames)
+        export_video(sim)
+    return perf_counter() - start
+
+
+def get_overlap_bound(profiler):
+    """ Returns the speedup of a perfect overlap of the simulation phases with the output phases of a
+    profiled serial run """
+    summary = profiler.summary()
+    output = sum(summary[name]['total'] for name in OUTPUT_PHASES if name in summary)
+    simulation = summary['frame']['total'] - output
+    return summary['frame']['total'] / max(simulation, output)
+
+
+def main(frames=60):
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    print(f"cores: {cores}")
+    if cores < 2:
+        print("Only one core: the worker shares it with the renderer and ffmpeg, so the speedup below is not a "
+              "measurement of the overlap (unverified on this machine).")
+    print(f"{'simulation':>15} {'particles':>10} {'serial (s)':>11} {'pipelined (s)':>14} {'speedup':>8} "
+          f"{'bound':>6}")
+    with tempfile.TemporaryDirectory() as directory:
+        video = dict(export_to_video=True, export_renderer='raster',
+                     filename=os.path.join(directory, 'benchmark_pipeline.mp4'))
+        free_conf = SimConfig(free_particles.CONFIG_PATH, timestep=0.1, particles_count=500, **video)
+        nano_conf = SimConfig(nano_imprint.CONFIG_PATH, **video)
+        scenarios = [
+            ('free_particles', lambda: free_particles.FreeParticlesSimulator(free_conf)),
+            ('nano_imprint', lambda: nano_imprint.FreeParticlesSimulator(nano_conf, particle_radius=0.05)),
+        ]
+        for name, get_simulator in scenarios:
+            sim = get_simulator()
+            profiler = sim.enable_profiling()
+            serial = tester(sim, frames, pipelined=False)
+            sim = get_simulator()
+            pipelined = tester(sim, frames, pipelined=True)
+            print(f"{name:>15} {len(sim.particles):>10} {serial:>11.2f} {pipelined:>14.2f} {serial / pipelined:>8.2f} "
+                  f"{get_overlap_bound(profiler):>6.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+""" Compares the initial placement of free_particles built particle by particle (Particle objects on a
+fixed unit grid, from Python random) and as whole arrays (get_particle_system, a seeded lattice of cells
+with random positions inside the cells): the setup time, the overlapping pairs and the particles outside
+the box. Then checks that spawned workers using different streams of a seed create reproducible and
+distinct ensembles """
+import hashlib
+import math
+import multiprocessing
+from random import Random
+from time import perf_counter
+
+import numpy as np
+
+import free_particles
+from particle_simulator import collisions
+from particle_simulator.particle import Particle, ParticleSystem
+
+SEED = 0
+
+
+def get_particle(index, bbox_size, rand):
+    """ The particle that free_particles used to create """
+    p = Particle()
+    p.x = 1 + (index % (bbox_size - 2))
+    p.y = int(1 + ((index / (bbox_size - 2)) % (bbox_size - 2)))
+    p.z = int(index / ((bbox_size - 2) * (bbox_size - 2))) + 1
+    p.vx, p.vy, p.vz = rand(), rand(), rand()
+    p.mass = 0.01 + 0.1 * rand()
+    p.radius = np.cbrt(p.mass)
+    p.colour = (0.5 - rand() / 2, 0.5 - rand() / 2, 0.5 - rand() / 2)
+    return p
+
+
+def build_objects(count, bbox_size):
+    rand = Random(SEED).random
+    return ParticleSystem.from_particles([get_particle(i, bbox_size, rand) for i in range(0, count)])
+
+
+def build_arrays(count, bbox_size):
+    return free_particles.get_particle_system(count, bbox_size, free_particles.get_generator(SEED))
+
+
+def get_errors(ps, bbox_size):
+    """ Returns the number of overlapping pairs and of particles that are not inside the box """
+    i, _ = collisions.find_overlapping_pairs(ps.pos, ps.radius)
+    outside = ((ps.pos < ps.radius) | (ps.pos > bbox_size - ps.radius)).any(axis=0)
+    return len(i), np.count_nonzero(outside)
+
+
+def get_ensemble(stream, count=10000, bbox_size=24):
+    """ Worker task: returns the checksum of the ensemble of a stream """
+    ps = free_particles.get_particle_system(count, bbox_size, free_particles.get_generator(SEED, stream))
+    return hashlib.sha256(ps.pos.tobytes() + ps.vel.tobytes() + ps.mass.tobytes()).hexdigest()
+
+
+def main(workers=8):
+    print(f"{'particles':>10} {'box':>5} {'mode':>8} {'time (s)':>9} {'overlaps':>9} {'outside':>8}")
+    for count in (1000, 10000, 100000, 1000000):
+        bbox_size = max(10, math.ceil(math.cbrt(count)) + 2)  # as the regression suite, the unit grid fits
+        modes = (('objects', build_objects), ('arrays', build_arrays))
+        for mode, fun in modes[count > 100000:]:  # particle by particle takes seconds for a million particles
+            start = perf_counter()
+            ps = fun(count, bbox_size)
+            elapsed = perf_counter() - start
+            overlaps, outside = get_errors(ps, bbox_size)
+            print(f"{count:>10} {bbox_size:>5} {mode:>8} {elapsed:>9.4f} {overlaps:>9} {outside:>8}")
+
+    # The old unit grid is sized for bbox_size - 2 particles per row, more particles leave the box
+    overlaps, outside = get_errors(build_objects(2000, 10), 10)
+    print(f"2000 particles in a box of 10 built particle by particle: {overlaps} overlaps, {outside} outside")
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=min(workers, multiprocessing.cpu_count())) as pool:
+        first = pool.map(get_ensemble, range(0, workers))
+        second = pool.map(get_ensemble, reversed(range(0, workers)))
+    print(f"{workers} streams: reproducible {first == second[::-1]}, distinct {len(set(first)) == workers}")
+
+
+if __name__ == '__main__':
+    main()
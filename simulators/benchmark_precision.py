@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+""" Validation of the float32 precision mode (simconf.precision): runs free_particles and nano_imprint in
+float64 and in float32 and compares their trajectories and displacement fields, with the throughput and
+the memory of each mode
+
+Every run records its trajectory (positions and velocities every RECORD_EVERY steps) in a fresh worker
+process, so that its peak RSS is its own. The trajectories of the two modes are compared frame by frame by
+the largest and the root mean square distance between the positions of the same particle (in particle
+radii), and by the first frame where a particle is more than DIVERGENCE radii away. free_particles is
+chaotic (every collision amplifies a difference), so its trajectories diverge whatever the precision and
+it is judged by its statistics: the drift of the kinetic energy (of each mode, the impulse model does not
+conserve it) and the mean displacement. nano_imprint is judged by its
+final displacement field (relative L2 error) and by the number of particles displaced by more than 10 % of
+their radius (the imprint).
+
+Usage:
+    python benchmark_precision.py [--scenario nano_imprint] [--steps 200]
+
+The statistics are printed as float64 / float32.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from benchmark_regression import get_simulator
+from particle_simulator.particle import PRECISIONS
+from particle_simulator.trajectory import TrajectoryReader
+
+RECORD_EVERY = 10
+DIVERGENCE = 0.01
+
+# name -> (simulation, size), the size is the particles count of free_particles and the particle radius of nano_imprint
+SCENARIOS = {
+    'free_particles': ('free_particles', 10000),
+    'nano_imprint': ('nano_imprint', 0.025),
+}
+
+
+def run(name, precision, steps, path):
+    """ Records a scenario in one precision (in a worker process) and returns its measurements """
+    simulation, size = SCENARIOS[name]
+    sim = get_simulator(simulation, size, precision)
+    ps = sim.particles
+    arrays = sum(a.nbytes for a in (ps.pos, ps.pos0, ps.vel, ps.force, ps.mass, ps.radius, ps.colour, ps.locked))
+    start = perf_counter()
+    sim.record(path, steps, RECORD_EVERY, velocities=True, locked=False)
+    elapsed = perf_counter() - start
+    sim.close()
+    return {
+        'precision': precision,
+        'particles': len(ps),
+        'steps_per_second': steps / elapsed,
+        'arrays': arrays,
+        'trajectory': os.path.getsize(path),
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,  # kilobytes on Linux
+    }
+
+
+def get_kinetic_energy(reader, frame):
+    vel = np.asarray(reader.velocities[frame], dtype=np.float64)
+    return (reader.mass * vel * vel).sum(dtype=np.float64) / 2
+
+
+def compare(reference, other):
+    """ Returns the differences between the trajectories of two precisions (reference in float64)
+
+    :rtype: dict
+    """
+    radius = np.asarray(reference.radius, dtype=np.float64)
+    largest, rms = [], []
+    for frame in range(0, len(reference)):
+        d = np.asarray(reference.positions[frame], dtype=np.float64) - other.positions[frame]
+        distance = np.sqrt(np.einsum('ij,ij->j', d, d)) / radius
+        largest.append(np.nanmax(distance))
+        rms.append(np.sqrt(np.nanmean(distance * distance)))
+    diverged = np.flatnonzero(np.array(largest) > DIVERGENCE)
+
+    displacement = [np.asarray(r.get_displacement(-1), dtype=np.float64) for r in (reference, other)]
+    valid = ~np.isnan(displacement[0]) & ~np.isnan(displacement[1])
+    field = np.linalg.norm(displacement[1][valid] - displacement[0][valid]) / np.linalg.norm(displacement[0][valid])
+    energy = [get_kinetic_energy(r, 0) for r in (reference, other)]
+    drift = [get_kinetic_energy(r, -1) / e - 1 if e > 0 else None for r, e in zip((reference, other), energy)]
+    return {
+        'largest': largest[-1],
+        'rms': rms[-1],
+        'diverged': reference.get_step(diverged[0]) if diverged.size else None,
+        'field': field,
+        'imprint': [int((d[valid] > 0.1 * radius[valid]).sum()) for d in displacement],
+        'mean_displacement': [d[valid].mean() for d in displacement],
+        'drift': drift,
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help="scenario to run (repeatable), all scenarios by default")
+    parser.add_argument('--steps', type=int, default=200, help="the number of steps of every run")
+    args = parser.parse_args(args)
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.scenario or list(SCENARIOS):
+            paths = {p: os.path.join(directory, f'{name}-{p}.traj') for p in PRECISIONS}
+            results = []
+            for precision in PRECISIONS:
+                with context.Pool(1) as pool:
+                    results.append(pool.apply(run, (name, precision, args.steps, paths[precision])))
+
+            print(f"{name} ({results[0]['particles']} particles, {args.steps} steps)")
+            print(f"{'precision':>10} {'steps/s':>9} {'speedup':>8} {'arrays (MB)':>12} {'trajectory (MB)':>16} "
+                  f"{'peak RSS (MB)':>14}")
+            for r in results:
+                print(f"{r['precision']:>10} {r['steps_per_second']:>9.2f} "
+                      f"{r['steps_per_second'] / results[0]['steps_per_second']:>8.2f} {r['arrays'] / 2 ** 20:>12.1f} "
+                      f"{r['trajectory'] / 2 ** 20:>16.1f} {r['peak_rss'] / 2 ** 20:>14.1f}")
+
+            c = compare(*(TrajectoryReader(paths[p]) for p in PRECISIONS))
+            diverged = 'never' if c['diverged'] is None else f"at step {c['diverged']}"
+            print(f"  float32 - float64: final position difference {c['largest']:.2e} radii (largest), "
+                  f"{c['rms']:.2e} (rms), more than {DIVERGENCE} radii {diverged}")
+            print(f"  displacement field: relative L2 error {c['field']:.2e}, mean {c['mean_displacement'][0]:.4f} / "
+                  f"{c['mean_displacement'][1]:.4f}, displaced particles {c['imprint'][0]} / {c['imprint'][1]}")
+            if SCENARIOS[name][0] == 'free_particles' and c['drift'][0] is not None:
+                print(f"  kinetic energy drift since the first frame: {c['drift'][0]:.2e} / {c['drift'][1]:.2e}")
+
+
+if __name__ == '__main__':
+    main()
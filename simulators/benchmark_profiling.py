@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+""" Measures the overhead of the per-phase profiling (disabled and enabled) on the step time of
+both simulations, and prints the phase summary of a profiled run """
+import os
+import tempfile
+from time import perf_counter
+
+import free_particles
+import nano_imprint
+from particle_simulator.profiling import NULL_PROFILER, Profiler
+from particle_simulator.simconf import SimConfig
+
+
+def tester(get_simulator, steps, profiler, repeats=3):
+    """ Returns the best mean step time of a number of runs """
+    times = []
+    for _ in range(0, repeats):
+        sim = get_simulator()
+        sim.profiler = profiler()
+        start = perf_counter()
+        sim.step(steps)
+        times.append((perf_counter() - start) / steps)
+    return min(times), sim
+
+
+def get_phase_overhead(calls=10 ** 6):
+    """ Returns the cost of one disabled phase block """
+    start = perf_counter()
+    for _ in range(0, calls):
+        with NULL_PROFILER.phase('physics'):
+            pass
+    return (perf_counter() - start) / calls
+
+
+def main(steps=100):
+    print(f"Disabled phase block: {1e9 * get_phase_overhead():.0f} ns")
+    print(f"{'simulation':>15} {'particles':>10} {'disabled (s)':>13} {'enabled (s)':>12} {'overhead':>9}")
+    scenarios = [
+        ('free_particles', lambda: free_particles.FreeParticlesSimulator(
+            SimConfig(free_particles.CONFIG_PATH, particles_count=500))),
+        ('nano_imprint', lambda: nano_imprint.FreeParticlesSimulator(particle_radius=0.05)),
+    ]
+    for name, get_simulator in scenarios:
+        disabled, _ = tester(get_simulator, steps, lambda: NULL_PROFILER)
+        enabled, sim = tester(get_simulator, steps, Profiler)
+        print(f"{name:>15} {len(sim.particles):>10} {disabled:>13.5f} {enabled:>12.5f} {enabled / disabled - 1:>9.1%}")
+        print(sim.profiler.format_summary())
+        with tempfile.TemporaryDirectory() as directory:
+            for extension in ('csv', 'json'):
+                sim.profiler.save(os.path.join(directory, f'{name}.{extension}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+""" Performance regression suite: runs seeded free_particles and nano_imprint scenarios headlessly
+at several sizes and checks them against stored baselines
+
+Every scenario runs in a fresh worker process (so its peak RSS is its own) and records the steps per
+second, the peak RSS, the transient memory allocated per step (tracemalloc, measured over extra steps
+after the timing) and a SHA-256 checksum of the final positions and velocities. A scenario fails if it
+became slower than its baseline by more than the tolerance, or if its final state changed. A checksum
+mismatch whose state moments (sums and sums of squares of the positions and velocities) still match
+the baseline within 1e-9 is reported as 'close' (e.g. another numpy build or CPU) and only fails
+with --strict. The steps are timed in rounds and the speed is taken from the median round.
+
+Usage:
+    python benchmark_regression.py [--scenario free_particles-1000] [--tolerance 0.2] [--strict]
+    python benchmark_regression.py --update  # measures and stores new baselines
+"""
+import argparse
+import gc
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+import free_particles
+import nano_imprint
+from particle_simulator.simconf import SimConfig
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_regression.json')
+SEED = 42
+ROUNDS = 5
+TRACED_STEPS = 3
+
+# name -> (simulation, size, steps), the size is the particles count of free_particles and the
+# particle radius of nano_imprint
+SCENARIOS = {
+    'free_particles-100': ('free_particles', 100, 2000),
+    'free_particles-1000': ('free_particles', 1000, 500),
+    'free_particles-10000': ('free_particles', 10000, 100),
+    'nano_imprint-0.1': ('nano_imprint', 0.1, 400),
+    'nano_imprint-0.05': ('nano_imprint', 0.05, 100),
+}
+
+
+def get_simulator(simulation, size, precision='float64'):
+    """ Returns the seeded simulator of a scenario """
+    if simulation == 'free_particles':
+        bbox_size = max(10, int(math.ceil(math.cbrt(size))) + 2)  # the initial lattice fits in the box
+        simconf = SimConfig(free_particles.CONFIG_PATH, particles_count=size, bbox_size=bbox_size, precision=precision)
+        return free_particles.FreeParticlesSimulator(simconf, seed=SEED)
+    simconf = SimConfig(nano_imprint.CONFIG_PATH, precision=precision)
+    return nano_imprint.FreeParticlesSimulator(simconf, particle_radius=size)
+
+
+def get_checksum(sim):
+    """ Returns the SHA-256 of the positions and velocities """
+    return hashlib.sha256(sim.particles.pos.tobytes() + sim.particles.vel.tobytes()).hexdigest()
+
+
+def run_scenario(name):
+    """ Runs a scenario (in a worker process) and returns its measurements """
+    simulation, size, steps = SCENARIOS[name]
+    sim = get_simulator(simulation, size)
+
+    times = []
+    gc.disable()  # no collections in the middle of a round
+    for _ in range(0, ROUNDS):
+        start = perf_counter()
+        sim.step(steps // ROUNDS)
+        times.append(perf_counter() - start)
+    gc.enable()
+    checksum = get_checksum(sim)
+    state = np.concatenate((sim.particles.pos, sim.particles.vel))
+    moments = np.concatenate((state.sum(axis=1), (state * state).sum(axis=1))).tolist()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kilobytes on Linux
+
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(0, TRACED_STEPS):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        sim.step()
+        allocated += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return {
+        'name': name,
+        'particles': len(sim.particles),
+        'steps': steps,
+        'steps_per_second': steps // ROUNDS / statistics.median(times),
+        'peak_rss': peak_rss,
+        'allocated_per_step': allocated // TRACED_STEPS,
+        'checksum': checksum,
+        'moments': moments,
+    }
+
+
+def run_scenarios(names):
+    """ Runs every scenario in its own worker process """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        return pool.map(run_scenario, names, chunksize=1)
+
+
+def check(result, baseline, tolerance=0.2, strict=False):
+    """ Compares a result with its baseline
+
+    :return: speed ratio to the baseline, state status ('identical', 'close' or 'changed') and whether it failed
+    :rtype: tuple[float, str, bool]
+    """
+    ratio = result['steps_per_second'] / baseline['steps_per_second']
+    if result['checksum'] == baseline['checksum']:
+        status = 'identical'
+    elif np.allclose(result['moments'], baseline['moments'], rtol=1e-9, atol=1e-9):
+        status = 'close'
+    else:
+        status = 'changed'
+    failed = ratio < 1 - tolerance or status == 'changed' or (strict and status == 'close')
+    return ratio, status, failed
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)['scenarios']
+
+
+def save_baselines(path, results):
+    metadata = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                'processor': platform.processor(), 'system': platform.platform()}
+    with open(path, 'w') as file:
+        json.dump({'metadata': metadata, 'scenarios': {r['name']: r for r in results}}, file, indent=1)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help="scenario to run (repeatable), all scenarios by default")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="JSON file of the baselines")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="the relative slowdown that is still accepted")
+    parser.add_argument('--strict', action='store_true', help="final states must be bitwise identical")
+    parser.add_argument('--update', action='store_true', help="stores the results as the new baselines")
+    args = parser.parse_args(args)
+
+    results = run_scenarios(args.scenario or list(SCENARIOS))
+    baselines = load_baselines(args.baseline)
+
+    print(f"{'scenario':>22} {'particles':>10} {'steps/s':>9} {'base':>9} {'ratio':>6} {'RSS (MB)':>9} "
+          f"{'alloc/step (MB)':>16} {'state':>10}")
+    failed = False
+    for r in results:
+        line = f"{r['name']:>22} {r['particles']:>10} {r['steps_per_second']:>9.2f} "
+        if r['name'] in baselines and not args.update:
+            ratio, status, fail = check(r, baselines[r['name']], args.tolerance, args.strict)
+            line += f"{baselines[r['name']]['steps_per_second']:>9.2f} {ratio:>6.2f} "
+            failed |= fail
+        else:
+            status, fail = 'new', False
+            line += f"{'-':>9} {'-':>6} "
+        print(line + f"{r['peak_rss'] / 2 ** 20:>9.1f} {r['allocated_per_step'] / 2 ** 20:>16.3f} {status:>10}"
+              + ("  REGRESSION" if fail else ""))
+
+    if args.update:
+        save_baselines(args.baseline, list({**baselines, **{r['name']: r for r in results}}.values()))
+    elif failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
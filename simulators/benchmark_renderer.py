@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+""" Compares the frame rate of the live matplotlib view with full redraws and with blitting (cached
+background, particles re-pushed only when they moved more than a pixel threshold). The frames are
+recorded first and drawn on an Agg canvas, so physics is not timed """
+from time import perf_counter
+
+import matplotlib
+
+import free_particles
+import nano_imprint
+from particle_simulator.renderer import Renderer
+from particle_simulator.simconf import SimConfig
+
+
+def tester(sim, frames, blit):
+    """ Returns the frames per second of the live view """
+    sim.simconf = sim.simconf.replace(blit=blit)
+    renderer = Renderer(sim)
+    renderer.setup()
+    start = perf_counter()
+    for frame in frames:
+        renderer.draw_frame(frame)
+    fps = len(frames) / (perf_counter() - start)
+    matplotlib.pyplot.close(renderer.fig)
+    return fps
+
+
+def main(frames=60):
+    matplotlib.use('Agg')
+    print(f"{'simulation':>15} {'particles':>10} {'target (fps)':>13} {'full (fps)':>11} {'blit (fps)':>11} "
+          f"{'speedup':>8}")
+    scenarios = [
+        ('free_particles', free_particles.FreeParticlesSimulator(
+            SimConfig(free_particles.CONFIG_PATH, particles_count=500))),
+        ('nano_imprint', nano_imprint.FreeParticlesSimulator(particle_radius=0.1)),
+        ('nano_imprint', nano_imprint.FreeParticlesSimulator(particle_radius=0.05)),
+    ]
+    for name, sim in scenarios:
+        recorded = sim.simulate(frames)
+        full = tester(sim, recorded, blit=False)
+        blit = tester(sim, recorded, blit=True)
+        print(f"{name:>15} {len(sim.particles):>10} {sim.simconf.framerate:>13} {full:>11.2f} {blit:>11.2f} "
+              f"{blit / full:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+""" Measures the startup time of worker simulations. 100 simulations are started in freshly spawned
+worker processes (every worker imports the simulator and loads its configuration), and the cost of
+an explicit SimConfig is compared with the inspect.stack() lookup of the main script's name """
+import inspect
+import multiprocessing
+import os
+from time import perf_counter
+
+import nano_imprint
+from particle_simulator.simconf import SimConfig
+
+
+def start_simulation(timestep):
+    """ Worker task: creates a simulation with its own configuration and advances it by one step """
+    start = perf_counter()
+    sim = nano_imprint.FreeParticlesSimulator(SimConfig(nano_imprint.CONFIG_PATH, timestep=timestep))
+    sim.step()
+    return perf_counter() - start
+
+
+def get_script_name():
+    """ The name lookup that simconf used to do at import time """
+    return os.path.basename(inspect.stack()[-1].filename).rsplit(".", 1)[0]
+
+
+def load_config():
+    return SimConfig(nano_imprint.CONFIG_PATH).timestep
+
+
+def tester(fun, repeats=200):
+    """ Returns the mean time of a call of fun """
+    start = perf_counter()
+    for _ in range(0, repeats):
+        fun()
+    return (perf_counter() - start) / repeats
+
+
+def main(workers=100):
+    print(f"inspect.stack() lookup: {1e3 * tester(get_script_name):.3f} ms")
+    print(f"SimConfig load:         {1e3 * tester(load_config):.3f} ms")
+
+    context = multiprocessing.get_context('spawn')
+    start = perf_counter()
+    # Every task runs in a new process, so every simulation pays the imports and the configuration loading
+    with context.Pool(processes=os.cpu_count(), maxtasksperchild=1) as pool:
+        times = pool.map(start_simulation, [1.0] * workers, chunksize=1)
+    total = perf_counter() - start
+    print(f"{workers} spawned worker simulations: {total:.2f} s wall, "
+          f"{1e3 * sum(times) / workers:.1f} ms mean setup and first step per simulation")
+
+
+if __name__ == '__main__':
+    main()
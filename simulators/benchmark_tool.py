@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+""" Compares the contact query of the single particle tool of nano_imprint (every cell of the index box
+around the tool) with the precomputed stencils of multi-particle tools. The stencil pairs grow with the
+surface of a tool, while the pairs of an index box around the same tool (every cell against every tool
+particle) grow with its volume. The overlap is the
+deepest remaining overlap of a part particle with the tool, checked every few frames """
+from time import perf_counter
+
+import numpy as np
+
+import nano_imprint
+from particle_simulator.tool import Tool
+
+RADIUS = 0.1
+
+
+def get_tools():
+    relief = np.indices((12, 12)).sum(axis=0) % 4 // 2 * 2 * RADIUS
+    return [('sphere', None), ('pyramid', Tool.pyramid(2, 1.5, RADIUS)), ('cylinder', Tool.cylinder(0.5, 1, RADIUS)),
+            ('stamp', Tool.stamp(relief, 2 * RADIUS, RADIUS))]
+
+
+def get_box_cells(tool):
+    """ The number of cells of the index box that encloses a tool (the query of the single particle tool) """
+    if tool is None:
+        return (2 * int(nano_imprint.get_tool().radius / RADIUS)) ** 3
+    extent = tool.offsets.max(axis=1) - tool.offsets.min(axis=1) + 2 * (tool.radius.max() + RADIUS)
+    return int(np.prod(np.ceil(extent / (2 * RADIUS))))
+
+
+def get_overlap(sim):
+    ps = sim.particles
+    part = np.arange(1, 1 + np.prod(sim.part_shape))
+    tool = sim.tool_index if sim.tool is not None else np.zeros(1, dtype=int)
+    d = ps.pos[:, part, None] - ps.pos[:, None, tool]
+    dist = np.sqrt(np.einsum('ijk,ijk->jk', d, d)) - ps.radius[part, None] - ps.radius[None, tool]
+    return -min(np.nanmin(dist), 0)
+
+
+def tester(tool, frames, velocity):
+    """ Returns the mean frame time and the deepest overlap of a run """
+    sim = nano_imprint.FreeParticlesSimulator(particle_radius=RADIUS, tool=tool, tool_velocity=velocity)
+    elapsed, overlap = 0.0, 0.0
+    for frame in range(0, frames):
+        start = perf_counter()
+        sim.step()
+        elapsed += perf_counter() - start
+        if frame % 5 == 0:
+            overlap = max(overlap, get_overlap(sim))
+    return elapsed / frames, overlap
+
+
+def main(frames=60):
+    print(f"{'tool':>9} {'particles':>10} {'box pairs':>10} {'stencil pairs':>14} {'velocity':>9} "
+          f"{'frame (s)':>10} {'overlap':>9}")
+    for name, tool in get_tools():
+        count = len(tool) if tool is not None else 1
+        box = get_box_cells(tool) * count
+        pairs = len(tool.get_stencil(RADIUS)) if tool is not None else box
+        for velocity in ((0.1, -0.1), (0.02, -0.02)):
+            elapsed, overlap = tester(tool, frames, velocity)
+            print(f"{name:>9} {count:>10} {box:>10} {pairs:>14} {velocity[0]:>9} {elapsed:>10.4f} "
+                  f"{overlap:>9.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+""" Measures the overhead of recording every frame of nano_imprint in a memory-mapped trajectory
+file and checks that a simulation resumed from the trajectory continues identically """
+import os
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+import nano_imprint
+from particle_simulator.trajectory import TrajectoryReader, TrajectoryWriter
+
+
+def tester(sim, frames, trajectory=None):
+    """ Returns the mean time of a simulation step (including recording) """
+    start = perf_counter()
+    sim.simulate(frames, trajectory=trajectory)
+    return (perf_counter() - start) / frames
+
+
+def check_resume(path, frames=40):
+    """ Records a run, resumes a new simulator from the middle frame and checks that the final states are equal """
+    recorded = nano_imprint.FreeParticlesSimulator()
+    reader = recorded.record(path, frames)
+    resumed = nano_imprint.FreeParticlesSimulator()
+    reader.restore(resumed, frames // 2 - 1)
+    resumed.step(frames - resumed.frame)
+    assert np.array_equal(resumed.particles.pos, recorded.particles.pos), "The resumed run differs"
+
+
+def main(frames=60, repeats=3):
+    with tempfile.TemporaryDirectory() as directory:
+        run(os.path.join(directory, 'nano_imprint.traj'), frames, repeats)
+
+
+def run(path, frames, repeats):
+    check_resume(path)
+    print("Resumed run is identical: True")
+    print(f"{'radius':>7} {'no recording (s)':>17} {'positions (s)':>14} {'overhead':>9} "
+          f"{'all fields (s)':>15} {'overhead':>9}")
+    for radius in (0.1, 0.05):
+        base = min(tester(nano_imprint.FreeParticlesSimulator(particle_radius=radius), frames) for _ in range(0, repeats))
+        results = []
+        for fields in (False, True):
+            times = []
+            for _ in range(0, repeats):
+                sim = nano_imprint.FreeParticlesSimulator(particle_radius=radius)
+                with TrajectoryWriter(path, sim.particles, frames, sim.simconf, velocities=fields,
+                                      locked=fields) as trajectory:
+                    times.append(tester(sim, frames, trajectory))
+            results.append(min(times))
+        print(f"{radius:>7} {base:>17.4f} {results[0]:>14.4f} {results[0] / base - 1:>9.1%} "
+              f"{results[1]:>15.4f} {results[1] / base - 1:>9.1%}")
+        assert len(TrajectoryReader(path)) == frames
+
+
+if __name__ == '__main__':
+    main()
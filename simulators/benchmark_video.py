@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+""" Compares the export speed (frames per second) of the matplotlib FFMpegWriter and the raster
+renderer that pipes raw frames to ffmpeg. The frames are recorded first, so physics is not timed """
+import os
+import tempfile
+from time import perf_counter
+
+import matplotlib
+
+import nano_imprint
+from particle_simulator.simconf import SimConfig
+from particle_simulator.renderer import Renderer
+from particle_simulator.video import export_video
+
+
+def tester(export, sim, frames):
+    """ Returns the frames per second of an export function """
+    start = perf_counter()
+    export(sim, frames)
+    return len(frames) / (perf_counter() - start)
+
+
+def export_matplotlib(sim, frames):
+    Renderer(sim).run(frames)
+
+
+def main(frames=60):
+    matplotlib.use('Agg')
+    print(f"{'radius':>7} {'particles':>10} {'matplotlib (fps)':>17} {'raster (fps)':>13} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        simconf = SimConfig(nano_imprint.CONFIG_PATH, export_to_video=True, export_renderer='raster',
+                            framerate=60, filename=os.path.join(directory, 'benchmark_video.mp4'))
+        for radius in (0.1, 0.05):
+            sim = nano_imprint.FreeParticlesSimulator(simconf, particle_radius=radius)
+            recorded = sim.simulate(frames)
+            fps_matplotlib = tester(export_matplotlib, sim, recorded)
+            fps_raster = tester(export_video, sim, recorded)
+            print(f"{radius:>7} {len(sim.particles):>10} {fps_matplotlib:>17.2f} {fps_raster:>13.2f} "
+                  f"{fps_raster / fps_matplotlib:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,157 @@
 import math
+import os
+from functools import partial
 
 import numpy as np
-from random import random
 
-from particle_simulator import simconf
+from particle_simulator import collisions
+from particle_simulator.events import EventEngine
+from particle_simulator.integrators import get_integrator
+from particle_simulator.simconf import SimConfig
 from particle_simulator.simulator import Simulator
-from particle_simulator.particle import Particle
+from particle_simulator.particle import Particle, ParticleSystem
+from particle_simulator.profiling import NULL_PROFILER
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'free_particles.ini')
+CONTACT_STIFFNESS = 1000.0  # spring constant of the soft contacts used with an integrator
+MASS_RANGE = (0.01, 0.11)  # the masses of the particles are drawn uniformly from this range
 
 
 class FreeParticlesSimulator(Simulator):
-    def __init__(self):
-        self.particles = [get_particle(i) for i in range(0, simconf.particles_count)]
-        self.simconf = simconf
+    def __init__(self, simconf=None, vectorized=True, seed=None, event_driven=False, stream=0):
+        self.simconf = simconf or SimConfig(CONFIG_PATH)  # Loads the simulator config
+        self.arguments = dict(vectorized=vectorized, seed=seed, event_driven=event_driven, stream=stream)
+        # A seed makes the initial state reproducible, parallel workers use different streams of the same seed
+        self.random = get_generator(seed, stream)  # the state is kept in checkpoints
+        self.particles = get_particle_system(
+            self.simconf.particles_count, self.simconf.bbox_size, self.random, self.simconf.precision)
+        self.vectorized = vectorized  # Step all particles with whole array operations
+        # Otherwise the particles are stepped one by one as Particle copies, copied to the system after every step
+        self.particles_list = None if vectorized else self.particles.to_particles()
+        # Jumps between predicted wall and particle impacts instead of reflecting after fixed timesteps
+        self.engine = None
+        if event_driven:
+            self.engine = EventEngine(self.particles, self.simconf.bbox_size, self.simconf.timestep)
+        # With an integrator, contacts are soft springs integrated in sub-steps instead of velocity reflections
+        self.integrator = None
+        if self.simconf.integrator is not None:
+            self.integrator = get_integrator(self.simconf.integrator, self.simconf.substeps, self.simconf.tolerance,
+                                             self.simconf.timestep, get_contact_frequency(self.particles))
+            self.update_forces = partial(update_contact_forces, bbox_size=self.simconf.bbox_size)
 
     def update_particles(self):
-        for i in range(0, len(self.particles)):
-            update_particle_position(self.particles[i])
-            update_wall_collisions(self.particles[i])
+        if self.engine is not None:
+            with self.profiler.phase('events'):
+                self.engine.step()
+            return
+
+        if self.integrator is not None:
+            with self.profiler.phase('physics'):
+                self.integrator.advance(self.particles, self.simconf.timestep, self.update_forces)
+            return
+
+        with self.profiler.phase('physics'):
+            if self.vectorized:
+                update_particles_position(self.particles, self.simconf.timestep)
+                update_particles_wall_collisions(self.particles, self.simconf.bbox_size)
+            else:
+                for p in self.particles_list:
+                    update_particle_position(p, self.simconf.timestep)
+                    update_wall_collisions(p, self.simconf.bbox_size)
+                self.particles.copy_from_particles(self.particles_list, ('pos', 'vel'))
+
+        update_particle_collisions(self.particles, self.profiler)
+        if self.particles_list is not None:
+            self.particles.copy_to_particles(self.particles_list, ('vel',))
+
+    def get_state(self):
+        state = super().get_state()
+        state['random'] = self.random.bit_generator.state
+        if self.engine is not None:
+            state['engine'] = self.engine.get_state()
+        if self.integrator is not None:
+            state['integrator'] = self.integrator.get_state()
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.load_particles()
+        self.random.bit_generator.state = state['random']
+        if self.engine is not None:
+            self.engine.set_state(state['engine'])
+        if self.integrator is not None:
+            self.integrator.set_state(state.get('integrator', {}))
+
+    def load_particles(self):
+        """ The per-particle steps continue from the positions and velocities of the system """
+        if self.particles_list is not None:
+            self.particles.copy_to_particles(self.particles_list, ('pos', 'vel'))
+
+
+def update_particle_position(p: Particle, timestep):
+    p.x += p.vx * timestep
+    p.y += p.vy * timestep
+    p.z += p.vz * timestep
+
+
+def update_wall_collisions(p: Particle, bbox_size):
+    """Detects the collision of a particle with the bounding box and returns the particle's updated velocity"""
+    if not p.radius <= p.x <= (bbox_size - p.radius):
+        p.vx = -p.vx
+    if not p.radius <= p.y <= (bbox_size - p.radius):
+        p.vy = -p.vy
+    if not p.radius <= p.z <= (bbox_size - p.radius):
+        p.vz = -p.vz
 
-        # update_particle_collisions(self.particles)
 
+def update_particles_position(ps: ParticleSystem, timestep):
+    """ Advances the positions of all particles of the system (batched update_particle_position) """
+    ps.pos += ps.vel * timestep
 
-def update_particle_position(p: Particle):
-    p.x += p.vx * simconf.timestep
-    p.y += p.vy * simconf.timestep
-    p.z += p.vz * simconf.timestep
 
+def update_particles_wall_collisions(ps: ParticleSystem, bbox_size):
+    """ Reverses every velocity component of the system whose particle is outside the bounding box
+    on that axis (batched update_wall_collisions)
+    """
+    outside = (ps.pos < ps.radius) | (ps.pos > bbox_size - ps.radius)
+    np.negative(ps.vel, out=ps.vel, where=outside)
 
-def update_wall_collisions(p: Particle):
-    """Detects the collision of a particle with the bounding box and returns the particle's updated velocity"""
-    if not p.radius <= p.x <= (simconf.bbox_size - p.radius):
-        p.vx = -p.vx
-    if not p.radius <= p.y <= (simconf.bbox_size - p.radius):
-        p.vy = -p.vy
-    if not p.radius <= p.z <= (simconf.bbox_size - p.radius):
-        p.vz = -p.vz
+
+def update_particle_collisions(ps: ParticleSystem, profiler=NULL_PROFILER):
+    """ Detects particle-particle collisions (uniform grid broad phase) and updates the velocities
+    of the colliding particles (elastic collisions) """
+    collisions.update_collisions(ps, profiler)
+
+
+def update_contact_forces(ps: ParticleSystem, bbox_size, stiffness=CONTACT_STIFFNESS):
+    """ Sets the forces of soft sphere contacts: overlapping particles, and particles that overlap a wall
+    of the bounding box, are pushed apart by a linear spring on the overlap """
+    i, j = collisions.find_overlapping_pairs(ps.pos, ps.radius)
+    d = ps.pos[:, i] - ps.pos[:, j]
+    distance = np.sqrt(np.einsum('ij,ij->j', d, d))
+    push = stiffness * (ps.radius[i] + ps.radius[j] - distance) / np.maximum(distance, 1e-12) * d
+
+    n = len(ps)
+    ps.force[:] = stiffness * (np.maximum(ps.radius - ps.pos, 0) - np.maximum(ps.pos - (bbox_size - ps.radius), 0))
+    for axis in range(0, 3):
+        ps.force[axis] += np.bincount(i, weights=push[axis], minlength=n)
+        ps.force[axis] -= np.bincount(j, weights=push[axis], minlength=n)
+
+
+def get_contact_frequency(ps: ParticleSystem, stiffness=CONTACT_STIFFNESS):
+    """ Returns the highest angular frequency of the soft contacts: two particles of the smallest mass on a
+    spring (their reduced mass is half the mass) """
+    return float(np.sqrt(2 * stiffness / ps.mass.min(initial=np.inf)))
 
 
-def update_particle_collisions(particles: list[Particle]):
-    particles.sort(key=lambda x: x.x)
-    # iterate over elements if two elements are closer than radius + radius then adjust velocity.
-    for i in range(1, len(particles)):
-        if check_collision(particles[i], particles[i - 1]):
-            pass
+def get_contact_energy(ps: ParticleSystem, bbox_size, stiffness=CONTACT_STIFFNESS):
+    """ Returns the kinetic energy plus the energy stored in the soft contact springs """
+    i, j = collisions.find_overlapping_pairs(ps.pos, ps.radius)
+    d = ps.pos[:, i] - ps.pos[:, j]
+    overlap = ps.radius[i] + ps.radius[j] - np.sqrt(np.einsum('ij,ij->j', d, d))
+    walls = np.maximum(ps.radius - ps.pos, 0) ** 2 + np.maximum(ps.pos - (bbox_size - ps.radius), 0) ** 2
+    kinetic = (ps.mass * ps.vel * ps.vel).sum(dtype=np.float64) / 2  # float64 sums, also for float32 systems
+    return kinetic + stiffness / 2 * ((overlap * overlap).sum(dtype=np.float64) + walls.sum(dtype=np.float64))
 
 
 def check_collision(p1: Particle, p2: Particle):
@@ -50,11 +159,11 @@ def check_collision(p1: Particle, p2: Particle):
     if (
             abs(p1.x - p2.x) < min_distance and
             abs(p1.y - p2.y) < min_distance and
-            abs(p1.y - p2.y) < min_distance
+            abs(p1.z - p2.z) < min_distance
     ):
         dx = p1.x - p2.x
         dy = p1.y - p2.y
-        dz = p1.y - p2.y
+        dz = p1.z - p2.z
 
         if math.sqrt(dx * dx + dy * dy + dz * dz) < min_distance:
             return True
@@ -62,16 +171,55 @@ def check_collision(p1: Particle, p2: Particle):
     return False
 
 
-def get_particle(index=0):
-    p = Particle()
-    p.x = 1 + (index % (simconf.bbox_size - 2))
-    p.y = int(1 + ((index / (simconf.bbox_size - 2)) % (simconf.bbox_size - 2)))
-    p.z = int(index / ((simconf.bbox_size - 2) * (simconf.bbox_size - 2))) + 1
-    p.vx, p.vy, p.vz = random(), random(), random()
-    p.mass = 0.01 + 0.1 * random()
-    p.radius = np.cbrt(p.mass)  # For spheres with constant density
-    p.colour = (0.5 - random() / 2, 0.5 - random() / 2, 0.5 - random() / 2)
-    return p
+def get_generator(seed=None, stream=0):
+    """ Returns the random generator of a stream of a seed
+
+    The streams of a seed are independent (they are the children of numpy.random.SeedSequence(seed).spawn),
+    so workers that run the same seed with different streams create reproducible ensembles that do not
+    repeat each other.
+    :param seed: the seed, a random seed from the operating system if None
+    :type seed: int | None
+    :param stream: the index of the stream
+    :type stream: int
+    :rtype: numpy.random.Generator
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(stream,)))
+
+
+def get_particle_system(count, bbox_size, rng, dtype=np.float64):
+    """ Creates particles with random masses, velocities and colours drawn from rng, placed inside the box
+    without overlaps
+
+    The box is split in the smallest cubic lattice of cells with at least count cells. Every particle is
+    placed in its own cell (the cells are chosen at random) at a random position where it stays inside the
+    cell, so the particles overlap neither each other nor the walls.
+    :param count: the number of particles
+    :type count: int
+    :param bbox_size: the size of the bounding box
+    :type bbox_size: float
+    :param rng: the random generator
+    :type rng: numpy.random.Generator
+    :param dtype: the floating point type of the particle arrays
+    :type dtype: numpy.dtype | str
+    :rtype: ParticleSystem
+    """
+    cells = int(round(np.cbrt(count)))
+    cells += cells ** 3 < count
+    spacing = bbox_size / max(cells, 1)
+    if count and 2 * np.cbrt(MASS_RANGE[1]) > spacing:
+        raise ValueError(f"{count} particles of radius up to {np.cbrt(MASS_RANGE[1]):.3f} do not fit in a box "
+                         f"of size {bbox_size}, the box must be at least {2 * np.cbrt(MASS_RANGE[1]) * cells:.2f}.")
+
+    ps = ParticleSystem(count, dtype)
+    ps.mass[:] = MASS_RANGE[0] + (MASS_RANGE[1] - MASS_RANGE[0]) * rng.random(count)
+    ps.radius[:] = np.cbrt(ps.mass)  # For spheres with constant density
+    ps.vel[:] = rng.random((3, count))
+    ps.colour[:, :3] = 0.5 - rng.random((count, 3)) / 2
+    cell = np.unravel_index(rng.choice(cells ** 3, count, replace=False), (cells,) * 3)
+    jitter = (2 * rng.random((3, count)) - 1) * (spacing / 2 - ps.radius)
+    ps.pos[:] = (np.array(cell) + 0.5) * spacing + jitter
+    ps.pos0[:] = ps.pos
+    return ps
 
 
 if __name__ == '__main__':
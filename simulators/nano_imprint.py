@@ -1,41 +1,240 @@
 import math
+import os
+
 import numpy as np
 
-from particle_simulator import simconf
+from particle_simulator import lattice
+from particle_simulator.analysis import Analysis, DisplacementStatistics, SurfaceProfile, ToolContactCount
+from particle_simulator.parallel import SlabEngine
+from particle_simulator.simconf import SimConfig
 from particle_simulator.simulator import Simulator
-from particle_simulator.particle import Particle
+from particle_simulator.particle import Particle, ParticleSystem, to_rgba
+from particle_simulator.tool import ToolContacts
 
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nano_imprint.ini')
 
-class FreeParticlesSimulator(Simulator):
-    def __init__(self):
-        self.simconf = simconf  # Loads the simulator config
-        particle_radius = 0.1   # Sets radius manually to override the default number of particles
+# Colours of alternating part layers ('darkslategray' and 'olive')
+DARKSLATEGRAY = (0.184, 0.310, 0.310)
+OLIVE = (0.502, 0.502, 0)
 
-        # The particles list is kept in two differently structured lists. One
-        # for easy access to each particle and a second for processing by matplotlib
-        self.particles_map, self.particles = get_part_particles(simconf.bbox_size, particle_radius)
-        self.particles.insert(0, get_tool())  # adds the tool at index 0 for easy access
+FOCUS_DISPLACEMENT = 0.1  # part particles displaced by more than this fraction of their radius are in focus
+TOOL_SUBSTEP = 0.5  # a multi-particle tool moves less than this fraction of a part radius between contact updates
 
-    def update_particles(self):
-        """ Updates position for all particles including tool """
-
-        # Reset locked flag
-        for p in self.particles:
-            p.locked = False
-
-        update_tool_position(self.particles[0])
-        update_part_position(self.particles[0], self.particles_map)
 
+class FreeParticlesSimulator(Simulator):
+    def __init__(self, simconf=None, particle_radius=0.1, vectorized=True, workers=0, z_count=5,
+                 tool_velocity=(0.1, -0.1), max_depth=1.5, active_region=False, part_shape=None, tool=None):
+        self.simconf = simconf or SimConfig(CONFIG_PATH)  # Loads the simulator config
+        self.arguments = dict(particle_radius=particle_radius, vectorized=vectorized, workers=workers, z_count=z_count,
+                              tool_velocity=tuple(tool_velocity), max_depth=max_depth, active_region=active_region,
+                              part_shape=part_shape, tool=tool)
+        # particle_radius is set manually to override the default number of particles
+        self.vectorized = vectorized  # Relax the part with whole array operations (red-black ordering)
+        self.max_depth = max_depth  # z coordinate where the tool turns back
+
+        # The part fills the box on x and y and has z_count layers, unless its shape (particles per axis) is given
+        count = int((self.simconf.bbox_size - 2) / (2 * particle_radius))
+        self.part_shape = tuple(part_shape or (count, count, z_count))
+
+        # The particles are stored in a ParticleSystem (for processing by matplotlib). The sequential relaxation
+        # moves Particle copies of them, referenced through a 3D map (for easy access to each particle), and
+        # copies their positions to the system after every frame.
+        # The tool's trajectory is integrated in float64 in its own Particle whatever the precision of the system,
+        # since its position accumulates small steps and decides when the tool turns back
+        self.tool_particle = get_tool(*tool_velocity)
+        self.particles = get_part_system(particle_radius, self.part_shape, self.tool_particle, tool,
+                                         self.simconf.precision)
+        self.particles_list = None if vectorized else self.particles.to_particles()
+        self.particles_map = None if vectorized else get_particles_map(self.part_shape, self.particles_list, offset=1)
+        self.relaxation_passes = get_relaxation_passes(self.particles, self.part_shape)
+        # Relaxes only the particles near the ones that moved (same results as vectorized)
+        self.active_region = None
+        if active_region:
+            if not vectorized or workers:
+                raise ValueError("The active region only supports the vectorized relaxation without worker processes.")
+            self.active_region = ActiveRegion(self.particles, self.part_shape, self.relaxation_passes)
+
+        # A multi-particle tool (particle_simulator.tool.Tool) follows the particle at index 0, its other
+        # particles are stored after the part. Its contacts are looked up in a precomputed stencil, which
+        # allows the part particles to be displaced from their lattice cell by up to the depth of the imprint
+        self.tool = tool
+        self.tool_index = np.zeros(1, dtype=np.intp)
+        self.tool_contacts = None
+        if tool is not None:
+            if workers:
+                raise ValueError("The worker processes only support the spherical tool.")
+            body = np.arange(len(self.particles) - len(tool) + 1, len(self.particles))
+            self.tool_index = np.concatenate(([0], body))
+            part_top = 1 + 2 * particle_radius * (self.part_shape[2] - 1)
+            stencil = tool.get_stencil(particle_radius, max(part_top - max_depth, 0) + particle_radius)
+            self.tool_contacts = ToolContacts(tool, stencil, self.part_shape, self.tool_index)
+
+        # Splits the part in slabs that are relaxed by worker processes (same results as vectorized)
+        self.engine = SlabEngine(self.particles, self.part_shape, self.update_tool, workers) if workers else None
 
-def update_tool_position(p: Particle):
+    def update_particles(self):
+        """ Updates position for all particles including tool """
+        if self.engine is not None:
+            with self.profiler.phase('physics'):
+                self.engine.step()
+            return
+
+        if self.vectorized:
+            with self.profiler.phase('physics'):
+                if self.active_region is None:
+                    self.particles.locked[:] = False
+                start = self.get_tool_position()
+                self.update_tool()
+            with self.profiler.phase('tool_collisions'):
+                if self.tool_contacts is not None:
+                    cells = self.update_tool_contacts(start)
+                else:
+                    cells = update_tool_collisions_batch(self.particles, self.part_shape)
+            with self.profiler.phase('part_collisions'):
+                if self.active_region is not None:
+                    self.active_region.update(cells)
+                else:
+                    update_part_collisions_batch(self.particles, self.relaxation_passes)
+            return
+
+        with self.profiler.phase('physics'):
+            # Reset locked flag
+            for p in self.particles_list:
+                p.locked = False
+
+            start = self.get_tool_position()
+            self.update_tool()
+            self.particles.copy_to_particles(self.particles_list, ('pos',), self.tool_index)
+        with self.profiler.phase('tool_collisions'):
+            if self.tool_contacts is not None:
+                cells = self.update_tool_contacts(start)
+                self.particles.copy_to_particles(self.particles_list, ('pos', 'locked'), cells)
+            else:
+                update_tool_collisions(self.particles_list[0], self.particles_map)
+        with self.profiler.phase('part_collisions'):
+            update_part_collisions(self.particles_map)
+            self.particles.copy_from_particles(self.particles_list, ('pos', 'locked'))
+
+    def update_tool(self, p=None):
+        """ Moves the tool along its trajectory and copies it to the tool particles of the system (the particle at
+        index 0 and the other particles of a multi-particle tool)
+
+        :param p: unused, the tool particle of the system passed by SlabEngine
+        :type p: ParticleView
+        """
+        t = self.tool_particle
+        update_tool_position(t, self.simconf.timestep, self.max_depth)
+        self.set_tool_position(self.get_tool_position())
+        self.particles.vel[:, 0] = t.vx, t.vy, t.vz
+
+    def get_tool_position(self):
+        """ Returns the position of the tool (float64, whatever the precision of the system) """
+        t = self.tool_particle
+        return np.array([t.x, t.y, t.z])
+
+    def set_tool_position(self, position):
+        """ Copies a position of the tool to the tool particles of the system """
+        self.particles.pos[:, 0] = position
+        if self.tool is not None:
+            self.particles.pos[:, self.tool_index[1:]] = position[:, None] + self.tool.offsets[:, 1:]
+
+    def update_tool_contacts(self, start):
+        """ Resolves the contacts of a multi-particle tool that moved from start to its current position
+
+        A tool whose contacts are only resolved at the end of the frame can pass over part particles and leave them
+        inside its relief when it moves by about a particle radius or more. The tool is therefore moved along its
+        path in sub-steps of less than TOOL_SUBSTEP times the part radius, with the contacts resolved after each
+        one. The tool reaches the same position at the end of the frame.
+        :param start: the position of the tool at the start of the frame
+        :type start: numpy.ndarray
+        :return: the indexes of the particles locked by the tool
+        :rtype: numpy.ndarray
+        """
+        end = self.get_tool_position()
+        substeps = get_tool_substeps(end - start, self.particles.radius[1])
+        if substeps == 1:
+            return self.tool_contacts.update(self.particles)
+        cells = []
+        for position in np.linspace(start, end, substeps + 1, axis=1)[:, 1:].T:
+            self.set_tool_position(position)
+            cells.append(self.tool_contacts.update(self.particles))
+        return np.unique(np.concatenate(cells))
+
+    def get_focus(self, pos):
+        """ The tool and the displaced part particles are always rendered at full detail """
+        d = pos - self.particles.pos0
+        focus = np.einsum('ij,ij->j', d, d) > (FOCUS_DISPLACEMENT * self.particles.radius[1]) ** 2
+        focus[self.tool_index] = True
+        return focus
+
+    def get_analysis(self, every=10, capacity=1024):
+        """ Statistics of the part: the displacements (histogram up to the diameter of the tool), the plastic zone
+        (particles displaced as much as the focus of the rendering), the surface profile and the contacts with
+        the tool """
+        edges = np.linspace(0, 2 * self.particles.radius[0], 21)
+        statistics = DisplacementStatistics(edges, FOCUS_DISPLACEMENT * self.particles.radius[1])
+        analysers = [statistics, SurfaceProfile(self.part_shape), ToolContactCount(self.tool_index)]
+        part = slice(1, 1 + int(np.prod(self.part_shape)))
+        return Analysis(analysers, part, every, capacity)
+
+    def get_state(self):
+        state = super().get_state()
+        t = self.tool_particle
+        state['tool'] = {'pos': [t.x, t.y, t.z], 'vel': [t.vx, t.vy, t.vz]}
+        if self.active_region is not None:
+            state['active_region'] = self.active_region.get_state()
+        if self.tool_contacts is not None:
+            state['tool_contacts'] = {'carried': self.tool_contacts.carried}
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.load_particles()
+        t = self.tool_particle
+        (t.x, t.y, t.z), (t.vx, t.vy, t.vz) = state['tool']['pos'], state['tool']['vel']
+        if self.active_region is not None:
+            self.active_region.set_state(state['active_region'])
+        if self.tool_contacts is not None:
+            self.tool_contacts.carried = state['tool_contacts']['carried']
+
+    def load_particles(self):
+        """ The tool continues from the position and velocity of the tool particle of the system, and the
+        sequential relaxation from the positions of the system """
+        t = self.tool_particle
+        t.x, t.y, t.z = (float(c) for c in self.particles.pos[:, 0])
+        t.vx, t.vy, t.vz = (float(c) for c in self.particles.vel[:, 0])
+        if self.particles_list is not None:
+            self.particles.copy_to_particles(self.particles_list, ('pos', 'vel', 'locked'))
+
+    def close(self):
+        """ Stops the worker processes (if any) and waits for the last checkpoint """
+        super().close()
+        if self.engine is not None:
+            self.engine.close()
+
+
+def update_tool_position(p: Particle, timestep, max_depth=1.5):
     """ Updates tool's particle coordinates. The tool moves in a V shaped trajectory """
-    if p.z <= 1.5:  # The tool reached max imprint depth
+    if p.z <= max_depth:  # The tool reached max imprint depth
         p.vz = -p.vz
     if p.z > 4:  # The tool returned to base and process is finished
         p.vx = 0
         p.vz = 0
-    p.z += p.vz * simconf.timestep
-    p.x += p.vx * simconf.timestep
+    p.z += p.vz * timestep
+    p.x += p.vx * timestep
+
+
+def get_tool_substeps(displacement, particle_radius):
+    """ Returns the number of sub-steps that move a multi-particle tool by less than TOOL_SUBSTEP times the radius
+    of the part particles
+
+    :param displacement: the displacement of the tool in a frame
+    :type displacement: numpy.ndarray
+    :param particle_radius: the radius of the part particles
+    :type particle_radius: float
+    :rtype: int
+    """
+    return int(np.linalg.norm(displacement) / (TOOL_SUBSTEP * particle_radius)) + 1
 
 
 def update_part_position(tool: Particle, pmap):
@@ -86,6 +285,163 @@ def update_part_collisions(pmap):
                     pmap[x][y][z].locked = True
 
 
+def update_tool_collisions_batch(ps, shape, offset=1):
+    """ Updates part particles that collide with the tool (whole array version of update_tool_collisions)
+
+    :param ps: the particles, with the tool at index 0 and the part particles stored in flattened
+        lattice order from index offset onwards
+    :type ps: ParticleSystem
+    :param shape: number of part particles on each axis
+    :type shape: tuple[int, int, int]
+    :return: the indexes of the particles in the tool's index box
+    :rtype: numpy.ndarray
+    """
+    radius = ps.radius[offset]
+    tri = int(ps.radius[0] / radius)  # Tool's range of indexes (length/particle diameter)
+    tool_index = ((ps.pos[:, 0] - 1) / (2 * radius)).astype(int)
+
+    ranges = [np.arange(max(i - tri, 0), min(i + tri, n)) for i, n in zip(tool_index, shape)]
+    cells = offset + np.ravel_multi_index(np.meshgrid(*ranges, indexing='ij'), shape).ravel()
+
+    set_post_collision_positions(ps, cells, np.zeros_like(cells))
+    ps.locked[cells] = True  # prevent push backs
+    return cells
+
+
+def get_relaxation_passes(ps, shape, offset=1):
+    """ Groups the neighbour contacts of the part particles in passes that can be relaxed with whole array operations
+
+    The lattice is coloured like a chessboard (red-black) by the parity of x + y + z index. The neighbours
+    of a particle always have the other colour, so all particles of one colour can be moved at the same
+    time against their (still) neighbours. Each colour is processed with one pass per neighbour slot, which
+    keeps the order in which every particle is pushed by its neighbours. The order is deterministic.
+    :param ps: the particles, with the part particles stored in flattened lattice order from index offset onwards
+    :type ps: ParticleSystem
+    :param shape: number of part particles on each axis
+    :type shape: tuple[int, int, int]
+    :return: list of (moving particle indexes, still particle indexes) pairs
+    :rtype: list[tuple[numpy.ndarray, numpy.ndarray]]
+    """
+    parity = np.indices(shape).sum(axis=0).ravel() % 2
+    degree = np.diff(ps.neighbour_offsets)
+    passes = []
+    for colour in (0, 1):
+        particles = offset + np.flatnonzero(parity == colour)
+        for slot in range(0, degree[particles].max(initial=0)):
+            movers = particles[degree[particles] > slot]
+            passes.append((movers, ps.neighbour_indices[ps.neighbour_offsets[movers] + slot]))
+    return passes
+
+
+def update_part_collisions_batch(ps, passes):
+    """ Updates part particles that collide with neighbouring particles (red-black ordered version of
+    update_part_collisions). Particles locked by the tool are not moved and all part particles are locked.
+
+    :param ps: the particles
+    :type ps: ParticleSystem
+    :param passes: the output of get_relaxation_passes
+    :type passes: list[tuple[numpy.ndarray, numpy.ndarray]]
+    """
+    locked = ps.locked.copy()
+    for movers, still in passes:
+        free = ~locked[movers]
+        set_post_collision_positions(ps, movers[free], still[free])
+        ps.locked[movers] = True
+
+
+class ActiveRegion:
+    """ Incremental version of update_part_collisions_batch that only relaxes the particles near the disturbance
+
+    A particle can only be pushed if it overlaps a neighbour, and an overlap at the start of a frame needs a
+    particle that moved in the previous frame, or two particles that were both locked by the tool. The
+    candidates of a frame are therefore the particles that moved in the previous frame, the tool's index
+    boxes of this and the previous frame, and their neighbours. The black particles can also be pushed by the
+    red particles that moved in the same frame, so the neighbours of those are added before the black passes.
+    Every pass is restricted to its candidates, in the same order, so the positions are the same as with the
+    full passes. The work and the locking of a frame are proportional to the number of candidates.
+    """
+
+    def __init__(self, ps, shape, passes, offset=1):
+        """
+        :param ps: the particles, with the part particles stored in flattened lattice order from index offset onwards
+        :type ps: ParticleSystem
+        :param shape: number of part particles on each axis
+        :type shape: tuple[int, int, int]
+        :param passes: the output of get_relaxation_passes
+        :type passes: list[tuple[numpy.ndarray, numpy.ndarray]]
+        """
+        self.ps = ps
+        part = slice(offset, offset + int(np.prod(shape)))
+        self.colour = np.zeros(len(ps), dtype=np.int8)
+        self.colour[part] = np.indices(shape).sum(axis=0).ravel() % 2
+        self.passes = [[(movers, still) for movers, still in passes if self.colour[movers[0]] == colour]
+                       for colour in (0, 1)]
+        self.tool_locked = np.zeros(len(ps), dtype=bool)
+        self.tool_cells = np.zeros(0, dtype=np.intp)
+        self.moved = np.arange(part.start, part.stop)  # the first frame relaxes every particle
+        ps.locked[part] = True  # the part is locked after every frame, as with the full passes
+
+    def update(self, tool_cells):
+        """ Relaxes the candidate particles of a frame
+
+        :param tool_cells: the particles of the tool's index box (output of update_tool_collisions_batch)
+        :type tool_cells: numpy.ndarray
+        """
+        ps = self.ps
+        self.tool_locked[tool_cells] = True
+        candidates = self.get_neighbourhood(np.concatenate((self.moved, self.tool_cells, tool_cells)))
+        moved = []
+        for colour in (0, 1):
+            if colour == 1 and moved[0].size:
+                candidates = np.union1d(candidates, self.get_neighbourhood(moved[0]))
+            movable = candidates[self.colour[candidates] == colour]
+            before = ps.pos[:, movable]
+            for movers, still in self.passes[colour]:
+                k = np.searchsorted(movers, movable)
+                found = k < len(movers)
+                found[found] = movers[k[found]] == movable[found]
+                free = found.copy()
+                free[found] = ~self.tool_locked[movable[found]]
+                set_post_collision_positions(ps, movable[free], still[k[free]])
+            moved.append(movable[(ps.pos[:, movable] != before).any(axis=0)])
+        self.tool_locked[tool_cells] = False
+        self.tool_cells = tool_cells
+        self.moved = np.concatenate(moved)
+
+    def get_state(self):
+        """ Returns the particles that moved in the last frame and the last tool's index box """
+        return {'moved': self.moved, 'tool_cells': self.tool_cells}
+
+    def set_state(self, state):
+        """ Loads a state returned by get_state """
+        self.moved, self.tool_cells = state['moved'], state['tool_cells']
+
+    def get_neighbourhood(self, index):
+        """ Returns the given particles and their neighbours, sorted and without duplicates """
+        index = np.unique(index)
+        start, stop = self.ps.neighbour_offsets[index], self.ps.neighbour_offsets[index + 1]
+        count = stop - start
+        slots = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count) + np.repeat(start, count)
+        return np.union1d(index, self.ps.neighbour_indices[slots])
+
+
+def set_post_collision_positions(ps, move, still):
+    """ Whole array version of set_post_collision_position for pairs of particles of a ParticleSystem
+
+    :param ps: the particles
+    :type ps: ParticleSystem
+    :param move: indexes of the particles whose new coordinates are calculated (no duplicates)
+    :type move: numpy.ndarray
+    :param still: indexes of the particles that collided with the particles under observation
+    :type still: numpy.ndarray
+    """
+    d = ps.pos[:, move] - ps.pos[:, still]
+    dist = np.sqrt(d[0] * d[0] + d[1] * d[1] + d[2] * d[2])
+    overlap = ps.radius[move] + ps.radius[still] - dist
+    hit = (overlap > 0) & (dist > 0)  # coincident particles have no direction to be pushed in
+    ps.pos[:, move[hit]] += overlap[hit] * d[:, hit] / dist[hit]
+
+
 def set_post_collision_position(p_move, p_still):
     """ Calculates the position of a particle after a collision with another particle
     The 'other' particle is considered still
@@ -104,20 +460,19 @@ def set_post_collision_position(p_move, p_still):
     # rest of the formula is calculated using similar triangles. Therefore,
     # dx/distance = dx_move/move_length. At the end of movement the particles
     # touch each other but do not overlap.
-    if dist < (p_still.radius + p_move.radius):
+    if 0 < dist < (p_still.radius + p_move.radius):
         p_move.x += (p_move.radius + p_still.radius - dist) * (p_move.x - p_still.x) / dist
         p_move.y += (p_move.radius + p_still.radius - dist) * (p_move.y - p_still.y) / dist
         p_move.z += (p_move.radius + p_still.radius - dist) * (p_move.z - p_still.z) / dist
 
 
-def get_part_particles(bbox, particle_radius):
+def get_part_particles(bbox, particle_radius, z_count=5):
     """ Creates a 3D list representing the 3D structure of particles comprising the part """
     # Initially create a list which contains x lists. Each x list contains y lists with z elements
     # each. As a result, a particle can be referenced as particles[x][y][z]
     # where x, y, z are the corresponding indexes of the particle position in the part
     x_count = int((bbox - 2) / (2 * particle_radius))
     y_count = int((bbox - 2) / (2 * particle_radius))
-    z_count = 5
     pmap = [[[Particle() for i in range(z_count)] for j in range(y_count)] for k in range(x_count)]
 
     # Initialise each particle
@@ -136,7 +491,7 @@ def get_part_particles(bbox, particle_radius):
 
                 pmap[x][y][z].vx, pmap[x][y][z].vy, pmap[x][y][z].vz = 0, 0, 0
 
-                pmap[x][y][z].colour = 'darkslategray' if z % 2 == 0 else 'olive'
+                pmap[x][y][z].colour = DARKSLATEGRAY if z % 2 == 0 else OLIVE
 
     # Add neighbours at initial position.
     # Neighbour particles are only the ones in contact (indexes: x+-1, y+-1, z+-1)
@@ -162,16 +517,77 @@ def get_part_particles(bbox, particle_radius):
     return pmap, pflat
 
 
-def get_tool():
-    """ Initialises the particle that represents the tool """
+def get_part_system(particle_radius, shape, tool=None, tool_shape=None, dtype=np.float64):
+    """ Creates the particles of the part as whole arrays, in one pass (same particles as get_part_particles)
+
+    :param particle_radius: the radius of the part particles
+    :type particle_radius: float
+    :param shape: number of part particles on each axis
+    :type shape: tuple[int, int, int]
+    :param tool: if given, the tool is stored at index 0 and the part from index 1 onwards
+    :type tool: Particle
+    :param tool_shape: if given, the tool is made of the particles of this shape. The first one replaces the
+        tool particle at index 0 and the others are stored after the part
+    :type tool_shape: particle_simulator.tool.Tool
+    :param dtype: the floating point type of the particle arrays
+    :type dtype: numpy.dtype | str
+    :return: the particles, the part in flattened (x, y, z) order
+    :rtype: ParticleSystem
+    """
+    offset = 0 if tool is None else 1
+    body = 0 if tool is None or tool_shape is None else len(tool_shape) - 1
+    index = np.indices(shape).reshape(3, -1)
+    ps = ParticleSystem(offset + index.shape[1] + body, dtype)
+    if tool is not None:
+        ps.pos[:, 0] = ps.pos0[:, 0] = tool.x, tool.y, tool.z
+        ps.vel[:, 0] = tool.vx, tool.vy, tool.vz
+        ps.mass[0], ps.radius[0], ps.colour[0] = tool.mass, tool.radius, to_rgba(tool.colour)
+    if body:
+        ps.radius[0] = tool_shape.radius[0]
+        ps.pos[:, -body:] = ps.pos0[:, -body:] = ps.pos[:, :1] + tool_shape.offsets[:, 1:]
+        ps.radius[-body:] = tool_shape.radius[1:]
+        ps.mass[0:1], ps.mass[-body:] = ps.radius[0] ** 3, ps.radius[-body:] ** 3
+        ps.colour[-body:] = ps.colour[0]
+
+    part = slice(offset, offset + index.shape[1])
+    ps.pos0[:, part] = 1 + index * 2 * particle_radius
+    ps.pos[:, part] = ps.pos0[:, part]
+    ps.radius[part] = particle_radius
+    ps.mass[part] = particle_radius ** 3  # For spheres with constant density
+    ps.colour[part] = np.where(index[2, :, None] % 2 == 0, to_rgba(DARKSLATEGRAY), to_rgba(OLIVE))
+    offsets, ps.neighbour_indices = lattice.get_neighbour_graph(shape, offset)
+    ps.neighbour_offsets = np.concatenate((offsets, np.full(body, offsets[-1])))  # the tool has no neighbours
+    return ps
+
+
+def get_particles_map(shape, particles, offset=0):
+    """ Creates a 3D list of the given shape that references the given particles (a list of particles, or the
+    views of a ParticleSystem)
+
+    The particles are expected to be stored in flattened (x, y, z) order, starting at offset
+    """
+    particles = iter(particles)
+    for _ in range(0, offset):
+        next(particles)
+    return [[[next(particles) for _ in range(0, shape[2])] for _ in range(0, shape[1])] for _ in range(0, shape[0])]
+
+
+def get_tool(vx=0.1, vz=-0.1):
+    """ Initialises the particle that represents the tool
+
+    :param vx: the horizontal velocity of the tool
+    :type vx: float
+    :param vz: the vertical velocity of the tool (negative moves towards the part)
+    :type vz: float
+    """
     p = Particle()
     p.mass = 1
     p.radius = np.cbrt(p.mass)  # For spheres with constant density
     p.x0 = p.x = 1
     p.y0 = p.y = 4
     p.z0 = p.z = 4
-    p.vx, p.vy, p.vz = 0.1, 0, -0.1
-    p.colour = 'black'
+    p.vx, p.vy, p.vz = vx, 0, vz
+    p.colour = (0, 0, 0)  # black
     return p
 
 
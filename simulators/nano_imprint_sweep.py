@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+""" Sweeps nano_imprint tool trajectories (tool velocities, max depth), particle radius and timestep.
+Every run is headless and the summary metrics of all runs are saved in one .npz file (one column
+per parameter/metric, one row per run)
+
+Usage: python nano_imprint_sweep.py [--grid grid.json] [--workers 4] [--frames 200] [--output results.npz]
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+import nano_imprint
+from particle_simulator.simconf import SimConfig
+from particle_simulator.sweep import run_sweep
+
+DEFAULT_GRID = {
+    'tool_vx': [0.05, 0.1],
+    'tool_vz': [-0.05, -0.1],
+    'max_depth': [1.3, 1.5],
+    'particle_radius': [0.1],
+    'timestep': [1.0],
+}
+
+PROFILE_BINS = 64  # dent profiles are resampled to a fixed number of points along x
+
+
+def run(params):
+    """ Runs one headless simulation and returns its metrics """
+    simconf = SimConfig(nano_imprint.CONFIG_PATH, timestep=params['timestep'])
+    sim = nano_imprint.FreeParticlesSimulator(
+        simconf,
+        particle_radius=params['particle_radius'],
+        tool_velocity=(params['tool_vx'], params['tool_vz']),
+        max_depth=params['max_depth'])
+    sim.step(params['frames'])
+    return get_metrics(sim)
+
+
+def get_metrics(sim):
+    """ Returns displacement field statistics and the dent depth profile along the tool path """
+    ps = sim.particles
+    radius = ps.radius[1]
+    displacement = ps.get_displacement()[1:]
+
+    # Depth of the top layer below its initial height, along the row of the lattice under the tool
+    top = ps.pos[:, 1:].reshape((3,) + sim.part_shape)[:, :, :, -1]
+    top0 = ps.pos0[:, 1:].reshape((3,) + sim.part_shape)[:, :, :, -1]
+    dent = top0[2] - top[2]
+    row = min(int((ps.pos0[1, 0] - 1) / (2 * radius)), sim.part_shape[1] - 1)
+    x = np.linspace(1, sim.simconf.bbox_size - 1, PROFILE_BINS)
+
+    return {
+        'displacement_max': displacement.max(),
+        'displacement_mean': displacement.mean(),
+        'displacement_std': displacement.std(),
+        'displacement_p99': np.percentile(displacement, 99),
+        'displaced_count': np.count_nonzero(displacement > 0.01 * radius),
+        'dent_depth_max': dent.max(),
+        'dent_volume': dent.clip(min=0).sum() * (2 * radius) ** 2,
+        'dent_profile': np.interp(x, top0[0, :, row], dent[:, row]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--grid', help="JSON file with a list of values for every parameter")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--frames', type=int, default=SimConfig(nano_imprint.CONFIG_PATH).total_frames)
+    parser.add_argument('--output', default='nano_imprint_sweep.npz')
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as file:
+            grid = json.load(file)
+    grid = {**grid, 'frames': [args.frames]}
+
+    columns = run_sweep(run, grid, args.workers, args.output)
+    print(f"{len(columns['frames'])} runs saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+""" Streaming analysis of a simulation: statistics computed every few steps while the simulation runs
+
+An Analysis runs a list of analysers over the particles every given number of steps and appends their
+results to a TimeSeries, so quantities like the depth of a dent can be followed over a run without
+recording every frame. An analyser is a callable that takes a Snapshot and returns a dictionary of
+scalars or fixed size arrays. Analysers that need the same derived quantity (e.g. the displacement of
+every particle) share it through the snapshot, where it is computed once per sample.
+
+The time series has a fixed capacity. When it is full, every other sample is dropped and only every
+other sample is kept from then on, so it always covers the whole run with at most capacity samples and
+its memory does not grow with the length of the run.
+"""
+from functools import cached_property
+
+import numpy as np
+
+
+class Snapshot:
+    """ The particles of a simulator at the time of a sample, with derived quantities computed on first use """
+
+    def __init__(self, simulator, index=slice(None)):
+        """
+        :param simulator: the simulator
+        :type simulator: Simulator
+        :param index: the particles that are analysed (e.g. the part of nano_imprint)
+        :type index: slice | numpy.ndarray
+        """
+        self.simulator = simulator
+        self.particles = simulator.particles
+        self.index = index
+
+    @cached_property
+    def pos(self):
+        return self.particles.pos[:, self.index]
+
+    @cached_property
+    def pos0(self):
+        return self.particles.pos0[:, self.index]
+
+    @cached_property
+    def radius(self):
+        return self.particles.radius[self.index]
+
+    @cached_property
+    def displacement(self):
+        """ The distance of every particle from its initial position """
+        d = self.pos - self.pos0
+        return np.sqrt(np.einsum('ij,ij->j', d, d))
+
+
+class DisplacementStatistics:
+    """ The largest and the mean displacement, a histogram of the displacements, the plastic zone (the
+    particles displaced by more than a threshold) and the number of locked particles
+
+    nano_imprint locks every part particle it has relaxed at the end of a frame, so the particles that the
+    tool holds are counted by ToolContactCount instead.
+    """
+
+    def __init__(self, edges, threshold):
+        """
+        :param edges: the increasing edges of the histogram bins. Displacements above the last edge are
+            counted in an extra bin
+        :type edges: numpy.ndarray
+        :param threshold: particles displaced by more than this distance are in the plastic zone
+        :type threshold: float
+        """
+        self.edges = np.append(np.asarray(edges, dtype=float), np.inf)
+        self.threshold = threshold
+
+    def __call__(self, snapshot):
+        d = snapshot.displacement
+        plastic = d > self.threshold
+        depth = 0.0
+        if plastic.any():  # how far below the initial top of the particles the plastic zone reaches
+            depth = float(snapshot.pos0[2].max() - snapshot.pos0[2][plastic].min())
+        return {
+            'max': np.nanmax(d, initial=0),
+            'mean': np.nanmean(d, dtype=np.float64),
+            'histogram': np.histogram(d, self.edges)[0],
+            'plastic': np.count_nonzero(plastic),
+            'plastic_depth': depth,
+            'locked': np.count_nonzero(snapshot.particles.locked[snapshot.index]),
+        }
+
+
+class SurfaceProfile:
+    """ The surface of a lattice part (nano_imprint), column by column
+
+    The height of a column is the highest of the particles that started in it, and its change from the
+    initial height is negative in a dent and positive in a pile-up. The depth of the deepest dent, the
+    height of the highest pile-up and the dent profile along x (the deepest point of every x slice) are
+    sampled, the change of every column of the last sample is kept in heights.
+    """
+
+    def __init__(self, shape):
+        """
+        :param shape: number of lattice particles on each axis, the snapshot holds them in flattened (x, y, z) order
+        :type shape: tuple[int, int, int]
+        """
+        self.shape = tuple(shape)
+        self.heights = None  # the height change of every column of the last sample, shape (nx, ny)
+
+    def __call__(self, snapshot):
+        z = snapshot.pos[2].reshape(self.shape)
+        z0 = snapshot.pos0[2].reshape(self.shape)
+        self.heights = np.fmax.reduce(z, axis=2) - z0.max(axis=2)  # fmax ignores particles with no position
+        return {
+            'dent_depth': max(0.0, -np.nanmin(self.heights)),
+            'pileup_height': max(0.0, np.nanmax(self.heights)),
+            'dent_profile': np.maximum(-np.fmin.reduce(self.heights, axis=1), 0),
+        }
+
+
+class ToolContactCount:
+    """ The number of analysed particles that touch a tool (within a tolerance) """
+
+    def __init__(self, tool_index, tolerance=1e-3):
+        """
+        :param tool_index: the indexes of the tool particles in the system
+        :type tool_index: numpy.ndarray
+        :param tolerance: the relative gap up to which particles are touching
+        :type tolerance: float
+        """
+        self.tool_index = np.asarray(tool_index)
+        self.tolerance = tolerance
+
+    def __call__(self, snapshot):
+        ps, pos = snapshot.particles, snapshot.pos
+        tool, reach = ps.pos[:, self.tool_index], ps.radius[self.tool_index] + snapshot.radius.max()
+        # Only the particles inside the bounding box of the tool are tested against every tool particle
+        near = np.flatnonzero(((pos >= (tool - reach).min(axis=1, keepdims=True))
+                               & (pos <= (tool + reach).max(axis=1, keepdims=True))).all(axis=0))
+        d = pos[:, near, None] - tool[:, None, :]
+        distance = np.sqrt(np.einsum('ijk,ijk->jk', d, d))
+        touching = distance <= (snapshot.radius[near, None] + ps.radius[self.tool_index]) * (1 + self.tolerance)
+        return {'tool_contacts': np.count_nonzero(touching.any(axis=1))}
+
+
+class TimeSeries:
+    """ Samples of named scalars and fixed size arrays, stored in preallocated arrays of bounded size """
+
+    def __init__(self, capacity=1024):
+        """
+        :param capacity: the largest number of samples that are kept (even)
+        :type capacity: int
+        """
+        self.capacity = capacity + capacity % 2
+        self.columns = {}
+        self.count = 0  # the number of kept samples
+        self.stride = 1  # only every stride-th offered sample is kept
+        self.offered = 0
+
+    def append(self, frame, values):
+        """ Offers a sample, which is kept if it falls on the current stride
+
+        :param frame: the frame (step) of the sample
+        :type frame: int
+        :param values: the values of the sample, the same names and shapes for every sample
+        :type values: dict
+        """
+        keep = self.offered % self.stride == 0
+        self.offered += 1
+        if not keep:
+            return
+        values = dict(values, frame=frame)
+        if not self.columns:
+            self.columns = {name: np.empty((self.capacity,) + np.shape(value), dtype=np.asarray(value).dtype)
+                            for name, value in values.items()}
+        if self.count == self.capacity:
+            # Drops every other sample. The kept samples and the current one fall on the doubled stride
+            for column in self.columns.values():
+                column[:self.count // 2] = column[0:self.count:2]
+            self.count //= 2
+            self.stride *= 2
+        for name, value in values.items():
+            self.columns[name][self.count] = value
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, name):
+        """ Returns the kept samples of a value (a view), with shape (samples, ...) """
+        return self.columns[name][:self.count]
+
+    @property
+    def frames(self):
+        return self['frame'] if self.columns else np.zeros(0, dtype=int)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    def as_dict(self):
+        return {name: self[name] for name in self.columns}
+
+    def save(self, path):
+        """ Saves the kept samples in a compressed .npz file (numpy.load(path) gives one array per value) """
+        np.savez_compressed(path, **self.as_dict())
+
+
+class Analysis:
+    """ Runs analysers over the particles of a simulator every given number of steps """
+
+    def __init__(self, analysers, index=slice(None), every=10, capacity=1024):
+        """
+        :param analysers: callables that take a Snapshot and return a dictionary of values
+        :type analysers: list[callable]
+        :param index: the particles that are analysed
+        :type index: slice | numpy.ndarray
+        :param every: the number of steps between samples
+        :type every: int
+        :param capacity: the largest number of samples kept by the time series
+        :type capacity: int
+        """
+        self.analysers = list(analysers)
+        self.index = index
+        self.every = every
+        self.series = TimeSeries(capacity)
+
+    def update(self, simulator):
+        """ Samples the simulator if a sample is due at its current frame """
+        if simulator.frame % self.every == 0:
+            self.sample(simulator)
+
+    def sample(self, simulator):
+        """ Runs the analysers on the current state of the simulator and appends their results to the series
+
+        :return: the values of the sample
+        :rtype: dict
+        """
+        snapshot = Snapshot(simulator, self.index)
+        values = {}
+        for analyser in self.analysers:
+            values.update(analyser(snapshot))
+        self.series.append(simulator.frame, values)
+        return values
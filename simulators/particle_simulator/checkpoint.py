@@ -0,0 +1,231 @@
+""" Checkpoints of the full state of a simulator, and the resume of a run from them
+
+File layout:
+    - magic bytes and the size of the header (8 bytes, little endian)
+    - a JSON header holding the simulator class, the simulation configuration and the scalar
+      values of the state, and describing the array blocks
+    - the constructor arguments of the simulator (pickled)
+    - one block per array of the state, in raw binary form
+The state of a simulator is the nested dictionary returned by Simulator.get_state. A simulator is
+resumed by creating it again with the recorded configuration and arguments and loading the state,
+so the resumed run is bit-identical to the uninterrupted one.
+
+Checkpoints are written to a temporary file that replaces the previous checkpoint when complete, so a
+crash while writing leaves the last complete checkpoint. The arguments are unpickled when a checkpoint
+is resumed: only resume checkpoints from a trusted source.
+"""
+import importlib
+import json
+import os
+import pickle
+import queue
+import sys
+import threading
+from time import perf_counter
+
+import numpy as np
+
+from .simconf import SimConfig
+
+MAGIC = b'PSCKPT01'
+ALIGNMENT = 64
+
+
+def flatten_state(state, prefix=''):
+    """ Splits a nested state in its arrays and its (JSON serialisable) values, with dotted names
+
+    :return: the arrays and the values
+    :rtype: tuple[dict, dict]
+    """
+    arrays, values = {}, {}
+    for name, value in state.items():
+        if isinstance(value, dict):
+            sub_arrays, sub_values = flatten_state(value, f'{prefix}{name}.')
+            arrays.update(sub_arrays)
+            values.update(sub_values)
+        elif isinstance(value, np.ndarray):
+            arrays[prefix + name] = value
+        else:
+            values[prefix + name] = value
+    return arrays, values
+
+
+def unflatten_state(flat):
+    """ Builds the nested state of a dictionary with dotted names """
+    state = {}
+    for name, value in flat.items():
+        *parents, leaf = name.split('.')
+        node = state
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = value
+    return state
+
+
+def get_simulator_name(simulator):
+    """ Returns the module and the class name of a simulator. The module of a simulator started as a
+    script (__main__) is named after the script, as it is imported when the checkpoint is resumed """
+    module = type(simulator).__module__
+    if module == '__main__':
+        module = os.path.splitext(os.path.basename(sys.modules['__main__'].__file__))[0]
+    return module, type(simulator).__qualname__
+
+
+def write_checkpoint(path, simulator=None, state=None, header=None):
+    """ Writes a checkpoint, to a temporary file that replaces path when complete
+
+    :param path: the checkpoint file
+    :type path: str
+    :param simulator: the simulator whose current state is written (if state and header are not given)
+    :type simulator: Simulator
+    :param state: the state (output of Simulator.get_state)
+    :type state: dict
+    :param header: the header (output of get_header)
+    :type header: dict
+    :return: the size of the file in bytes
+    :rtype: int
+    """
+    if state is None:
+        state, header = simulator.get_state(), get_header(simulator)
+    arrays, values = flatten_state(state)
+    arguments = pickle.dumps(header['arguments'])
+
+    blocks = []
+    offset = 0
+    for name, array in [('arguments', np.frombuffer(arguments, dtype=np.uint8))] + list(arrays.items()):
+        array = np.ascontiguousarray(array)
+        blocks.append((name, array, offset))
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = {name: value for name, value in header.items() if name != 'arguments'}
+    header.update(values=values, blocks=[(name, a.dtype.str, a.shape, o) for name, a, o in blocks])
+    data = json.dumps(header).encode()
+    start = -(-(len(MAGIC) + 8 + len(data)) // ALIGNMENT) * ALIGNMENT
+
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(MAGIC + len(data).to_bytes(8, 'little') + data)
+        for name, array, offset in blocks:
+            file.seek(start + offset)
+            file.write(array.data)
+        size = file.tell()
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    return size
+
+
+def get_header(simulator):
+    """ Returns the description of a simulator stored with its state """
+    module, name = get_simulator_name(simulator)
+    return {
+        'module': module,
+        'class': name,
+        'frame': simulator.frame,
+        'simconf': simulator.simconf.as_dict(),
+        'arguments': simulator.arguments,
+    }
+
+
+def read_checkpoint(path):
+    """ Reads a checkpoint
+
+    :param path: the checkpoint file
+    :type path: str
+    :return: the header (with the constructor arguments) and the state
+    :rtype: tuple[dict, dict]
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a checkpoint file.")
+        header = json.loads(file.read(int.from_bytes(file.read(8), 'little')))
+        start = -(-file.tell() // ALIGNMENT) * ALIGNMENT
+        flat = dict(header.pop('values'))
+        for name, dtype, shape, offset in header.pop('blocks'):
+            file.seek(start + offset)
+            count = int(np.prod(shape))
+            flat[name] = np.fromfile(file, dtype=dtype, count=count).reshape(shape)
+    header['arguments'] = pickle.loads(flat.pop('arguments').tobytes())
+    return header, unflatten_state(flat)
+
+
+def resume(path):
+    """ Creates the simulator of a checkpoint in the state it had when the checkpoint was written
+
+    :param path: the checkpoint file
+    :type path: str
+    :return: the simulator, ready to continue the run with step, simulate or run
+    :rtype: Simulator
+    """
+    header, state = read_checkpoint(path)
+    cls = getattr(importlib.import_module(header['module']), header['class'])
+    simulator = cls(SimConfig.from_dict(header['simconf']), **header['arguments'])
+    simulator.set_state(state)
+    return simulator
+
+
+class CheckpointWriter:
+    """ Writes checkpoints of a simulator in a background thread, every given number of frames
+
+    The state is captured when a checkpoint is due (a copy of the arrays that the simulation updates) and
+    written while the simulation continues. At most one checkpoint waits for the thread, a simulator that
+    produces checkpoints faster than they can be written waits for the previous one.
+    """
+
+    def __init__(self, path, every=100):
+        """
+        :param path: the checkpoint file, replaced by every new checkpoint
+        :type path: str
+        :param every: the number of frames between checkpoints
+        :type every: int
+        """
+        self.path = path
+        self.every = every
+        self.writes = []  # (frame, seconds to capture the state, seconds to write it, bytes) of every checkpoint
+        self.error = None
+        self.queue = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.__work, daemon=True)
+        self.thread.start()
+
+    def update(self, simulator):
+        """ Writes a checkpoint if one is due at the current frame of the simulator """
+        if simulator.frame % self.every == 0:
+            self.submit(simulator)
+
+    def submit(self, simulator):
+        """ Captures the state of the simulator and queues it for writing """
+        self.__check()
+        start = perf_counter()
+        state, header = simulator.get_state(), get_header(simulator)
+        self.queue.put((state, header, perf_counter() - start))
+
+    def close(self):
+        """ Waits until the queued checkpoints are written and stops the thread """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.__check()
+
+    def __check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f"Writing checkpoint {self.path} failed.") from error
+
+    def __work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            state, header, capture = item
+            try:
+                start = perf_counter()
+                size = write_checkpoint(self.path, state=state, header=header)
+                self.writes.append((header['frame'], capture, perf_counter() - start, size))
+            except Exception as error:
+                self.error = error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,150 @@
+""" Particle-particle collisions using a uniform grid (spatial hash) broad phase
+
+Particles are binned into cubic cells whose edge is the largest particle diameter. Two particles
+can only touch if their cells are the same or adjacent, so the candidate pairs are found by
+looking up 14 cells (the cell itself and its 13 'forward' neighbours) per occupied cell. Cells
+are addressed by a linear key and looked up in the sorted list of occupied keys, therefore
+memory scales with the number of particles and not with the volume of the simulation space.
+"""
+import numpy as np
+
+from .profiling import NULL_PROFILER
+
+# The cell itself and half of its 26 neighbours, so that every pair of cells is visited once
+_CELL_OFFSETS = [(0, 0, 0)] + [
+    (dx, dy, dz)
+    for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+    if (dx, dy, dz) > (0, 0, 0)
+]
+
+
+def update_collisions(ps, profiler=NULL_PROFILER):
+    """ Detects the colliding particles of the system and updates their velocities
+
+    :param ps: the particles
+    :type ps: ParticleSystem
+    :param profiler: records the time of the broad and the narrow phase
+    :type profiler: Profiler
+    :return: the number of collisions that were resolved
+    :rtype: int
+    """
+    with profiler.phase('broad'):
+        order, i, j = _get_cell_pairs(ps.pos, ps.radius, None)
+    with profiler.phase('narrow'):
+        i, j = _get_overlapping(ps.pos, ps.radius, order, i, j)
+        return resolve_collisions(ps, i, j)
+
+
+def find_candidate_pairs(pos, radius, cell_size=None):
+    """ Broad phase. Returns the index pairs of particles that are in the same or adjacent cells
+
+    :param pos: particle coordinates with shape (3, count)
+    :type pos: numpy.ndarray
+    :param radius: particle radii
+    :type radius: numpy.ndarray
+    :param cell_size: edge of the grid cells, defaults to the largest particle diameter
+    :type cell_size: float
+    :return: two arrays with the indexes of the first and the second particle of each pair
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    order, i, j = _get_cell_pairs(pos, radius, cell_size)
+    return order[i], order[j]
+
+
+def find_overlapping_pairs(pos, radius, cell_size=None):
+    """ Returns the index pairs of particles that overlap
+
+    The candidate pairs are tested in cell order, where particles of the same cell are
+    next to each other in memory, before they are mapped back to particle indexes.
+    :return: two arrays with the indexes of the first and the second particle of each pair
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    return _get_overlapping(pos, radius, *_get_cell_pairs(pos, radius, cell_size))
+
+
+def _get_overlapping(pos, radius, order, i, j):
+    """ Returns the overlapping pairs among the (sorted order) candidate pairs as particle indexes """
+    cell_pos, cell_radius = pos[:, order], radius[order]
+    d = cell_pos[:, i] - cell_pos[:, j]
+    min_distance = cell_radius[i] + cell_radius[j]
+    overlap = np.einsum('ij,ij->j', d, d) < min_distance * min_distance
+    return order[i[overlap]], order[j[overlap]]
+
+
+def _get_cell_pairs(pos, radius, cell_size):
+    """ Sorts the particles by cell and returns the sort order and the (sorted order) index pairs
+    of particles in the same or adjacent cells """
+    if pos.shape[1] < 2:
+        return np.arange(pos.shape[1]), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    if cell_size is None:
+        cell_size = 2 * radius.max()
+
+    # Integer cell coordinates, shifted by one so that the neighbours of any cell have valid coordinates
+    cells = np.floor((pos - pos.min(axis=1, keepdims=True)) / cell_size).astype(np.int64) + 1
+    dims = cells.max(axis=1) + 2
+    strides = np.array([dims[1] * dims[2], dims[2], 1])
+    keys = strides @ cells
+
+    order = np.argsort(keys, kind='stable')
+    occupied, start, count = np.unique(keys[order], return_index=True, return_counts=True)
+
+    firsts, seconds = [], []
+    for offset in _CELL_OFFSETS:
+        neighbour_keys = occupied + strides @ np.array(offset)
+        found = np.searchsorted(occupied, neighbour_keys)
+        found[found == len(occupied)] = 0
+        has_neighbour = occupied[found] == neighbour_keys
+        a = np.flatnonzero(has_neighbour)
+        b = found[has_neighbour]
+        i, j = _expand_cell_pairs(start[a], count[a], start[b], count[b], same_cell=offset == (0, 0, 0))
+        firsts.append(i)
+        seconds.append(j)
+
+    return order, np.concatenate(firsts), np.concatenate(seconds)
+
+
+def _expand_cell_pairs(start_a, count_a, start_b, count_b, same_cell):
+    """ Returns the (sorted order) indexes of every particle pair between the cells a and b """
+    pairs_per_cell = count_a * count_b
+    total = pairs_per_cell.sum()
+    cell = np.repeat(np.arange(len(pairs_per_cell)), pairs_per_cell)
+    local = np.arange(total) - np.repeat(np.cumsum(pairs_per_cell) - pairs_per_cell, pairs_per_cell)
+    i_local, j_local = np.divmod(local, count_b[cell])
+    if same_cell:
+        unique_pair = i_local < j_local
+        cell, i_local, j_local = cell[unique_pair], i_local[unique_pair], j_local[unique_pair]
+    return start_a[cell] + i_local, start_b[cell] + j_local
+
+
+def resolve_collisions(ps, i, j):
+    """ Narrow phase. Updates the velocities of the candidate pairs that overlap and approach each other
+
+    The velocity change is the one of an elastic collision of two spheres with different masses.
+    Particles that take part in several collisions receive the sum of the velocity changes.
+    :param ps: the particles
+    :type ps: ParticleSystem
+    :param i: indexes of the first particle of each candidate pair
+    :type i: numpy.ndarray
+    :param j: indexes of the second particle of each candidate pair
+    :type j: numpy.ndarray
+    :return: the number of collisions that were resolved
+    :rtype: int
+    """
+    d = ps.pos[:, i] - ps.pos[:, j]
+    dist2 = np.einsum('ij,ij->j', d, d)
+    min_distance = ps.radius[i] + ps.radius[j]
+    dv = ps.vel[:, i] - ps.vel[:, j]
+    approach = np.einsum('ij,ij->j', dv, d)
+
+    # Overlapping pairs that are moving towards each other (pairs moving apart have already collided)
+    colliding = (dist2 < min_distance * min_distance) & (approach < 0) & (dist2 > 0)
+    i, j, d = i[colliding], j[colliding], d[:, colliding]
+    m1, m2 = ps.mass[i], ps.mass[j]
+    impulse = 2 * approach[colliding] / (dist2[colliding] * (m1 + m2)) * d
+
+    n = len(ps)
+    for axis in range(0, 3):
+        ps.vel[axis] -= np.bincount(i, weights=m2 * impulse[axis], minlength=n)
+        ps.vel[axis] += np.bincount(j, weights=m1 * impulse[axis], minlength=n)
+
+    return len(i)
@@ -0,0 +1,236 @@
+""" Event-driven (time of impact) dynamics of free particles in a box
+
+Instead of moving every particle by a fixed timestep and reflecting the ones found outside the box or
+overlapping afterwards, the engine predicts when every particle next hits a wall or another particle
+and jumps from one impact to the next with a priority queue. Particles cannot tunnel through each
+other or jitter at the walls, and a sparse gas needs one event per impact instead of many small steps.
+
+Every particle has a single event in the queue: the earliest impact it was predicted to take part in.
+An impact changes the velocities of its particles, which invalidates the events predicted with them
+(an event stores the impact counts of its particles at the time of the prediction). Only the particles
+of an impact are predicted again. A particle whose own event was invalidated by a change of its
+partner is predicted again when the stale event is popped: the pairs it forms with unchanged particles
+cannot collide before, and the pairs with changed particles were predicted by those particles.
+
+The box is split in a grid of cells at least as large as the largest particle diameter, so touching
+particles are always in neighbouring cells. A particle is only predicted against the particles of the
+27 cells around its own, and leaving its cell is an event too, after which it is predicted again in its
+new cell. A particle that enters the neighbourhood of another one is predicted against it at that moment,
+so no impact is missed, and a prediction costs in proportion to the particles nearby instead of all of them.
+
+Positions are advanced lazily: a particle's position is valid at its own time, and all particles are
+brought to the engine time at the end of every step, so frames are still sampled once per timestep.
+"""
+import heapq
+from itertools import chain
+
+import numpy as np
+
+from .collisions import find_candidate_pairs
+
+NEIGHBOUR_CELLS = np.indices((3, 3, 3)).reshape(3, -1) - 1  # offsets of a cell and the 26 cells around it
+PARTICLES_PER_CELL = 2  # the mean number of particles per cell of a sparse gas
+
+
+class EventEngine:
+    """ Steps a ParticleSystem of free particles in the box [0, bbox_size]^3 from impact to impact """
+
+    def __init__(self, ps, bbox_size, timestep):
+        """
+        :param ps: the particles
+        :type ps: ParticleSystem
+        :param bbox_size: the edge of the box
+        :type bbox_size: float
+        :param timestep: the time the system is advanced by per step (between two frames)
+        :type timestep: float
+        """
+        self.ps = ps
+        self.bbox_size = bbox_size
+        self.timestep = timestep
+        self.time = 0.0
+        self.times = np.zeros(len(ps))  # the time at which the position of each particle is valid
+        self.impacts = np.zeros(len(ps), dtype=np.int64)  # the number of impacts of each particle
+        # heap of (time, particle, partner or -1 - wall axis or -4 - axis of a cell crossing, impacts of particle,
+        # impacts of partner)
+        self.events = []
+        self.count = 0  # the number of impacts that were resolved
+        self.crossings = 0  # the number of cell crossings
+
+        # Smaller cells mean fewer particles to predict against but more cell crossings
+        size = max(2 * float(ps.radius.max(initial=0)) * (1 + 1e-9),
+                   np.cbrt(PARTICLES_PER_CELL * bbox_size ** 3 / max(len(ps), 1)))
+        self.grid = max(int(bbox_size / size), 1)
+        self.cell_size = bbox_size / self.grid
+        self.cells = np.clip((ps.pos / self.cell_size).astype(np.int64), 0, self.grid - 1)  # the cell of each particle
+        self.members = {}  # the particles of every occupied cell, by flat cell index
+        self.__fill_cells()
+        self.__predict_all()
+
+    def step(self, n=1):
+        """ Advances the simulation by n timesteps
+
+        :return: the number of impacts that were resolved
+        :rtype: int
+        """
+        count = self.count
+        for _ in range(0, n):
+            self.advance(self.time + self.timestep)
+        return self.count - count
+
+    def advance(self, time):
+        """ Resolves the impacts until the given time and moves every particle to it """
+        events, impacts = self.events, self.impacts
+        while events and events[0][0] <= time:
+            self.time, i, j, impacts_i, impacts_j = heapq.heappop(events)
+            if impacts[i] != impacts_i:
+                continue  # the particle was already predicted again
+            if j >= 0 and impacts[j] != impacts_j:
+                self.__predict(i)  # the partner changed its course
+                continue
+            if j >= 0:
+                self.__collide(i, j)
+                self.__predict(j)
+            elif j >= -3:
+                self.__bounce(i, -1 - j)
+            else:
+                self.__cross(i, -4 - j)
+            self.__predict(i)
+
+        self.ps.pos += self.ps.vel * (time - self.times)
+        self.times[:] = time
+        self.time = time
+
+    def get_state(self):
+        """ Returns the clock, the impact counts, the cells of the particles and the queued events (in heap order) """
+        events = np.array([event[1:] for event in self.events], dtype=np.int64).reshape(-1, 4)
+        return {'time': self.time, 'count': self.count, 'times': self.times.copy(), 'impacts': self.impacts.copy(),
+                'cells': self.cells.copy(), 'event_times': np.array([event[0] for event in self.events]),
+                'events': events}
+
+    def set_state(self, state):
+        """ Loads a state returned by get_state """
+        self.time, self.count = state['time'], state['count']
+        self.times[:], self.impacts[:], self.cells[:] = state['times'], state['impacts'], state['cells']
+        self.__fill_cells()
+        self.events = [(float(t), int(i), int(j), int(a), int(b))
+                       for t, (i, j, a, b) in zip(state['event_times'], state['events'])]
+
+    def __fill_cells(self):
+        """ Lists the particles of every cell from the cells of the particles """
+        self.members = {}
+        for i, cell in enumerate(np.ravel_multi_index(self.cells, (self.grid,) * 3).tolist()):
+            self.members.setdefault(cell, set()).add(i)
+
+    def __move(self, i):
+        """ Moves a particle to the engine time """
+        self.ps.pos[:, i] += self.ps.vel[:, i] * (self.time - self.times[i])
+        self.times[i] = self.time
+
+    def __bounce(self, i, axis):
+        self.__move(i)
+        self.ps.vel[axis, i] = -self.ps.vel[axis, i]
+        self.impacts[i] += 1
+        self.count += 1
+
+    def __cross(self, i, axis):
+        """ Moves a particle to the next cell on an axis, in the direction of its velocity """
+        old = int(np.ravel_multi_index(self.cells[:, i], (self.grid,) * 3))
+        self.cells[axis, i] += 1 if self.ps.vel[axis, i] > 0 else -1
+        self.members[old].discard(i)
+        self.members.setdefault(int(np.ravel_multi_index(self.cells[:, i], (self.grid,) * 3)), set()).add(i)
+        self.crossings += 1
+
+    def __collide(self, i, j):
+        """ Elastic collision of two touching particles (same impulse as collisions.resolve_collisions) """
+        self.__move(i)
+        self.__move(j)
+        ps = self.ps
+        d = ps.pos[:, i] - ps.pos[:, j]
+        approach = (ps.vel[:, i] - ps.vel[:, j]) @ d
+        impulse = 2 * approach / ((d @ d) * (ps.mass[i] + ps.mass[j])) * d
+        ps.vel[:, i] -= ps.mass[j] * impulse
+        ps.vel[:, j] += ps.mass[i] * impulse
+        self.impacts[i] += 1
+        self.impacts[j] += 1
+        self.count += 1
+
+    def __predict_all(self):
+        """ Queues the events of every particle (the same events as __predict, with whole array operations) """
+        ps = self.ps
+        v, r = ps.vel, ps.radius
+        p = ps.pos + v * (self.time - self.times)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wall = np.where(v > 0, (self.bbox_size - r - p) / v, np.where(v < 0, (r - p) / v, np.inf))
+            cell = self.cells
+            crossing = np.where(v > 0, ((cell + 1) * self.cell_size - p) / v, (cell * self.cell_size - p) / v)
+            crossing[(v == 0) | ((v > 0) & (cell == self.grid - 1)) | ((v < 0) & (cell == 0))] = np.inf
+        dt, partner = wall.min(axis=0), -1 - wall.argmin(axis=0)
+        closer = crossing.min(axis=0) < dt
+        dt[closer], partner[closer] = crossing.min(axis=0)[closer], -4 - crossing.argmin(axis=0)[closer]
+
+        # Particle pairs in neighbouring cells (the broad phase of the integer cell coordinates, with unit cells),
+        # as seen from both particles. Each particle keeps its earliest impact, ties go to the lowest partner
+        i, j = find_candidate_pairs(cell.astype(float), r, 1.0)
+        i, j = np.concatenate((i, j)), np.concatenate((j, i))
+        d = p[:, j] - p[:, i]
+        dv = v[:, j] - v[:, i]
+        b = np.einsum('ij,ij->j', d, dv)
+        dvv = np.einsum('ij,ij->j', dv, dv)
+        sigma = r[j] + r[i]
+        discriminant = b * b - dvv * (np.einsum('ij,ij->j', d, d) - sigma * sigma)
+        hit = (b < 0) & (discriminant >= 0)
+        i, j = i[hit], j[hit]
+        times = -(b[hit] + np.sqrt(discriminant[hit])) / dvv[hit]
+        order = np.lexsort((j, times, i))
+        first = order[np.r_[True, i[order][1:] != i[order][:-1]]] if order.size else order
+        earlier = times[first] < dt[i[first]]
+        dt[i[first][earlier]], partner[i[first][earlier]] = times[first][earlier], j[first][earlier]
+
+        queued = np.flatnonzero(np.isfinite(dt))
+        impacts_partner = np.where(partner[queued] >= 0, self.impacts[np.maximum(partner[queued], 0)], 0)
+        self.events = list(zip((self.time + np.maximum(dt[queued], 0.0)).tolist(), queued.tolist(),
+                               partner[queued].tolist(), self.impacts[queued].tolist(), impacts_partner.tolist()))
+        heapq.heapify(self.events)
+
+    def __predict(self, i):
+        """ Queues the earliest wall, particle or cell crossing event of a particle, from the engine time """
+        ps = self.ps
+        v, r = ps.vel[:, i], ps.radius[i]
+        p = ps.pos[:, i] + v * (self.time - self.times[i])
+
+        # Walls: the time until the particle touches the wall it moves towards, on every axis
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wall = np.where(v > 0, (self.bbox_size - r - p) / v, np.where(v < 0, (r - p) / v, np.inf))
+            # Cells: the time until the particle leaves its cell, except through the sides of the grid
+            cell = self.cells[:, i]
+            crossing = np.where(v > 0, ((cell + 1) * self.cell_size - p) / v, (cell * self.cell_size - p) / v)
+            crossing[(v == 0) | ((v > 0) & (cell == self.grid - 1)) | ((v < 0) & (cell == 0))] = np.inf
+        axis = int(np.argmin(wall))
+        dt, partner = wall[axis], -1 - axis
+        axis = int(np.argmin(crossing))
+        if crossing[axis] < dt:
+            dt, partner = crossing[axis], -4 - axis
+
+        # Particles of the neighbouring cells: the smallest root of |d + dv t| = r_i + r_j for the pairs that
+        # approach each other
+        around = cell[:, None] + NEIGHBOUR_CELLS
+        around = np.ravel_multi_index(around[:, ((around >= 0) & (around < self.grid)).all(axis=0)], (self.grid,) * 3)
+        index = np.fromiter(chain.from_iterable(self.members.get(c, ()) for c in around.tolist()), dtype=np.intp)
+        index = np.sort(index[index != i])  # the order of a set depends on its history, ties go to the lowest index
+        d = ps.pos[:, index] + ps.vel[:, index] * (self.time - self.times[index]) - p[:, None]
+        dv = ps.vel[:, index] - v[:, None]
+        b = np.einsum('ij,ij->j', d, dv)
+        dvv = np.einsum('ij,ij->j', dv, dv)
+        sigma = ps.radius[index] + r
+        discriminant = b * b - dvv * (np.einsum('ij,ij->j', d, d) - sigma * sigma)
+        hit = (b < 0) & (discriminant >= 0)
+        if hit.any():
+            index, b, discriminant, dvv = index[hit], b[hit], discriminant[hit], dvv[hit]
+            times = -(b + np.sqrt(discriminant)) / dvv
+            k = int(np.argmin(times))
+            if times[k] < dt:
+                dt, partner = times[k], int(index[k])
+
+        if np.isfinite(dt):
+            impacts_partner = self.impacts[partner] if partner >= 0 else 0
+            heapq.heappush(self.events, (self.time + max(dt, 0.0), i, partner, self.impacts[i], impacts_partner))
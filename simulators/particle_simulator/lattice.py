@@ -0,0 +1,116 @@
+""" Kernels for parts made of a regular lattice of equal particles, stored as dense (3, nx, ny, nz) arrays
+
+The neighbours of a lattice particle are implicit (the particles at index +-1 on each axis), so the
+kernels work with slices of the lattice instead of neighbour lists. Every kernel only moves the
+particles inside a (lo, hi) index box, so that a lattice can be split between workers.
+"""
+import numpy as np
+
+# (axis, index step) of the neighbours in the order that get_part_particles stores them
+NEIGHBOUR_DIRECTIONS = ((0, -1), (0, 1), (1, -1), (1, 1), (2, -1), (2, 1))
+
+
+def get_neighbour_graph(shape, offset=0):
+    """ Returns the neighbour graph of a lattice in compressed sparse row form (see ParticleSystem)
+
+    The particles are numbered in flattened (x, y, z) order from offset onwards, and the neighbours of
+    every particle are listed in the order of NEIGHBOUR_DIRECTIONS. The offset particles before the
+    lattice have no neighbours.
+    :param shape: number of particles on each axis
+    :type shape: tuple[int, int, int]
+    :return: the neighbour offsets (count + 1) and the neighbour indexes
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    index = np.indices(shape).reshape(3, -1)
+    strides = np.array([shape[1] * shape[2], shape[2], 1])
+    flat = np.arange(index.shape[1])
+    neighbours = np.empty((index.shape[1], len(NEIGHBOUR_DIRECTIONS)), dtype=np.intp)
+    valid = np.empty(neighbours.shape, dtype=bool)
+    for k, (axis, step) in enumerate(NEIGHBOUR_DIRECTIONS):
+        neighbours[:, k] = offset + flat + step * strides[axis]
+        valid[:, k] = (0 <= index[axis] + step) & (index[axis] + step < shape[axis])
+    degree = np.concatenate((np.zeros(offset, dtype=np.intp), valid.sum(axis=1)))
+    return np.concatenate(([0], np.cumsum(degree))).astype(np.intp), neighbours[valid]
+
+
+def get_parity(shape, lo=(0, 0, 0), hi=None):
+    """ Returns the red-black colour (parity of x + y + z index) of the lattice particles inside the box """
+    hi = shape if hi is None else hi
+    return (np.indices([h - l for l, h in zip(lo, hi)]).sum(axis=0) + sum(lo)) % 2
+
+
+def set_post_collision_positions(p_move, p_still, distance, mask):
+    """ Moves the particles p_move (in place) out of the particles p_still where mask is set
+
+    Same formula as set_post_collision_position of nano_imprint, applied to whole arrays.
+    :param p_move: coordinates of the moving particles, shape (3, ...)
+    :type p_move: numpy.ndarray
+    :param p_still: coordinates of the still particles, broadcastable to p_move
+    :type p_still: numpy.ndarray
+    :param distance: the distance between the centres of touching particles (sum of radii)
+    :type distance: float
+    :param mask: the particles that may move, shape p_move.shape[1:]
+    :type mask: numpy.ndarray
+    """
+    d = p_move - p_still
+    dist = np.sqrt(d[0] * d[0] + d[1] * d[1] + d[2] * d[2])
+    overlap = distance - dist
+    hit = mask & (overlap > 0) & (dist > 0)
+    p_move[:, hit] += overlap[hit] * d[:, hit] / dist[hit]
+
+
+def update_tool_collisions(lattice, locked, radius, tool_pos, tool_radius, lo, hi):
+    """ Pushes the lattice particles of the tool's index box (clipped to lo, hi) out of the tool and locks them
+
+    :param lattice: particle coordinates with shape (3, nx, ny, nz)
+    :type lattice: numpy.ndarray
+    :param locked: locked flags with shape (nx, ny, nz)
+    :type locked: numpy.ndarray
+    :param radius: radius of the lattice particles
+    :type radius: float
+    :param tool_pos: coordinates of the tool
+    :type tool_pos: numpy.ndarray
+    :param tool_radius: radius of the tool
+    :type tool_radius: float
+    """
+    tri = int(tool_radius / radius)  # Tool's range of indexes (length/particle diameter)
+    tool_index = ((tool_pos - 1) / (2 * radius)).astype(int)
+    box = tuple(slice(max(i - tri, l), max(min(i + tri, h), l)) for i, l, h in zip(tool_index, lo, hi))
+    cells = lattice[(slice(None),) + box]
+    set_post_collision_positions(cells, tool_pos.reshape(3, 1, 1, 1), radius + tool_radius,
+                                 np.ones(cells.shape[1:], dtype=bool))
+    locked[box] = True  # prevent push backs
+
+
+def relax(lattice, locked, radius, parity, colour, lo, hi):
+    """ Pushes the unlocked particles of one colour inside the (lo, hi) box out of their neighbours
+
+    The neighbours are applied one direction at a time, in the order of NEIGHBOUR_DIRECTIONS.
+    :param lattice: particle coordinates with shape (3, nx, ny, nz)
+    :type lattice: numpy.ndarray
+    :param locked: locked flags with shape (nx, ny, nz)
+    :type locked: numpy.ndarray
+    :param radius: radius of the lattice particles
+    :type radius: float
+    :param parity: output of get_parity for the (lo, hi) box
+    :type parity: numpy.ndarray
+    :param colour: the colour (0 or 1) to move
+    :type colour: int
+    """
+    box = tuple(slice(l, h) for l, h in zip(lo, hi))
+    movable = (parity == colour) & ~locked[box]
+    shape = lattice.shape[1:]
+    for axis, step in NEIGHBOUR_DIRECTIONS:
+        # Movers are the box particles that have a neighbour in this direction
+        start = max(lo[axis], 1) if step < 0 else lo[axis]
+        stop = hi[axis] if step < 0 else min(hi[axis], shape[axis] - 1)
+        if start >= stop:
+            continue
+        movers = list(box)
+        movers[axis] = slice(start, stop)
+        still = list(movers)
+        still[axis] = slice(start + step, stop + step)
+        mask = list(slice(None) for _ in range(3))
+        mask[axis] = slice(start - lo[axis], stop - lo[axis])
+        set_post_collision_positions(lattice[(slice(None),) + tuple(movers)], lattice[(slice(None),) + tuple(still)],
+                                     2 * radius, movable[tuple(mask)])
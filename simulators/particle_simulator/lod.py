@@ -0,0 +1,110 @@
+""" Level of detail: reduces very large particle sets before they are rendered
+
+Particles are either aggregated into voxel representatives (one particle per occupied voxel, at
+the mean position of its members, with their total volume and mean colour) or replaced by a stable
+subsample. The voxel size is given in pixels, so the detail matches the resolution of the figure
+(fig_size * dpi). The particles returned by Simulator.get_focus (e.g. the tool and the displaced
+particles of nano_imprint) are always drawn at full detail. When a simulator defines a focus, the
+other particles are treated as static by the voxel aggregation (their voxels are only computed once).
+"""
+import numpy as np
+
+MODES = ('voxel', 'subsample')
+
+
+class LevelOfDetail:
+    """ Reduces the particles of a simulator to at most one representative per screen voxel """
+
+    def __init__(self, simulator, mode='voxel', pixels=4):
+        """
+        :param simulator: the simulator whose particles are reduced
+        :type simulator: Simulator
+        :param mode: 'voxel' (voxel averaged representatives) or 'subsample' (stable subsample)
+        :type mode: str
+        :param pixels: the edge of a voxel in pixels
+        :type pixels: float
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown level of detail mode {mode}, expected one of {', '.join(MODES)}.")
+        self.simulator = simulator
+        self.mode = mode
+        simconf = simulator.simconf
+        ps = simulator.particles
+
+        self.cell = simconf.bbox_size * pixels / (simconf.fig_size * simconf.dpi)  # voxel edge in plot units
+        self.grid = int(np.ceil(simconf.bbox_size / self.cell)) + 2  # voxels per axis, one extra on each side
+        self.radius = np.asarray(simulator.get_particles_attribute('radius'))
+        self.volume = self.radius ** 3
+        self.colour = np.asarray(simulator.get_particles_attribute('colour'))
+
+        # The subsample keeps about one particle per voxel of the screen area, always the same ones
+        count = len(ps)
+        budget = min(count, self.grid * self.grid)
+        self.sample = np.sort(np.random.default_rng(0).permutation(count)[:budget])
+        self.sample_scale = np.cbrt(count / budget)  # grows the sampled particles to cover the same volume
+
+        # Voxel of every particle, and count, volume, volume weighted position sum and mean colour of every voxel
+        self.voxel = None
+        self.members = None
+        self.total = None
+        self.moments = None
+        self.voxel_colour = None
+        self.rest = None  # the positions the voxels were computed for
+        self.focus = None
+        self.representatives = None  # the voxel representatives of the last focus
+
+    def reduce(self, pos):
+        """ Returns the particles to draw for the given coordinates
+
+        :param pos: the particle coordinates with shape (3, count)
+        :type pos: numpy.ndarray
+        :return: coordinates (3, n), radii (n) and RGBA colours (n, 4) of the particles to draw
+        :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        focus = self.simulator.get_focus(pos)
+        focus_index = np.zeros(0, dtype=np.intp) if focus is None else np.flatnonzero(focus)
+
+        if self.mode == 'subsample':
+            keep = self.sample if focus is None else self.sample[~focus[self.sample]]
+            reduced = pos.take(keep, axis=1), self.radius[keep] * self.sample_scale, self.colour[keep]
+        else:
+            reduced = self.__aggregate(pos, focus)
+
+        return (np.concatenate((reduced[0], pos.take(focus_index, axis=1)), axis=1),
+                np.concatenate((reduced[1], self.radius[focus_index])),
+                np.concatenate((reduced[2], self.colour[focus_index])))
+
+    def __aggregate(self, pos, focus):
+        """ Replaces the particles outside the focus by one representative per occupied voxel
+
+        Without a focus every particle may move, so the voxels are computed again for every frame. The
+        particles outside a focus are static at this level of detail: their voxels are computed once
+        and the focus particles are subtracted from them.
+        """
+        if focus is None or self.voxel is None:
+            self.__sort(pos)
+        elif np.array_equal(focus, self.focus):
+            return self.representatives
+        members, total, moments = self.members, self.total, self.moments
+        if focus is not None:
+            index = np.flatnonzero(focus)
+            voxel, volume, voxels = self.voxel[index], self.volume[index], len(members)
+            members = members - np.bincount(voxel, minlength=voxels)
+            total = total - np.bincount(voxel, volume, minlength=voxels)
+            moments = moments - np.array([np.bincount(voxel, volume * p, minlength=voxels)
+                                          for p in self.rest[:, index]])
+        occupied = members > 0
+        self.focus = focus
+        self.representatives = (moments[:, occupied] / total[occupied], np.cbrt(total[occupied]),
+                                self.voxel_colour[occupied])
+        return self.representatives
+
+    def __sort(self, pos):
+        """ Sorts the particles into voxels and sums the volume and the moments of every voxel """
+        index = np.clip(pos * (1 / self.cell) + 1, 0, self.grid - 1).astype(np.int64)
+        key = (index[0] * self.grid + index[1]) * self.grid + index[2]
+        _, self.voxel, self.members = np.unique(key, return_inverse=True, return_counts=True)
+        self.total = np.bincount(self.voxel, self.volume)
+        self.moments = np.array([np.bincount(self.voxel, self.volume * p) for p in pos])
+        self.voxel_colour = np.array([np.bincount(self.voxel, c) for c in self.colour.T]).T / self.members[:, None]
+        self.rest = np.array(pos)  # copy, the frame may be reused by its producer
@@ -0,0 +1,170 @@
+""" Parallel relaxation of a lattice part by domain decomposition
+
+The lattice is split along x into slabs, one per worker process. Positions and locked flags live in
+shared memory, so each worker updates its own slab in place. The layer of particles just outside a
+slab (the ghost layer) belongs to the neighbouring slab and is read from the shared arrays. Barriers
+separate the phases of a step so that ghost layers are only read when their owner has finished
+writing them:
+
+    main: move tool -> [start] -> workers: unlock, tool contacts -> [sync] -> red pass -> [sync]
+    -> black pass, lock -> [done] -> main
+
+The tool is moved by the main process and every worker handles the part of the tool's reach that
+falls inside its own slab, so a tool that spans several slabs is handled by all of them.
+
+A worker that raises aborts the barriers, the barriers of a step time out if a worker stops responding,
+and the main process checks that the workers are alive before it waits, so a failed worker raises a
+RuntimeError in the main process instead of blocking it.
+
+The workers are forked, so that they inherit the shared arrays and the tool function instead of pickling
+them. On platforms without fork (Windows) the engine raises a RuntimeError; run the simulation without workers there.
+
+The speedup over the single process relaxation has not been measured on a machine with more than one core
+(benchmark_parallel.py). On one core the workers only add the cost of the decomposition.
+"""
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import lattice
+
+
+class SlabEngine:
+    """ Steps a ParticleSystem that holds a tool at index 0 and a lattice part (flattened in x, y, z
+    order) from index 1 onwards, using a number of worker processes """
+
+    def __init__(self, ps, shape, update_tool, workers, timeout=60.0):
+        """
+        :param ps: the particles. Their positions and locked flags are moved to shared memory
+        :type ps: ParticleSystem
+        :param shape: number of part particles on each axis
+        :type shape: tuple[int, int, int]
+        :param update_tool: function that moves the tool particle (e.g. nano_imprint.update_tool_position)
+        :type update_tool: callable
+        :param workers: the number of worker processes (slabs)
+        :type workers: int
+        :param timeout: the longest time in seconds a phase of a step may take before the workers are considered failed
+        :type timeout: float
+        :raises RuntimeError: if the platform cannot fork processes
+        """
+        context = get_fork_context()  # before the arrays are moved to shared memory
+        self.ps = ps
+        self.shape = tuple(shape)
+        self.update_tool = update_tool
+        self.workers = min(workers, self.shape[0])
+        self.radius = ps.radius[1]
+        self.timeout = timeout
+
+        # Move positions and locked flags to shared memory, the system keeps using them as its arrays
+        self.memory = shared_memory.SharedMemory(create=True, size=ps.pos.nbytes + ps.locked.nbytes + 1)
+        pos = np.ndarray(ps.pos.shape, dtype=ps.pos.dtype, buffer=self.memory.buf)
+        locked = np.ndarray(ps.locked.shape, dtype=bool, buffer=self.memory.buf, offset=ps.pos.nbytes)
+        pos[:], locked[:] = ps.pos, ps.locked
+        ps.pos, ps.locked = pos, locked
+        self.stop = np.ndarray(1, dtype=bool, buffer=self.memory.buf, offset=ps.pos.nbytes + ps.locked.nbytes)
+        self.stop[0] = False
+
+        bounds = np.linspace(0, self.shape[0], self.workers + 1).astype(int)
+        self.start = context.Barrier(self.workers + 1)
+        self.done = context.Barrier(self.workers + 1)
+        self.sync = context.Barrier(self.workers)
+        self.processes = [context.Process(target=self.__work, args=(bounds[i], bounds[i + 1]), daemon=True)
+                          for i in range(0, self.workers)]
+        for process in self.processes:
+            process.start()
+
+    def step(self, n=1):
+        """ Advances the simulation by n steps
+
+        :raises RuntimeError: if a worker failed, or the engine is closed
+        """
+        if self.memory is None:
+            raise RuntimeError("The slab engine is closed.")
+        for _ in range(0, n):
+            self.update_tool(self.ps[0])
+            self.__wait(self.start)
+            self.__wait(self.done)
+
+    def close(self):
+        """ Stops the workers and releases the shared memory. The system keeps a private copy of its arrays """
+        if self.memory is None:
+            return
+        self.stop[0] = True
+        alive = all(process.is_alive() for process in self.processes)
+        if alive:
+            try:
+                self.start.wait(self.timeout)
+            except threading.BrokenBarrierError:
+                pass  # the workers stop on the broken barrier
+        for process in self.processes:
+            if alive:
+                process.join(self.timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.ps.pos, self.ps.locked = self.ps.pos.copy(), self.ps.locked.copy()
+        self.stop = None
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+    def __wait(self, barrier):
+        """ Waits for the workers at a barrier of a step """
+        # A barrier cannot be released or aborted while a dead worker is counted as waiting on it
+        if all(process.is_alive() for process in self.processes):
+            try:
+                barrier.wait(self.timeout)
+                return
+            except threading.BrokenBarrierError:
+                pass
+        codes = [process.exitcode for process in self.processes]
+        raise RuntimeError(f"A worker of the slab engine failed or timed out (exit codes {codes}).")
+
+    def __work(self, x0, x1):
+        """ Worker process. Updates the slab of the lattice with x index in [x0, x1) """
+        lo, hi = (x0, 0, 0), (x1,) + self.shape[1:]
+        part_pos = self.ps.pos[:, 1:].reshape((3,) + self.shape)
+        part_locked = self.ps.locked[1:].reshape(self.shape)
+        parity = lattice.get_parity(self.shape, lo, hi)
+        tool_radius = self.ps.radius[0]
+
+        try:
+            while True:
+                self.start.wait()  # no timeout, the main process may pause between steps
+                if self.stop[0]:
+                    return
+                part_locked[x0:x1] = False
+                lattice.update_tool_collisions(part_pos, part_locked, self.radius, self.ps.pos[:, 0], tool_radius,
+                                               lo, hi)
+                self.sync.wait(self.timeout)
+                lattice.relax(part_pos, part_locked, self.radius, parity, 0, lo, hi)
+                self.sync.wait(self.timeout)
+                lattice.relax(part_pos, part_locked, self.radius, parity, 1, lo, hi)
+                part_locked[x0:x1] = True
+                self.done.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            return  # another process failed
+        except BaseException:
+            for barrier in (self.start, self.sync, self.done):
+                barrier.abort()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def get_fork_context():
+    """ Returns the multiprocessing context that forks the worker processes
+
+    :raises RuntimeError: if the platform cannot fork processes (e.g. Windows)
+    :rtype: multiprocessing.context.BaseContext
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("The worker processes are forked, which this platform does not support. "
+                           "Run the simulation without worker processes.")
+    return multiprocessing.get_context('fork')
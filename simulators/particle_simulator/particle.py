@@ -1,4 +1,7 @@
 import math
+from operator import attrgetter
+
+import numpy as np
 
 
 class Particle:
@@ -22,3 +25,289 @@ class Particle:
 
     def __str__(self):
         return str(self.x) + ", " + str(self.y) + ", " + str(self.z)
+
+
+PRECISIONS = ('float64', 'float32')
+
+# The Particle attributes of the arrays of a ParticleSystem (one per row of the (3, count) arrays)
+PARTICLE_ATTRIBUTES = {
+    'pos': ('x', 'y', 'z'), 'pos0': ('x0', 'y0', 'z0'), 'vel': ('vx', 'vy', 'vz'), 'force': ('fx', 'fy', 'fz'),
+    'mass': ('mass',), 'radius': ('radius',), 'locked': ('locked',),
+}
+
+
+def get_dtype(precision):
+    """ Returns the numpy type of a precision setting (simconf.precision)
+
+    :param precision: 'float64' or 'float32' (or the numpy type)
+    :type precision: str | numpy.dtype
+    :rtype: numpy.dtype
+    """
+    dtype = np.dtype(precision)
+    if dtype.name not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision}, expected one of {', '.join(PRECISIONS)}.")
+    return dtype
+
+
+class ParticleSystem:
+    """ Keeps the properties of all particles in contiguous numpy arrays (structure of arrays)
+
+    Vector quantities are stored with shape (3, count) so that each axis (e.g. all the
+    x coordinates) is a contiguous row that can be handed to matplotlib without copying.
+    Indexing the system returns a ParticleView that exposes the familiar Particle attributes.
+
+    The floating point arrays have the dtype of the system (float64 or float32, see PRECISIONS). float32
+    halves the memory and the memory traffic of large systems. Sums over many particles (e.g. impulses and
+    energies) are accumulated in float64 before they are stored.
+    """
+
+    def __init__(self, count, dtype=np.float64):
+        """
+        :param count: the number of particles
+        :type count: int
+        :param dtype: the floating point type of the arrays
+        :type dtype: numpy.dtype | str
+        """
+        dtype = get_dtype(dtype)
+        self.pos = np.zeros((3, count), dtype)     # coordinates
+        self.pos0 = np.zeros((3, count), dtype)    # initial coordinates
+        self.vel = np.zeros((3, count), dtype)     # velocities
+        self.force = np.zeros((3, count), dtype)   # forces
+        self.mass = np.ones(count, dtype)
+        self.radius = np.ones(count, dtype)
+        self.colour = np.zeros((count, 4), dtype)  # RGBA colour of representation
+        self.colour[:, 3] = 1
+        self.locked = np.zeros(count, dtype=bool)
+
+        # Neighbour graph in compressed sparse row form. The neighbours of particle i are
+        # neighbour_indices[neighbour_offsets[i]:neighbour_offsets[i + 1]]
+        self.neighbour_offsets = np.zeros(count + 1, dtype=np.intp)
+        self.neighbour_indices = np.zeros(0, dtype=np.intp)
+
+    @classmethod
+    def from_particles(cls, particles, dtype=np.float64):
+        """ Creates a particle system holding a copy of the properties of the given particles
+
+        Neighbour references between the given particles are converted to indexes.
+        :param particles: the particles to copy
+        :type particles: list[Particle]
+        :param dtype: the floating point type of the arrays
+        :type dtype: numpy.dtype | str
+        :return: the new particle system
+        :rtype: ParticleSystem
+        """
+        system = cls(len(particles), dtype)
+        for i, p in enumerate(particles):
+            system.pos[:, i] = p.x, p.y, p.z
+            system.pos0[:, i] = p.x0, p.y0, p.z0
+            system.vel[:, i] = p.vx, p.vy, p.vz
+            system.force[:, i] = p.fx, p.fy, p.fz
+            system.mass[i] = p.mass
+            system.radius[i] = p.radius
+            system.colour[i] = to_rgba(p.colour)
+            system.locked[i] = p.locked
+
+        if any(p.neighbours for p in particles):
+            index = {id(p): i for i, p in enumerate(particles)}
+            system.set_neighbours([[index[id(pn)] for pn in p.neighbours] for p in particles])
+
+        return system
+
+    def to_particles(self):
+        """ Creates a Particle holding a copy of the properties of every particle of the system
+
+        Per-particle loops read and write the attributes of Particle objects (plain Python floats) much faster
+        than the attributes of views, which index the arrays on every access. The loops work on the particles
+        and copy the changed properties to and from the system in bulk (copy_from_particles, copy_to_particles).
+        :return: the particles, their neighbours reference the returned particles
+        :rtype: list[Particle]
+        """
+        particles = [Particle() for _ in range(0, len(self))]
+        self.copy_to_particles(particles, ('pos', 'pos0', 'vel', 'force', 'mass', 'radius', 'locked'))
+        for p, colour in zip(particles, self.colour.tolist()):
+            p.colour = tuple(colour)
+        for p, start, stop in zip(particles, self.neighbour_offsets[:-1].tolist(), self.neighbour_offsets[1:].tolist()):
+            p.neighbours = [particles[i] for i in self.neighbour_indices[start:stop].tolist()]
+        return particles
+
+    def copy_to_particles(self, particles, names=('pos',), index=None):
+        """ Copies arrays of the system to the attributes of the particles returned by to_particles
+
+        :param particles: the particles
+        :type particles: list[Particle]
+        :param names: the arrays to copy (see PARTICLE_ATTRIBUTES)
+        :type names: tuple[str]
+        :param index: if given, only the particles with these indexes are copied
+        :type index: numpy.ndarray
+        """
+        if index is not None:
+            particles = [particles[i] for i in index.tolist()]
+        for name in names:
+            values = getattr(self, name)
+            values = values[..., index] if index is not None else values
+            rows = values.tolist() if values.ndim > 1 else [values.tolist()]
+            for attribute, row in zip(PARTICLE_ATTRIBUTES[name], rows):
+                for p, value in zip(particles, row):
+                    setattr(p, attribute, value)
+
+    def copy_from_particles(self, particles, names=('pos',)):
+        """ Copies the attributes of the particles returned by to_particles to the arrays of the system
+
+        The particles of a float32 system are then updated with the rounded values, so that they continue from
+        the same state as the system.
+        :param particles: the particles
+        :type particles: list[Particle]
+        :param names: the arrays to copy (see PARTICLE_ATTRIBUTES)
+        :type names: tuple[str]
+        """
+        for name in names:
+            values = [list(map(attrgetter(attribute), particles)) for attribute in PARTICLE_ATTRIBUTES[name]]
+            getattr(self, name)[...] = values if len(values) > 1 else values[0]
+        if self.pos.dtype != np.float64:
+            self.copy_to_particles(particles, names)
+
+    def set_neighbours(self, neighbours):
+        """ Stores the neighbour graph in compressed form
+
+        :param neighbours: the neighbour indexes of each particle
+        :type neighbours: list[list[int]]
+        """
+        degree = [len(n) for n in neighbours]
+        self.neighbour_offsets = np.concatenate(([0], np.cumsum(degree))).astype(np.intp)
+        self.neighbour_indices = np.fromiter(
+            (i for n in neighbours for i in n), dtype=np.intp, count=self.neighbour_offsets[-1])
+
+    def get_state(self):
+        """ Returns the arrays of the system. The arrays that the simulation updates (positions,
+        velocities, forces and locked flags) are copied, the others are shared """
+        return {
+            'pos': self.pos.copy(), 'vel': self.vel.copy(), 'force': self.force.copy(), 'locked': self.locked.copy(),
+            'pos0': self.pos0, 'mass': self.mass, 'radius': self.radius, 'colour': self.colour,
+            'neighbour_offsets': self.neighbour_offsets, 'neighbour_indices': self.neighbour_indices,
+        }
+
+    def set_state(self, state):
+        """ Copies the arrays of a state returned by get_state into the system (in place, so that views
+        of the arrays, e.g. in shared memory, stay valid) """
+        if state['pos'].shape != self.pos.shape:
+            raise ValueError("The state and the system have a different number of particles.")
+        self.neighbour_indices = np.array(state['neighbour_indices'], dtype=self.neighbour_indices.dtype)
+        for name in ('pos', 'vel', 'force', 'locked', 'pos0', 'mass', 'radius', 'colour', 'neighbour_offsets'):
+            getattr(self, name)[...] = state[name]
+
+    def get_neighbours(self, index):
+        """ Returns the neighbour indexes of a particle """
+        return self.neighbour_indices[self.neighbour_offsets[index]:self.neighbour_offsets[index + 1]]
+
+    @property
+    def x(self):
+        return self.pos[0]
+
+    @property
+    def y(self):
+        return self.pos[1]
+
+    @property
+    def z(self):
+        return self.pos[2]
+
+    def get_displacement(self):
+        """ Returns the displacement of every particle from its initial position """
+        d = self.pos - self.pos0
+        return np.sqrt(np.einsum('ij,ij->j', d, d))
+
+    def __len__(self):
+        return self.pos.shape[1]
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("Particle index out of range.")
+        return ParticleView(self, index % len(self))
+
+    def __iter__(self):
+        for i in range(0, len(self)):
+            yield ParticleView(self, i)
+
+
+def _axis_property(array_name, axis):
+    """ Creates a property that reads/writes one axis of a (3, count) array of a ParticleSystem """
+
+    def fget(self):
+        return getattr(self._system, array_name)[axis, self._index]
+
+    def fset(self, value):
+        getattr(self._system, array_name)[axis, self._index] = value
+
+    return property(fget, fset)
+
+
+def _scalar_property(array_name):
+    """ Creates a property that reads/writes a per particle array of a ParticleSystem """
+
+    def fget(self):
+        return getattr(self._system, array_name)[self._index]
+
+    def fset(self, value):
+        getattr(self._system, array_name)[self._index] = value
+
+    return property(fget, fset)
+
+
+class ParticleView:
+    """ Lightweight handle to a single particle stored in a ParticleSystem
+
+    It offers the same attributes as Particle, but reads and writes go to the arrays of the system. Every access
+    indexes an array, so loops over many particles use ParticleSystem.to_particles instead.
+    """
+    __slots__ = ('_system', '_index')
+
+    def __init__(self, system, index):
+        self._system = system
+        self._index = index
+
+    x, y, z = (_axis_property('pos', i) for i in range(3))
+    x0, y0, z0 = (_axis_property('pos0', i) for i in range(3))
+    vx, vy, vz = (_axis_property('vel', i) for i in range(3))
+    fx, fy, fz = (_axis_property('force', i) for i in range(3))
+    mass = _scalar_property('mass')
+    radius = _scalar_property('radius')
+    locked = _scalar_property('locked')
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def colour(self):
+        return tuple(self._system.colour[self._index])
+
+    @colour.setter
+    def colour(self, value):
+        self._system.colour[self._index] = to_rgba(value)
+
+    @property
+    def neighbours(self):
+        return [ParticleView(self._system, i) for i in self._system.get_neighbours(self._index)]
+
+    def get_displacement(self):
+        d = self._system.pos[:, self._index] - self._system.pos0[:, self._index]
+        return math.sqrt(d[0] * d[0] + d[1] * d[1] + d[2] * d[2])
+
+    def __eq__(self, other):
+        return isinstance(other, ParticleView) and other._system is self._system and other._index == self._index
+
+    def __hash__(self):
+        return hash((id(self._system), self._index))
+
+    def __str__(self):
+        return str(self.x) + ", " + str(self.y) + ", " + str(self.z)
+
+
+def to_rgba(colour):
+    """ Converts a colour given as an RGB/RGBA tuple or a matplotlib colour name to an RGBA tuple """
+    if isinstance(colour, str):
+        from matplotlib.colors import to_rgba as mpl_to_rgba  # only needed for named colours
+        return mpl_to_rgba(colour)
+    if len(colour) == 3:
+        return tuple(colour) + (1,)
+    return tuple(colour)
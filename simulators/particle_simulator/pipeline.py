@@ -0,0 +1,104 @@
+""" Producer/consumer execution: a worker process advances the simulation while the main process
+renders or encodes the frames it has already published
+
+Frames are published through a bounded ring buffer in shared memory. Two semaphores count the
+free and the filled slots, so the worker blocks when the renderer falls behind (backpressure)
+and the renderer blocks while the next frame is computed.
+
+The worker needs a core of its own. On a single core it shares the core with the renderer and the
+pipeline is slower than stepping and rendering in series. The gain on several cores has not been
+measured yet; benchmark_pipeline.py reports the bound of a perfect overlap.
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .parallel import get_fork_context
+
+POLL_INTERVAL = 0.1  # seconds between checks for shutdown while waiting for a slot
+
+
+class FramePipeline:
+    """ Iterable over the particle positions of a simulation that is advanced in a worker process
+
+    The worker steps a (forked) copy of the simulator, so the simulator of the main process is not
+    advanced. Every yielded frame is a view into the ring buffer, valid until the next frame is requested.
+
+    Example::
+
+        with FramePipeline(sim, sim.simconf.total_frames) as frames:
+            sim.run(frames)
+    """
+
+    def __init__(self, simulator, frames, record_every=1, slots=4):
+        """
+        :param simulator: the simulator to advance
+        :type simulator: Simulator
+        :param frames: the number of frames to publish
+        :type frames: int
+        :param record_every: the number of simulation steps between frames
+        :type record_every: int
+        :param slots: the capacity of the ring buffer in frames
+        :type slots: int
+        :raises RuntimeError: if the platform cannot fork processes
+        """
+        simulator.check_setup()
+        # fork, so that the simulator (and its configuration) does not need to be pickled
+        context = get_fork_context()
+        self.simulator = simulator
+        self.frames = frames
+        self.record_every = record_every
+        self.slots = slots
+
+        pos = simulator.particles.pos
+        self.memory = shared_memory.SharedMemory(create=True, size=slots * pos.nbytes)
+        self.ring = np.ndarray((slots,) + pos.shape, dtype=pos.dtype, buffer=self.memory.buf)
+
+        self.free = context.Semaphore(slots)
+        self.filled = context.Semaphore(0)
+        self.stop = context.Event()
+        self.process = context.Process(target=self.__produce, daemon=True)
+
+    def start(self):
+        """ Starts the worker process """
+        self.process.start()
+
+    def close(self):
+        """ Stops the worker process and releases the shared memory """
+        self.stop.set()
+        if self.process.is_alive():
+            self.process.join(timeout=10 * POLL_INTERVAL)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.ring = None
+        self.memory.close()
+        self.memory.unlink()
+
+    def __produce(self):
+        """ Worker process. Advances the simulation and publishes the positions of every frame """
+        for n in range(0, self.frames):
+            self.simulator.step(self.record_every)
+            while not self.free.acquire(timeout=POLL_INTERVAL):
+                if self.stop.is_set():
+                    return
+            self.ring[n % self.slots] = self.simulator.particles.pos
+            self.filled.release()
+
+    def __iter__(self):
+        for n in range(0, self.frames):
+            while not self.filled.acquire(timeout=POLL_INTERVAL):
+                if not self.process.is_alive():
+                    raise RuntimeError("The simulation worker stopped unexpectedly.")
+            yield self.ring[n % self.slots]
+            self.free.release()
+
+    def __len__(self):
+        return self.frames
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,129 @@
+""" Opt-in per-phase timings of a simulation
+
+The simulator and its helpers wrap their phases (physics, collision broad and narrow phases,
+attribute extraction, rendering...) in profiler.phase(name) blocks. The default profiler
+(NULL_PROFILER) does nothing, so the instrumentation costs one method call per phase and frame.
+A Profiler records the time of every phase of every frame and summarises them with percentiles.
+"""
+import csv
+import json
+from time import perf_counter
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class Profiler:
+    """ Records the time spent in every phase of every frame """
+
+    def __init__(self):
+        self.phases = []  # phase names in the order they were first recorded
+        self.frames = []  # seconds spent in every phase, one dictionary per frame
+        self.current = None
+
+    def start_frame(self):
+        """ Starts recording a new frame """
+        self.current = {}
+        self.frames.append(self.current)
+
+    def phase(self, name):
+        """ Returns a context manager that adds the time spent in its block to a phase of the current frame """
+        return _Phase(self, name)
+
+    def add(self, name, seconds):
+        """ Adds time to a phase of the current frame """
+        if self.current is None:
+            self.start_frame()
+        if name not in self.current:
+            self.current[name] = 0.0
+            if name not in self.phases:
+                self.phases.append(name)
+        self.current[name] += seconds
+
+    def get_times(self):
+        """ Returns the phase times as an array with shape (frames, phases), in the order of self.phases """
+        times = [[frame.get(name, 0.0) for name in self.phases] for frame in self.frames]
+        return np.array(times).reshape(-1, len(self.phases))
+
+    def summary(self):
+        """ Returns the mean, total and percentiles (p50, p95, p99) of every phase and of the whole frame, in seconds
+
+        :rtype: dict[str, dict[str, float]]
+        """
+        times = self.get_times()
+        columns = dict(zip(self.phases, times.T))
+        columns['frame'] = times.sum(axis=1)
+        summary = {}
+        for name, column in columns.items():
+            summary[name] = {'mean': float(column.mean()) if column.size else 0.0, 'total': float(column.sum())}
+            for p in PERCENTILES:
+                summary[name][f'p{p}'] = float(np.percentile(column, p)) if column.size else 0.0
+        return summary
+
+    def format_summary(self):
+        """ Returns the summary as a text table in milliseconds """
+        keys = ['mean'] + [f'p{p}' for p in PERCENTILES]
+        lines = [f"{'phase':>16} " + " ".join(f"{k + ' (ms)':>10}" for k in keys) + f" {'share':>6}"]
+        summary = self.summary()
+        frame_total = summary['frame']['total'] or 1.0
+        for name, stats in summary.items():
+            lines.append(f"{name:>16} " + " ".join(f"{1e3 * stats[k]:>10.3f}" for k in keys)
+                         + f" {stats['total'] / frame_total:>6.1%}")
+        return "\n".join(lines) + f"\n{len(self.frames)} frames"
+
+    def save(self, path):
+        """ Saves the per-frame phase times (in seconds) as .csv, or as .json together with the summary """
+        times = self.get_times()
+        if path.endswith('.json'):
+            with open(path, 'w') as file:
+                json.dump({'phases': self.phases, 'summary': self.summary(), 'frames': times.tolist()}, file)
+            return
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['frame'] + self.phases + ['total'])
+            for i, row in enumerate(times):
+                writer.writerow([i] + row.tolist() + [row.sum()])
+
+
+class NullProfiler:
+    """ Profiler that records nothing (the default of a Simulator) """
+    phases = ()
+    frames = ()
+
+    def start_frame(self):
+        pass
+
+    def phase(self, name):
+        return _NULL_PHASE
+
+    def add(self, name, seconds):
+        pass
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler.add(self.name, perf_counter() - self.start)
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+NULL_PROFILER = NullProfiler()
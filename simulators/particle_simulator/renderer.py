@@ -0,0 +1,268 @@
+from time import perf_counter
+
+from matplotlib import pyplot as plt, animation
+from matplotlib.patches import Rectangle
+from mpl_toolkits.mplot3d import art3d
+
+import numpy as np
+
+from .lod import LevelOfDetail
+
+
+class Renderer:
+    """ Displays (or exports as video) the particles of a simulator using matplotlib
+
+    The renderer either advances the simulator for every frame it draws, or plays back
+    positions recorded by Simulator.simulate (or published by a FramePipeline).
+
+    With simconf.blit the live view is drawn incrementally. The bounding box, the axes and the
+    particles that have not moved yet are drawn once into a cached background, and only the
+    particles that moved (more than simconf.blit_threshold pixels) are redrawn on top of it. The
+    background is redrawn when more particles start moving, so mostly static particles (e.g. the
+    part of nano_imprint) are not redrawn on every frame. Moving particles are always drawn over
+    the static ones.
+
+    With simconf.lod the particles are reduced by a LevelOfDetail stage before they are drawn (the
+    whole figure is then redrawn for every frame).
+    """
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.simconf = simulator.simconf
+        self.lod = None if self.simconf.lod == 'off' else LevelOfDetail(simulator, self.simconf.lod,
+                                                                          self.simconf.lod_pixels)
+        self.blit = self.simconf.blit and self.lod is None
+        self.fig = None
+        self.ax = None
+        self.graph = None  # all the particles, or only the moving ones when blitting
+        self.still = None  # the particles in the cached background when blitting
+        self.shown = None  # the particle positions pushed to the graphs, shape (3, count)
+        self.active = None  # the particles drawn by self.graph
+        self.background = None
+        self.timer = None
+        self.updated = None  # end time of the last FuncAnimation update, until the figure is drawn
+        self.frame_times = []
+
+    def run(self, frames=None):
+        """ Animates the simulation
+
+        :param frames: recorded positions with shape (frames, 3, count), or any sized iterable of
+            (3, count) positions. If None, the simulator is stepped once for every frame
+        :type frames: numpy.ndarray | FramePipeline
+        """
+        self.setup()
+
+        # Choose whether to display or export as video
+        if not self.simconf.export_to_video:
+            if self.blit:
+                self.__play(frames)
+            else:
+                anim = self.__animate(frames)
+            plt.show()
+        else:
+            anim = self.__animate(frames)
+            writervideo = animation.FFMpegWriter(fps=self.simconf.framerate)
+            anim.save(self.simconf.filename, writer=writervideo)
+            plt.close()
+        print(f"Rendered {len(self.frame_times)} frames at {self.get_fps():.1f} fps "
+              f"(target {self.simconf.framerate} fps)")
+
+    def setup(self):
+        """ Creates the figure, the bounding box and the particle graphs """
+        self.fig, self.ax = self.__generate_simulation_space()
+        self.__add_bounding_box(self.ax)
+
+        self.shown = np.array(self.simulator.get_positions())  # same precision as the simulation
+        self.active = np.full(self.shown.shape[1], not self.blit)  # when blitting, all start in the background
+        self.__add_graphs()
+        if self.blit:
+            self.fig.canvas.mpl_connect('draw_event', self.__on_draw)
+        self.fig.canvas.mpl_connect('draw_event', self.__on_animation_draw)
+
+        plt.axis('off') # This way only the bounding box (literally) shows
+        plt.gca().set_aspect("equal")   # Because markers are always symmetrical
+        self.frame_times = []
+
+    def update(self, positions):
+        """ Pushes new particle positions to the graphs
+
+        :param positions: the (3, count) particle coordinates
+        :type positions: numpy.ndarray
+        :return: whether the whole figure must be redrawn (otherwise only self.graph changed)
+        :rtype: bool
+        """
+        self.frame_times.append(perf_counter())
+        if self.lod is not None:
+            pos, radius, colour = self.lod.reduce(positions)
+            self.graph._offsets3d = tuple(pos)
+            self.graph.set_sizes(self.simulator.calc_size_3d(radius))
+            self.graph.set_color(colour)
+            return True
+        if not self.blit:
+            self.shown[:] = positions  # copy, the frame may be reused by its producer
+            return True
+
+        # Pixels per unit length (upper bound, the 3D axes are smaller than the figure)
+        scale = self.simconf.fig_size * self.simconf.dpi / self.simconf.bbox_size
+        moved = np.abs(positions - self.shown).max(axis=0) * scale > self.simconf.blit_threshold
+        self.shown[:, moved] = positions[:, moved]
+        if (moved & ~self.active).any():
+            # Particles of the background started moving
+            self.active |= moved
+            self.__add_graphs()
+            return True
+        if moved.any():
+            self.graph._offsets3d = tuple(self.shown[:, self.active])
+            self.graph.do_3d_projection()
+        return False
+
+    def draw_frame(self, positions):
+        """ Draws a frame, blitting only the moving particles over the cached background if possible """
+        profiler = self.simulator.profiler
+        with profiler.phase('attributes'):
+            redraw = self.update(positions) or self.background is None
+        with profiler.phase('render'):
+            if redraw:
+                self.fig.canvas.draw()
+                return
+            self.fig.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.graph)
+            self.fig.canvas.blit(self.fig.bbox)
+
+    def get_fps(self):
+        """ Returns the achieved frame rate of the frames drawn so far """
+        if len(self.frame_times) < 2:
+            return 0.0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+    def __animate(self, frames):
+        """ Redraws the whole figure for every frame """
+        # An integer frame count is also the number of saved frames, save_count is only given with an iterator
+        if frames is None:
+            source = {'frames': self.simconf.total_frames}
+        else:
+            source = {'frames': iter(frames), 'save_count': len(frames)}
+        return animation.FuncAnimation(
+            self.fig,
+            self.__update,
+            fargs=[frames is None],
+            interval=int(1000 / self.simconf.framerate),
+            cache_frame_data=False,
+            **source)
+
+    def __play(self, frames):
+        """ Draws the frames incrementally from a timer of the figure's canvas """
+        stepping = frames is None
+        frames = iter(range(0, self.simconf.total_frames) if stepping else frames)
+
+        def next_frame():
+            try:
+                frame = next(frames)
+            except StopIteration:
+                self.timer.stop()
+                return
+            if stepping:
+                self.simulator.step()
+                frame = self.simulator.get_positions()
+            else:
+                self.simulator.profiler.start_frame()
+            self.draw_frame(frame)
+
+        self.timer = self.fig.canvas.new_timer(interval=int(1000 / self.simconf.framerate))
+        self.timer.add_callback(next_frame)
+        self.timer.start()
+
+    def __on_draw(self, event):
+        """ Caches the background after a full redraw (also after resizing or rotating the view) """
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.ax.draw_artist(self.graph)
+        self.fig.canvas.blit(self.fig.bbox)
+
+    def __on_animation_draw(self, event):
+        """ Records the render time of a frame drawn by FuncAnimation """
+        if self.updated is not None:
+            self.simulator.profiler.add('render', perf_counter() - self.updated)
+            self.updated = None
+
+    def __add_graphs(self):
+        """ Creates the scatter graphs of the static (background) and the moving particles """
+        for graph in (self.still, self.graph):
+            if graph is not None:
+                graph.remove()
+        if self.lod is not None:
+            self.graph = self.__scatter(*self.lod.reduce(self.shown), animated=False)
+            return
+
+        colour = np.asarray(self.simulator.get_particles_attribute('colour'))
+        radius = np.asarray(self.simulator.get_particles_attribute('radius'))
+        still = ~self.active
+        self.still = self.__scatter(self.shown[:, still], radius[still], colour[still], False) if self.blit else None
+        self.graph = self.__scatter(self.shown[:, self.active], radius[self.active], colour[self.active], self.blit)
+        if not self.blit:
+            self.graph._offsets3d = tuple(self.shown)  # views, updated in place
+
+    def __scatter(self, pos, radius, colour, animated):
+        return self.ax.scatter(
+            xs=pos[0],
+            ys=pos[1],
+            zs=pos[2],
+            color=colour,
+            s=self.simulator.calc_size_3d(radius),
+            animated=animated)
+
+    def __generate_simulation_space(self):
+        """ Creates the figure and axes to display the simulation graphics"""
+        fig = plt.figure(
+            figsize=(self.simconf.fig_size, self.simconf.fig_size),
+            dpi=self.simconf.dpi,
+            layout='constrained'
+        )
+        ax = fig.add_subplot(111, projection="3d")
+
+        # Uncomment one of the lines below to change the view angle
+        # ax.view_init(elev=90, azim=-90, roll=0)       # top view
+        # ax.view_init(elev=-2, azim=-90, roll=0)       # side view
+        # ax.view_init(elev=-2, azim=0, roll=0)         # side view 2
+        ax.set_xlim(xmin=0, xmax=self.simconf.bbox_size)
+        ax.set_ylim(ymin=0, ymax=self.simconf.bbox_size)
+        ax.set_zlim(zmin=0, zmax=self.simconf.bbox_size)
+
+        return fig, ax
+
+    def __add_bounding_box(self, ax):
+        """ Creates the graphics for the box that represents the simulation space boundaries"""
+        bb = []
+        # Add six rectangles
+        for i in range(0, 6):
+            bb.append(self.__get_rectangle(0, 0))
+            ax.add_patch(bb[i])
+
+        # Move the rectangles to construct the box
+        art3d.pathpatch_2d_to_3d(bb[0], z=0, zdir="x")
+        art3d.pathpatch_2d_to_3d(bb[1], z=0, zdir="y")
+        art3d.pathpatch_2d_to_3d(bb[2], z=0, zdir="z")
+        art3d.pathpatch_2d_to_3d(bb[3], z=self.simconf.bbox_size, zdir="x")
+        art3d.pathpatch_2d_to_3d(bb[4], z=self.simconf.bbox_size, zdir="y")
+        art3d.pathpatch_2d_to_3d(bb[5], z=self.simconf.bbox_size, zdir="z")
+
+    def __get_rectangle(self, x, y):
+        return Rectangle(xy=(x, y), width=self.simconf.bbox_size, height=self.simconf.bbox_size, linewidth=1,
+                         color='gray',
+                         alpha=0.3)
+
+    def __update(self, frame, stepping):
+        """ Updates the simulation graphics
+
+        :param frame: the frame number if stepping, otherwise the (3, count) positions to draw
+        """
+        profiler = self.simulator.profiler
+        if stepping:
+            self.simulator.step()
+        else:
+            profiler.start_frame()
+        with profiler.phase('attributes'):
+            if stepping:
+                frame = self.simulator.get_positions()
+            self.update(frame)
+        self.updated = perf_counter()  # FuncAnimation draws the figure after the update
+        return self.graph
@@ -1,31 +1,165 @@
 # Simulation configuration
 import configparser
-import inspect
+import os
+import sys
 
+# Parameters and their default values. The .ini files group them in [simulator] and [video] sections
+DEFAULTS = {
+    'timestep': 1.0,
+    'bbox_size': 10,
+    'fig_size': 15,
+    'dpi': 40,
+    'particles_count': None,
+    'export_to_video': False,
+    'filename': 'simulation.mp4',
+    'export_renderer': 'matplotlib',  # 'matplotlib' or 'raster' (numpy rasterised frames piped to ffmpeg)
+    'framerate': 24,
+    'total_frames': 200,
+    'blit': False,  # live view: redraw only the particles over a cached background
+    'blit_threshold': 0.5,  # live view: particles that moved less than this many pixels are not re-pushed
+    'lod': 'off',  # level of detail: 'off', 'voxel' (voxel averaged representatives) or 'subsample'
+    'lod_pixels': 4,  # level of detail: edge of a voxel in pixels
+    'profile': None,  # if set, run saves per-phase timings of every frame to this .csv or .json file
+    'integrator': None,  # free_particles: 'euler', 'verlet' or 'adaptive' soft contacts, None for impulses
+    # Sub-steps per frame (timestep) of the euler and verlet integrators, None for the fewest stable ones. They are
+    # stable if timestep / substeps <= integrators.STABLE_STEP * sqrt(m / (2 * k)) with m the smallest particle
+    # mass and k the contact stiffness: up to 90 verlet or 2237 euler sub-steps with the defaults of free_particles
+    'substeps': None,
+    'tolerance': 1e-3,  # local position error per sub-step of the adaptive integrator
+    'precision': 'float64',  # 'float64' or 'float32' storage of the particle positions, velocities, radii...
+    'checkpoint': None,  # if set, run writes a checkpoint of the simulation to this file every checkpoint_every steps
+    'checkpoint_every': 100,
+    'analysis': None,  # if set, run samples statistics of the particles every analysis_every steps to this .npz file
+    'analysis_every': 10,
+}
 
-config = configparser.ConfigParser()
 
-# The name of config file is the name of the main script that is run with
-# .ini extension
-main_script_name = inspect.stack()[-1].filename.split("/")[-1].rsplit(".", 1)[0]
-config.read(f'{main_script_name}.ini')
+class SimConfig:
+    """ Simulation configuration
 
-timestep = float(config['simulator']['timestep'])
+    A configuration is created from an .ini file, from a dictionary of values or from defaults, and
+    any parameter can be overridden, e.g. SimConfig('nano_imprint.ini', timestep=0.5). A file is only
+    read when a parameter is first accessed, after that parameters are plain attributes.
+    """
 
-bbox_size = int(config['simulator']['bbox_size'])
+    def __init__(self, path=None, **overrides):
+        """
+        :param path: the .ini file to load. If None, the defaults are used
+        :type path: str
+        :param overrides: parameter values that replace the loaded ones
+        """
+        unknown = set(overrides) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown simulation parameters: {', '.join(sorted(unknown))}")
+        self.path = path
+        self._overrides = overrides
+        self._loaded = False
+        if path is None:
+            self.__load()
 
-fig_size = int(config['simulator']['fig_size'])
+    @classmethod
+    def from_dict(cls, values, **overrides):
+        """ Creates a configuration from a dictionary of parameter values (missing ones get their default) """
+        return cls(**{**values, **overrides})
 
-dpi = int(config['simulator']['dpi'])
+    def replace(self, **overrides):
+        """ Returns a copy of the configuration with some parameters replaced """
+        return SimConfig.from_dict(self.as_dict(), **overrides)
 
-particles_count = int(config['simulator']['particles_count']) \
-    if config.has_option('simulator', 'particles_count') else None
+    def as_dict(self):
+        """ Returns the parameters as a dictionary """
+        return {name: getattr(self, name) for name in DEFAULTS}
 
-export_to_video = True if config['video']['export_to_video'] == 'yes' else False
+    def __getattr__(self, name):
+        # Only called for attributes that are not set yet, i.e. parameters before the file is loaded
+        if name.startswith('_') or self.__dict__.get('_loaded', True):
+            raise AttributeError(f"'SimConfig' object has no attribute '{name}'")
+        self.__load()
+        return getattr(self, name)
 
-filename = config['video']['filename'] \
-    if config.has_option('video', 'filename') else main_script_name+".mp4"
+    def __load(self):
+        values = dict(DEFAULTS)
+        if self.path is not None:
+            values.update(read_file(self.path))
+        values.update(self._overrides)
+        self.__dict__.update(values)
+        self._loaded = True
 
-framerate = int(config['video']['framerate'])
+    def __repr__(self):
+        return f"SimConfig({self.path!r}, **{self._overrides!r})"
 
-total_frames = int(config['video']['total_frames'])
+
+def read_file(path):
+    """ Reads the parameters of an .ini file
+
+    :param path: the .ini file
+    :type path: str
+    :return: the parameters that the file defines
+    :rtype: dict
+    """
+    config = configparser.ConfigParser()
+    if not config.read(path):
+        raise FileNotFoundError(f"Simulation configuration {path} not found.")
+
+    name = os.path.basename(path).rsplit(".", 1)[0]
+    values = {
+        'timestep': float(config['simulator']['timestep']),
+        'bbox_size': int(config['simulator']['bbox_size']),
+        'fig_size': int(config['simulator']['fig_size']),
+        'dpi': int(config['simulator']['dpi']),
+        'export_to_video': config['video']['export_to_video'] == 'yes',
+        'filename': config['video'].get('filename', name + ".mp4"),
+        'framerate': int(config['video']['framerate']),
+        'total_frames': int(config['video']['total_frames']),
+    }
+    if config.has_option('simulator', 'particles_count'):
+        values['particles_count'] = int(config['simulator']['particles_count'])
+    if config.has_option('video', 'export_renderer'):
+        values['export_renderer'] = config['video']['export_renderer']
+    if config.has_option('video', 'blit'):
+        values['blit'] = config['video']['blit'] == 'yes'
+    if config.has_option('video', 'blit_threshold'):
+        values['blit_threshold'] = float(config['video']['blit_threshold'])
+    if config.has_option('video', 'lod'):
+        values['lod'] = config['video']['lod']
+    if config.has_option('video', 'lod_pixels'):
+        values['lod_pixels'] = float(config['video']['lod_pixels'])
+    if config.has_option('simulator', 'profile'):
+        values['profile'] = config['simulator']['profile'] or None
+    if config.has_option('simulator', 'integrator'):
+        values['integrator'] = config['simulator']['integrator'] or None
+    if config.has_option('simulator', 'substeps'):
+        values['substeps'] = int(config['simulator']['substeps'] or 0) or None
+    if config.has_option('simulator', 'tolerance'):
+        values['tolerance'] = float(config['simulator']['tolerance'])
+    if config.has_option('simulator', 'precision'):
+        values['precision'] = config['simulator']['precision']
+    if config.has_option('simulator', 'checkpoint'):
+        values['checkpoint'] = config['simulator']['checkpoint'] or None
+    if config.has_option('simulator', 'checkpoint_every'):
+        values['checkpoint_every'] = int(config['simulator']['checkpoint_every'])
+    if config.has_option('simulator', 'analysis'):
+        values['analysis'] = config['simulator']['analysis'] or None
+    if config.has_option('simulator', 'analysis_every'):
+        values['analysis_every'] = int(config['simulator']['analysis_every'])
+    return values
+
+
+_default = None
+
+
+def load_default():
+    """ Returns the configuration of the main script (the .ini file with the script's name in the
+    working directory). Kept for code that reads parameters from the module, e.g. simconf.timestep
+    """
+    global _default
+    if _default is None:
+        main_script_name = os.path.basename(sys.argv[0]).rsplit(".", 1)[0]
+        _default = SimConfig(f'{main_script_name}.ini')
+    return _default
+
+
+def __getattr__(name):
+    if name in DEFAULTS:
+        return getattr(load_default(), name)
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -1,51 +1,221 @@
-from matplotlib import pyplot as plt, animation
+import numpy as np
 
 from abc import ABC, abstractmethod
-from matplotlib.patches import Rectangle
-from mpl_toolkits.mplot3d import art3d
+
+from .analysis import Analysis, DisplacementStatistics
+from .checkpoint import CheckpointWriter, write_checkpoint
+from .particle import ParticleSystem
+from .profiling import NULL_PROFILER, Profiler
+from .trajectory import TrajectoryReader, TrajectoryWriter
+from .video import export_video
 
 
 class Simulator(ABC):
-    """ Core class handling common simulation functionalities"""
+    """ Core class handling common simulation functionalities
+
+    The physics is advanced with step/simulate, which do not need matplotlib. Rendering
+    (run) is an optional consumer that either steps the simulation or plays back recorded frames.
+    """
     simconf = None
     particles = []
-    fig = None
-    ax = None
+    frame = 0   # number of steps taken so far
+    profiler = NULL_PROFILER    # records per-phase timings once profiling is enabled
+    arguments = {}  # the constructor arguments (besides simconf), used to create the simulator again on resume
+    checkpoints = None  # writes checkpoints in the background once enabled
+    analysis = None  # samples statistics of the particles every few steps once enabled
 
-    def run(self):
-        """ Runs the simulator """
+    def run(self, frames=None):
+        """ Runs the simulator and displays it (or exports it as video)
+
+        :param frames: positions recorded by simulate (or published by a FramePipeline). If given,
+            these frames are rendered instead of stepping the simulation
+        :type frames: numpy.ndarray | FramePipeline
+        """
 
         self.check_setup()
+        if self.simconf.profile:
+            self.enable_profiling()
+        if self.simconf.checkpoint:
+            self.enable_checkpoints(self.simconf.checkpoint, self.simconf.checkpoint_every)
+        if self.simconf.analysis:
+            self.enable_analysis(every=self.simconf.analysis_every)
+
+        try:
+            if self.simconf.export_to_video and self.simconf.export_renderer == 'raster':
+                export_video(self, frames)
+            else:
+                from .renderer import Renderer  # matplotlib is only imported when rendering
+                Renderer(self).run(frames)
+        finally:
+            self.close()  # stops the worker processes and waits for the last checkpoint
+
+        if self.simconf.profile:
+            self.profiler.save(self.simconf.profile)
+            print(self.profiler.format_summary())
+        if self.simconf.analysis:
+            self.analysis.series.save(self.simconf.analysis)
+
+    def enable_profiling(self):
+        """ Starts recording the time of every phase (physics, collisions, rendering...) of every frame
+
+        :return: the profiler that records the timings
+        :rtype: Profiler
+        """
+        self.profiler = Profiler()
+        return self.profiler
+
+    def enable_checkpoints(self, path, every=100):
+        """ Writes a checkpoint of the simulation every given number of steps, in a background thread.
+        The run can be continued from the last checkpoint with checkpoint.resume(path)
 
-        fig, ax = self.__generate_simulation_space()
-        self.__add_bounding_box(ax)
-
-        # Generate the initial graph
-        graph = ax.scatter(
-            xs=self.__get_particles_attribute('x'),
-            ys=self.__get_particles_attribute('y'),
-            zs=self.__get_particles_attribute('z'),
-            color=self.__get_particles_attribute('colour'),
-            s=[self.calc_size_3d(r) for r in self.__get_particles_attribute('radius')])
-
-        plt.axis('off') # This way only the bounding box (literally) shows
-        plt.gca().set_aspect("equal")   # Because markers are always symmetrical
-
-        # Animate the particles
-        anim = animation.FuncAnimation(
-            fig,
-            self.__update,
-            fargs=[graph],
-            interval=int(1000 / self.simconf.framerate),
-            frames=self.simconf.total_frames)
-
-        # Choose whether to display or export as video
-        if not self.simconf.export_to_video:
-            plt.show()
-        else:
-            writervideo = animation.FFMpegWriter(fps=60)
-            anim.save(self.simconf.filename, writer=writervideo)
-            plt.close()
+        :param path: the checkpoint file, replaced by every new checkpoint
+        :type path: str
+        :param every: the number of steps between checkpoints
+        :type every: int
+        :return: the writer of the checkpoints (call its close method to wait for the last one)
+        :rtype: CheckpointWriter
+        """
+        if self.checkpoints is not None:
+            self.checkpoints.close()
+        self.checkpoints = CheckpointWriter(path, every)
+        return self.checkpoints
+
+    def enable_analysis(self, analysis=None, every=10, capacity=1024):
+        """ Samples statistics of the particles every given number of steps, into a time series of bounded size
+
+        :param analysis: the analysis to run, defaults to the one of get_analysis
+        :type analysis: Analysis
+        :param every: the number of steps between samples of the default analysis
+        :type every: int
+        :param capacity: the largest number of samples kept by the default analysis
+        :type capacity: int
+        :return: the analysis, its results are in analysis.series
+        :rtype: Analysis
+        """
+        self.analysis = analysis or self.get_analysis(every, capacity)
+        return self.analysis
+
+    def get_analysis(self, every=10, capacity=1024):
+        """ Returns the default streaming analysis of the simulator: statistics of the displacement of every
+        particle. Simulators extend it with their own analysers """
+        radius = float(np.mean(self.particles.radius))
+        statistics = DisplacementStatistics(np.linspace(0, self.simconf.bbox_size, 21), 0.1 * radius)
+        return Analysis([statistics], every=every, capacity=capacity)
+
+    def save_checkpoint(self, path):
+        """ Writes a checkpoint of the current state of the simulation (in the calling thread)
+
+        :param path: the checkpoint file
+        :type path: str
+        :return: the size of the checkpoint in bytes
+        :rtype: int
+        """
+        return write_checkpoint(path, self)
+
+    def get_state(self):
+        """ Returns the state that the simulation is continued from: a dictionary of numpy arrays, JSON
+        serialisable values and nested dictionaries. The arrays are not modified by later steps (the arrays
+        that the simulation updates are copied), so the state can be written while the simulation continues.
+        Simulators with more state than the particles and the frame count extend it
+        """
+        return {'frame': self.frame, 'particles': self.particles.get_state()}
+
+    def set_state(self, state):
+        """ Loads a state returned by get_state, into a simulator created with the same arguments """
+        self.frame = state['frame']
+        self.particles.set_state(state['particles'])
+
+    def load_particles(self):
+        """ Updates the state that the simulator keeps outside of the particles after the particles were loaded
+        (e.g. restored from a trajectory). Simulators that keep such state override it """
+
+    def close(self):
+        """ Waits for the last checkpoint (if any) """
+        if self.checkpoints is not None:
+            self.checkpoints.close()
+            self.checkpoints = None
+
+    def step(self, n=1):
+        """ Advances the simulation by n steps at full speed, without rendering
+
+        :param n: the number of steps
+        :type n: int
+        """
+        for _ in range(0, n):
+            self.profiler.start_frame()
+            self.update_particles()
+            self.frame += 1
+            if self.analysis is not None:
+                self.analysis.update(self)
+            if self.checkpoints is not None:
+                self.checkpoints.update(self)
+
+    def simulate(self, steps, record_every=1, trajectory=None):
+        """ Advances the simulation by a number of steps and records the particle positions
+
+        :param steps: the number of steps
+        :type steps: int
+        :param record_every: the positions are recorded after every record_every steps
+        :type record_every: int
+        :param trajectory: if given, the frames are streamed to this writer instead of being kept in memory
+        :type trajectory: TrajectoryWriter
+        :return: the recorded positions with shape (steps // record_every, 3, particles count),
+            or None if the frames are streamed to a trajectory
+        :rtype: numpy.ndarray
+        """
+        self.check_setup()
+
+        frames = None
+        if trajectory is None:
+            frames = np.empty((steps // record_every, 3, len(self.particles)), dtype=self.get_positions().dtype)
+        for i in range(0, steps // record_every):
+            self.step(record_every)
+            with self.profiler.phase('record'):
+                if trajectory is not None:
+                    trajectory.write(self.particles)
+                else:
+                    frames[i] = self.get_positions()
+        self.step(steps % record_every)
+        return frames
+
+    def record(self, path, steps, record_every=1, velocities=True, locked=True):
+        """ Advances the simulation and records the frames in a memory-mapped trajectory file
+
+        :param path: the trajectory file
+        :type path: str
+        :param steps: the number of steps
+        :type steps: int
+        :param record_every: a frame is recorded after every record_every steps
+        :type record_every: int
+        :param velocities: whether velocities are recorded (needed to resume moving particles)
+        :type velocities: bool
+        :param locked: whether the locked flags are recorded
+        :type locked: bool
+        :return: a reader of the recorded trajectory
+        :rtype: TrajectoryReader
+        """
+        with TrajectoryWriter(path, self.particles, steps // record_every, self.simconf, velocities, locked,
+                              record_every, start_frame=self.frame) as trajectory:
+            self.simulate(steps, record_every, trajectory)
+        return TrajectoryReader(path)
+
+    def get_positions(self):
+        """ Returns the particle coordinates as an array with shape (3, particles count) """
+        if isinstance(self.particles, ParticleSystem):
+            return self.particles.pos
+        return np.array([self.get_particles_attribute(axis) for axis in ('x', 'y', 'z')])
+
+    def get_focus(self, pos):
+        """ Returns the particles that are always rendered at full detail when the level of detail is
+        reduced (simconf.lod), or None if there are none. The particles outside the focus are then
+        treated as static
+
+        :param pos: the particle coordinates being rendered, shape (3, particles count)
+        :type pos: numpy.ndarray
+        :return: boolean mask of the particles of interest
+        :rtype: numpy.ndarray
+        """
+        return None
 
     def check_setup(self):
         """ Checks if simulator parameters are initialised correctly """
@@ -55,68 +225,21 @@ class Simulator(ABC):
         if self.simconf is None:
             raise ImportError("Simulation configuration has not been loaded.")
 
-    def __generate_simulation_space(self):
-        """ Creates the figure and axes to display the simulation graphics"""
-        fig = plt.figure(
-            figsize=(self.simconf.fig_size, self.simconf.fig_size),
-            dpi=self.simconf.dpi,
-            layout='constrained'
-        )
-        ax = fig.add_subplot(111, projection="3d")
-
-        # Uncomment one of the lines below to change the view angle
-        # ax.view_init(elev=90, azim=-90, roll=0)       # top view
-        # ax.view_init(elev=-2, azim=-90, roll=0)       # side view
-        # ax.view_init(elev=-2, azim=0, roll=0)         # side view 2
-        ax.set_xlim(xmin=0, xmax=self.simconf.bbox_size)
-        ax.set_ylim(ymin=0, ymax=self.simconf.bbox_size)
-        ax.set_zlim(zmin=0, zmax=self.simconf.bbox_size)
-
-        return fig, ax
-
-    def __add_bounding_box(self, ax):
-        """ Creates the graphics for the box that represents the simulation space boundaries"""
-        bb = []
-        # Add six rectangles
-        for i in range(0, 6):
-            bb.append(self.__get_rectangle(0, 0))
-            ax.add_patch(bb[i])
-
-        # Move the rectangles to construct the box
-        art3d.pathpatch_2d_to_3d(bb[0], z=0, zdir="x")
-        art3d.pathpatch_2d_to_3d(bb[1], z=0, zdir="y")
-        art3d.pathpatch_2d_to_3d(bb[2], z=0, zdir="z")
-        art3d.pathpatch_2d_to_3d(bb[3], z=self.simconf.bbox_size, zdir="x")
-        art3d.pathpatch_2d_to_3d(bb[4], z=self.simconf.bbox_size, zdir="y")
-        art3d.pathpatch_2d_to_3d(bb[5], z=self.simconf.bbox_size, zdir="z")
-
-    def __get_rectangle(self, x, y):
-        return Rectangle(xy=(x, y), width=self.simconf.bbox_size, height=self.simconf.bbox_size, linewidth=1,
-                         color='gray',
-                         alpha=0.3)
-
-    def __get_particles_attribute(self, attribute):
+    def get_particles_attribute(self, attribute):
         """ Creates an array containing the specified attribute values from the list of particles
 
         For example if attribute='x' and particles=[p1, p2] the function will return
-        the list [p1.x, p2.x]
+        the list [p1.x, p2.x]. If the particles are kept in a ParticleSystem, the
+        system's array is returned directly (no copy).
         :param attribute: the particle attribute to extract
         :type attribute: str
         :return: the list containing the specified attribute values
-        :rtype: list
+        :rtype: list | numpy.ndarray
         """
+        if isinstance(self.particles, ParticleSystem):
+            return getattr(self.particles, attribute)
         return [getattr(p, attribute) for p in self.particles]
 
-    def __update(self, n: int, graph):
-        """ Updates the simulation graphics """
-        self.update_particles()
-        graph._offsets3d = (
-            self.__get_particles_attribute('x'),
-            self.__get_particles_attribute('y'),
-            self.__get_particles_attribute('z')
-        )
-        return graph
-
     def calc_size_3d(self, marker_radius):
         """Calculates the matplotlib size (marker, linewidth etc.) so that it matches the axes scale
         Important! If dpi increases and the graph exceeds the physical display limits then the marker
@@ -0,0 +1,58 @@
+""" Parameter sweeps: runs a simulation for every point of a parameter grid in a process pool and
+collects the metrics of every run in one columnar results file """
+import itertools
+import multiprocessing
+
+import numpy as np
+
+
+def get_grid_points(grid):
+    """ Returns every combination of the parameter values of a grid
+
+    For example {'a': [1, 2], 'b': [3]} gives [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]
+    :param grid: the values of each parameter
+    :type grid: dict[str, list]
+    :return: the parameters of each run
+    :rtype: list[dict]
+    """
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def run_sweep(run, grid, workers, path=None):
+    """ Runs every point of the grid in a pool of worker processes and collects the results in columns
+
+    The workers are forked from the current process where the platform can fork, so modules that are already
+    imported (and modules that are never imported, such as matplotlib for headless runs) are not imported again.
+    Elsewhere they are started with the default method of the platform, which imports the module of run again.
+    :param run: module level function that takes the parameters of a run and returns a dictionary of
+        metrics (numbers or fixed size arrays)
+    :type run: callable
+    :param grid: the values of each parameter
+    :type grid: dict[str, list]
+    :param workers: the maximum number of worker processes
+    :type workers: int
+    :param path: if given, the columns are saved to this .npz file
+    :type path: str
+    :return: one array per parameter and per metric, with one row per run
+    :rtype: dict[str, numpy.ndarray]
+    """
+    points = get_grid_points(grid)
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    with context.Pool(processes=max(1, min(workers, len(points)))) as pool:
+        results = pool.map(run, points, chunksize=1)
+
+    columns = to_columns([{**p, **r} for p, r in zip(points, results)])
+    if path is not None:
+        np.savez(path, **columns)
+    return columns
+
+
+def to_columns(rows):
+    """ Converts a list of dictionaries with the same keys to a dictionary of arrays """
+    return {key: np.array([row[key] for row in rows]) for key in rows[0]}
+
+
+def load_results(path):
+    """ Loads the columns saved by run_sweep """
+    with np.load(path) as data:
+        return dict(data)
@@ -0,0 +1,237 @@
+""" Tools made of many particles, and their contacts with a lattice part
+
+A Tool is a rigid set of particles given by their offsets from a reference point (the particle at
+offset 0, e.g. the tip of a pyramid). Only the surface of a shape is made of particles, since the
+inside of a tool can never touch the part.
+
+Contacts are found in lattice index space. A lattice particle with index k starts at 1 + 2 * radius * k
+on every axis, so for a tool whose reference is in the cell with index c, the lattice particles a tool
+particle can touch are at fixed index offsets from c, whatever the position of the reference inside its
+cell. A Stencil lists these (index offset, tool particle) pairs once per tool and part. A contact query
+is then a lookup of the stencil around the reference cell followed by a vectorized narrow phase, and it
+costs in proportion to the surface of the tool and not to the volume of its bounding box.
+"""
+import numpy as np
+
+NARROW_PHASE_ITERATIONS = 4  # pushes of a lattice particle out of the tool particles it overlaps
+
+
+class Tool:
+    """ A rigid tool made of particles """
+
+    def __init__(self, offsets, radius):
+        """
+        :param offsets: the positions of the tool particles relative to the reference, shape (3, count). The
+            first particle is the reference and must be at offset 0
+        :type offsets: numpy.ndarray
+        :param radius: the radii of the tool particles (scalar or shape (count,))
+        :type radius: float or numpy.ndarray
+        """
+        self.offsets = np.asarray(offsets, dtype=float).reshape(3, -1)
+        if self.offsets.shape[1] == 0 or np.any(self.offsets[:, 0] != 0):
+            raise ValueError("The first particle of a tool must be at offset (0, 0, 0).")
+        self.radius = np.broadcast_to(np.asarray(radius, dtype=float), self.offsets.shape[1:]).copy()
+
+    def __len__(self):
+        return self.offsets.shape[1]
+
+    @classmethod
+    def sphere(cls, radius):
+        """ A single spherical particle (the default tool of nano_imprint) """
+        return cls(np.zeros((3, 1)), radius)
+
+    @classmethod
+    def pyramid(cls, width, height, particle_radius):
+        """ A square pyramid with its apex at the reference, pointing down (-z)
+
+        :param width: the edge of the square base
+        :type width: float
+        :param height: the height of the apex under the base
+        :type height: float
+        """
+        spacing = 2 * particle_radius
+        rings = [_square(width / 2 * z / height, spacing, z) for z in np.arange(0, height, spacing)]
+        cap = _grid(width / 2, spacing, height, lambda x, y: np.maximum(abs(x), abs(y)) <= width / 2)
+        return cls(_unique([np.zeros((3, 1))] + rings + [cap]), particle_radius)
+
+    @classmethod
+    def cylinder(cls, radius, height, particle_radius):
+        """ A vertical cylinder with the centre of its flat bottom at the reference """
+        spacing = 2 * particle_radius
+        count = max(int(np.ceil(2 * np.pi * radius / spacing)), 1)
+        angle = 2 * np.pi * np.arange(0, count) / count
+        rings = [np.array([radius * np.cos(angle), radius * np.sin(angle), np.full(count, z)])
+                 for z in np.arange(0, height + spacing / 2, spacing)]
+        disc = [_grid(radius, spacing, z, lambda x, y: x * x + y * y <= radius * radius) for z in (0, height)]
+        return cls(_unique([np.zeros((3, 1))] + disc[:1] + rings + disc[1:]), particle_radius)
+
+    @classmethod
+    def stamp(cls, heights, pitch, particle_radius):
+        """ A flat stamp with a relief on its bottom face, centred on the reference
+
+        :param heights: the height of the bottom face above its lowest point on a grid, shape (nx, ny)
+        :type heights: numpy.ndarray
+        :param pitch: the distance between the grid points
+        :type pitch: float
+        """
+        heights = np.asarray(heights, dtype=float)
+        spacing = 2 * particle_radius
+        x, y = np.meshgrid(*((np.arange(0, n) - (n - 1) / 2) * pitch for n in heights.shape), indexing='ij')
+        # Walls between grid points of different heights are filled, so that the face has no holes
+        padded = np.pad(heights, 1, mode='edge')
+        top = np.max([padded[1:-1, :-2], padded[1:-1, 2:], padded[:-2, 1:-1], padded[2:, 1:-1], heights], axis=0)
+        layers = np.ceil((top - heights) / spacing).astype(int) + 1
+        column = np.repeat(np.arange(0, heights.size), layers.ravel())
+        level = np.arange(0, column.size) - np.repeat(np.cumsum(layers.ravel()) - layers.ravel(), layers.ravel())
+        z = np.minimum(heights.ravel()[column] + level * spacing, top.ravel()[column])
+        lowest = np.unravel_index(np.argmin(heights), heights.shape)
+        points = np.array([x.ravel()[column], y.ravel()[column], z]) - np.array(
+            [[x[lowest]], [y[lowest]], [heights[lowest]]])
+        return cls(_unique([np.zeros((3, 1)), points]), particle_radius)
+
+    def get_stencil(self, part_radius, margin=0.0):
+        """ Precomputes the contacts of the tool with a lattice of particles of the given radius
+
+        :param part_radius: the radius of the lattice particles (their spacing is twice the radius)
+        :type part_radius: float
+        :param margin: how far (in plot units) lattice particles may have moved from their initial position
+        :type margin: float
+        :rtype: Stencil
+        """
+        return Stencil(self, part_radius, margin)
+
+
+class Stencil:
+    """ The (lattice index offset, tool particle) pairs that can be in contact, relative to the cell of the
+    tool reference """
+
+    def __init__(self, tool, part_radius, margin=0.0):
+        spacing = 2 * part_radius
+        position = tool.offsets / spacing  # tool particles relative to the reference, in lattice cells
+        reach = (tool.radius + part_radius + margin) / spacing
+        size = int(np.ceil(reach.max())) + 1
+        grid = np.indices((2 * size + 2,) * 3).reshape(3, -1) - size
+
+        # A lattice cell d is reached by a tool particle at p + f (f in [0, 1) on every axis, the position of
+        # the reference inside its cell) if the distance from d to the box [p, p + 1] is less than the reach
+        corner = np.floor(position)
+        offsets = corner[:, :, None] + grid[:, None, :]
+        outside = np.maximum(np.maximum(position[:, :, None] - offsets, offsets - position[:, :, None] - 1), 0)
+        tool_index, cell = np.nonzero(np.einsum('kij,kij->ij', outside, outside) < (reach * reach)[:, None])
+
+        self.offsets = offsets[:, tool_index, cell].astype(np.intp)
+        self.tool = tool_index  # the tool particle of every pair (index into the tool)
+        self.cells = np.unique(self.offsets, axis=1)  # the lattice cells the tool can touch
+        self.spacing = spacing
+
+    def __len__(self):
+        return self.offsets.shape[1]
+
+    def query(self, reference, shape):
+        """ Returns the pairs of a tool whose reference is at the given position
+
+        :param reference: coordinates of the tool reference
+        :type reference: numpy.ndarray
+        :param shape: number of lattice particles on each axis
+        :type shape: tuple[int, int, int]
+        :return: the flattened lattice indexes of the reachable cells, and of the (cell, tool particle) pairs
+        :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        cell = np.floor((np.asarray(reference) - 1) / self.spacing).astype(np.intp)[:, None]
+        shape = np.array(shape)[:, None]
+        cells = self.cells + cell
+        cells = np.ravel_multi_index(cells[:, ((cells >= 0) & (cells < shape)).all(axis=0)], shape[:, 0])
+        pairs = self.offsets + cell
+        inside = ((pairs >= 0) & (pairs < shape)).all(axis=0)
+        return cells, np.ravel_multi_index(pairs[:, inside], shape[:, 0]), self.tool[inside]
+
+
+class ToolContacts:
+    """ Pushes the lattice particles out of the tool particles they overlap and locks the cells the tool can
+    reach (multi-particle version of update_tool_collisions_batch of nano_imprint)
+
+    The pairs of a frame are the stencil pairs around the tool reference. A particle that the tool carries
+    along (e.g. in front of a stamp that moves sideways) can move further from its initial position than
+    the stencil margin, so the particles pushed in the previous frame are tested against every tool particle
+    instead. A lattice particle that overlaps several tool particles is pushed by the sum of the overlaps,
+    which also pushes it out of creases, and the overlaps are checked again up to NARROW_PHASE_ITERATIONS times.
+    An update resolves the contacts of one tool position. A tool that moves by about a particle radius or more
+    between updates can leave particles inside the pockets of its relief, so the caller moves it in smaller steps
+    (see nano_imprint.FreeParticlesSimulator.update_tool_contacts).
+    """
+
+    def __init__(self, tool, stencil, shape, tool_index, offset=1):
+        """
+        :param tool: the tool
+        :type tool: Tool
+        :param stencil: the stencil of the tool and the lattice
+        :type stencil: Stencil
+        :param shape: number of lattice particles on each axis
+        :type shape: tuple[int, int, int]
+        :param tool_index: the indexes of the tool particles in the system, the reference first
+        :type tool_index: numpy.ndarray
+        :param offset: the index of the first lattice particle in the system
+        :type offset: int
+        """
+        self.tool = tool
+        self.stencil = stencil
+        self.shape = tuple(shape)
+        self.tool_index = tool_index
+        self.offset = offset
+        self.carried = np.zeros(0, dtype=np.intp)  # the particles pushed in the previous frame
+
+    def update(self, ps):
+        """ Resolves the contacts of the current tool position
+
+        :param ps: the particles
+        :type ps: ParticleSystem
+        :return: the indexes of the locked particles
+        :rtype: numpy.ndarray
+        """
+        cells, part, tool = self.stencil.query(ps.pos[:, self.tool_index[0]], self.shape)
+        cells, part, tool = cells + self.offset, part + self.offset, self.tool_index[tool]
+        if self.carried.size:
+            own = ~np.isin(part, self.carried)
+            part = np.concatenate((part[own], np.repeat(self.carried, len(self.tool_index))))
+            tool = np.concatenate((tool[own], np.tile(self.tool_index, self.carried.size)))
+            cells = np.union1d(cells, self.carried)
+
+        pushed = []
+        for _ in range(0, NARROW_PHASE_ITERATIONS):
+            d = ps.pos[:, part] - ps.pos[:, tool]
+            dist = np.sqrt(np.einsum('ij,ij->j', d, d))
+            overlap = ps.radius[part] + ps.radius[tool] - dist
+            hit = (overlap > 0) & (dist > 0)
+            if not hit.any():
+                break
+            moved, index = np.unique(part[hit], return_inverse=True)
+            push = overlap[hit] / dist[hit] * d[:, hit]
+            ps.pos[:, moved] += np.array([np.bincount(index, p, minlength=moved.size) for p in push])
+            pushed.append(moved)
+        self.carried = np.unique(np.concatenate(pushed)) if pushed else np.zeros(0, dtype=np.intp)
+        ps.locked[cells] = True  # prevent push backs
+        return cells
+
+
+def _square(half_width, spacing, z):
+    """ Points on the outline of a square centred on the z axis """
+    count = max(int(np.ceil(2 * half_width / spacing)), 1)
+    side = np.linspace(-half_width, half_width, count + 1)[:-1]
+    x = np.concatenate((side, np.full(count, half_width), -side, np.full(count, -half_width)))
+    y = np.concatenate((np.full(count, -half_width), side, np.full(count, half_width), -side))
+    return np.array([x, y, np.full(x.size, z)])
+
+
+def _grid(half_width, spacing, z, inside):
+    """ Points of a square grid at height z that are inside a shape """
+    axis = np.arange(-half_width, half_width + spacing / 2, spacing)
+    x, y = np.meshgrid(axis, axis, indexing='ij')
+    keep = inside(x, y)
+    return np.array([x[keep], y[keep], np.full(keep.sum(), z)])
+
+
+def _unique(points):
+    """ Concatenates point sets and removes duplicates, keeping the first point (the reference) first """
+    points = np.concatenate(points, axis=1)
+    _, first = np.unique(np.round(points, 9), axis=1, return_index=True)
+    return points[:, np.sort(first)]
@@ -0,0 +1,204 @@
+""" Recording and replay of simulation trajectories in a memory-mapped binary file
+
+File layout:
+    - a fixed size header: magic bytes followed by a JSON document (padded with spaces)
+      holding the simulation configuration, particle count, frame count and recorded fields
+    - the static particle properties (initial positions, mass, radius, colour)
+    - one block per recorded field, holding every frame contiguously (frames, ...)
+The file is preallocated when the writer is created, so recording a frame is a copy into
+the memory map. The reader maps the same blocks read-only, so slicing frames does not copy.
+"""
+import json
+
+import numpy as np
+
+MAGIC = b'PSTRAJ01'
+HEADER_SIZE = 4096
+ALIGNMENT = 64
+
+
+def _get_layout(header):
+    """ Returns the (name, dtype, shape, offset) of every data block described by the header """
+    count, frames, dtype = header['count'], header['frames'], header['dtype']
+    blocks = [
+        ('pos0', dtype, (3, count)),
+        ('mass', dtype, (count,)),
+        ('radius', dtype, (count,)),
+        ('colour', 'float64', (count, 4)),
+        ('positions', dtype, (frames, 3, count)),
+    ]
+    if header['velocities']:
+        blocks.append(('velocities', dtype, (frames, 3, count)))
+    if header['locked']:
+        blocks.append(('locked', 'bool', (frames, count)))
+
+    layout = []
+    offset = HEADER_SIZE
+    for name, block_dtype, shape in blocks:
+        layout.append((name, block_dtype, shape, offset))
+        size = int(np.prod(shape)) * np.dtype(block_dtype).itemsize
+        offset += -(-size // ALIGNMENT) * ALIGNMENT
+    return layout
+
+
+def _write_header(file, header):
+    data = json.dumps(header).encode()
+    if len(MAGIC) + len(data) > HEADER_SIZE:
+        raise ValueError("Trajectory header is too large.")
+    file.seek(0)
+    file.write(MAGIC + data.ljust(HEADER_SIZE - len(MAGIC)))
+
+
+def read_header(path):
+    """ Reads the header of a trajectory file
+
+    :param path: the trajectory file
+    :type path: str
+    :return: the header
+    :rtype: dict
+    """
+    with open(path, 'rb') as file:
+        data = file.read(HEADER_SIZE)
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a trajectory file.")
+    return json.loads(data[len(MAGIC):])
+
+
+def get_simconf_parameters(simconf):
+    """ Returns the simulation configuration parameters as a dictionary """
+    return {} if simconf is None else simconf.as_dict()
+
+
+class TrajectoryWriter:
+    """ Streams particle positions (and optionally velocities and locked flags) to a preallocated,
+    memory-mapped trajectory file """
+
+    def __init__(self, path, ps, frames, simconf=None, velocities=False, locked=False,
+                 record_every=1, start_frame=0):
+        """
+        :param path: the trajectory file (overwritten)
+        :type path: str
+        :param ps: the particles to record
+        :type ps: ParticleSystem
+        :param frames: the maximum number of frames
+        :type frames: int
+        :param simconf: the simulation configuration stored in the header
+        :param velocities: whether velocities are recorded
+        :type velocities: bool
+        :param locked: whether the locked flags are recorded
+        :type locked: bool
+        :param record_every: number of simulation steps between recorded frames (stored in the header)
+        :type record_every: int
+        :param start_frame: simulation step of the state before the first recorded frame (stored in the header)
+        :type start_frame: int
+        """
+        self.path = path
+        self.header = {
+            'count': len(ps),
+            'frames': frames,
+            'frames_written': 0,
+            'dtype': ps.pos.dtype.name,
+            'velocities': velocities,
+            'locked': locked,
+            'record_every': record_every,
+            'start_frame': start_frame,
+            'simconf': get_simconf_parameters(simconf),
+        }
+        layout = _get_layout(self.header)
+        name, dtype, shape, offset = layout[-1]
+
+        # The file is filled with zeros instead of being truncated to size. A sparse file would
+        # allocate its pages on the first write of every frame, which costs more than the copy itself.
+        with open(path, 'wb') as file:
+            _write_header(file, self.header)
+            remaining = offset + int(np.prod(shape)) * np.dtype(dtype).itemsize - HEADER_SIZE
+            zeros = bytes(min(remaining, 1 << 20))
+            while remaining > 0:
+                remaining -= file.write(zeros[:remaining])
+
+        self.blocks = {name: np.memmap(path, dtype=dtype, mode='r+', shape=shape, offset=offset)
+                       for name, dtype, shape, offset in layout}
+        self.blocks['pos0'][:] = ps.pos0
+        self.blocks['mass'][:] = ps.mass
+        self.blocks['radius'][:] = ps.radius
+        self.blocks['colour'][:] = ps.colour
+
+    def write(self, ps):
+        """ Records the current state of the particles as the next frame
+
+        :param ps: the particles
+        :type ps: ParticleSystem
+        """
+        frame = self.header['frames_written']
+        if frame >= self.header['frames']:
+            raise IndexError("The trajectory file is full.")
+        self.blocks['positions'][frame] = ps.pos
+        if self.header['velocities']:
+            self.blocks['velocities'][frame] = ps.vel
+        if self.header['locked']:
+            self.blocks['locked'][frame] = ps.locked
+        self.header['frames_written'] = frame + 1
+
+    def close(self):
+        """ Flushes the data and stores the number of written frames in the header """
+        for block in self.blocks.values():
+            block.flush()
+        self.blocks = {}
+        with open(self.path, 'r+b') as file:
+            _write_header(file, self.header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TrajectoryReader:
+    """ Read-only, zero-copy access to the frames of a trajectory file """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        written = self.header['frames_written']
+        for name, dtype, shape, offset in _get_layout(self.header):
+            block = np.memmap(path, dtype=dtype, mode='r', shape=shape, offset=offset)
+            setattr(self, name, block[:written] if name in ('positions', 'velocities', 'locked') else block)
+        if not self.header['velocities']:
+            self.velocities = None
+        if not self.header['locked']:
+            self.locked = None
+
+    def __len__(self):
+        return self.header['frames_written']
+
+    def get_step(self, frame):
+        """ Returns the simulation step at which a frame was recorded """
+        return self.header['start_frame'] + (frame + 1) * self.header['record_every']
+
+    def get_displacement(self, frame):
+        """ Returns the displacement of every particle from its initial position at the given frame """
+        d = self.positions[frame] - self.pos0
+        return np.sqrt(np.einsum('ij,ij->j', d, d))
+
+    def restore(self, simulator, frame=-1):
+        """ Loads a recorded frame into a simulator so that the simulation can be resumed from it
+
+        Velocities are needed for an exact resume of moving particles and are restored if recorded. The simulator
+        then updates the state it keeps outside of the particles (Simulator.load_particles, e.g. the tool).
+        :param simulator: the simulator, created with the same configuration as the recorded one
+        :type simulator: Simulator
+        :param frame: the frame to load
+        :type frame: int
+        """
+        frame = frame % len(self)
+        ps = simulator.particles
+        if len(ps) != self.header['count']:
+            raise ValueError("The simulator and the trajectory have a different number of particles.")
+        ps.pos[:] = self.positions[frame]
+        if self.velocities is not None:
+            ps.vel[:] = self.velocities[frame]
+        if self.locked is not None:
+            ps.locked[:] = self.locked[frame]
+        simulator.frame = self.get_step(frame)
+        simulator.load_particles()
@@ -0,0 +1,166 @@
+""" Video export that rasterises the particles with numpy and pipes raw RGB frames to ffmpeg
+
+The scene is drawn with a fixed orthographic projection (the default matplotlib 3D view) into
+an RGB buffer that is reused for every frame. Particles are drawn as flat discs, sized with
+Simulator.calc_size_3d, and the nearest particle wins every pixel. matplotlib is not used.
+"""
+import subprocess
+
+import numpy as np
+
+from .lod import LevelOfDetail
+
+BACKGROUND = (255, 255, 255)
+BOX_COLOUR = (160, 160, 160)
+
+
+class RasterRenderer:
+    """ Draws the particles of a simulator into a reused RGB numpy buffer """
+
+    def __init__(self, simulator, elev=30, azim=-60):
+        """
+        :param simulator: the simulator whose particles are drawn
+        :type simulator: Simulator
+        :param elev: elevation of the view in degrees
+        :type elev: float
+        :param azim: azimuth of the view in degrees
+        :type azim: float
+        """
+        self.simulator = simulator
+        self.simconf = simulator.simconf
+
+        # Even dimensions, as required by the yuv420p pixel format
+        self.size = 2 * (self.simconf.fig_size * self.simconf.dpi // 2)
+        self.buffer = np.empty((self.size, self.size, 3), dtype=np.uint8)
+
+        # Pixels per plot unit, derived from the marker scaling (marker diameter in points = sqrt(size))
+        self.scale = np.sqrt(simulator.calc_size_3d(1)) * self.simconf.dpi / 72 / 2
+
+        el, az = np.radians(elev), np.radians(azim)
+        self.projection = np.array([
+            [-np.sin(az), np.cos(az), 0],                                   # screen right
+            [-np.sin(el) * np.cos(az), -np.sin(el) * np.sin(az), np.cos(el)],  # screen up
+            [np.cos(el) * np.cos(az), np.cos(el) * np.sin(az), np.sin(el)],    # towards the viewer
+        ])
+        self.background = self.__get_background()
+        self.__stencils = {}
+        self.lod = None if self.simconf.lod == 'off' else LevelOfDetail(simulator, self.simconf.lod,
+                                                                          self.simconf.lod_pixels)
+
+    def project(self, pos):
+        """ Returns the pixel columns, rows and depths (larger is closer) of points with shape (3, count) """
+        centre = self.simconf.bbox_size / 2
+        screen = self.projection @ (pos - centre)
+        column = self.size / 2 + self.scale * screen[0]
+        row = self.size / 2 - self.scale * screen[1]
+        return column, row, screen[2]
+
+    def draw(self, pos=None):
+        """ Draws the particles into the buffer and returns it
+
+        :param pos: coordinates to draw with shape (3, count), defaults to the current positions
+        :type pos: numpy.ndarray
+        :return: the RGB buffer with shape (size, size, 3)
+        :rtype: numpy.ndarray
+        """
+        ps = self.simulator.particles
+        pos = ps.pos if pos is None else pos
+        radius, colour = ps.radius, ps.colour
+        if self.lod is not None:
+            pos, radius, colour = self.lod.reduce(pos)
+        column, row, depth = self.project(pos)
+        order = np.argsort(depth, kind='stable')  # far to near
+        pixel_radius = np.rint(np.sqrt(self.simulator.calc_size_3d(radius)) * self.simconf.dpi / 72 / 2)
+
+        # Every pixel is owned by the nearest particle that covers it (the highest depth rank)
+        owner = np.full(self.size * self.size, -1)
+        radius_sorted = pixel_radius[order]
+        for r in np.unique(radius_sorted):
+            rank = np.flatnonzero(radius_sorted == r)
+            dy, dx = self.__get_stencil(int(r))
+            cols = np.rint(column[order[rank]]).astype(int)[:, None] + dx
+            rows = np.rint(row[order[rank]]).astype(int)[:, None] + dy
+            inside = (cols >= 0) & (cols < self.size) & (rows >= 0) & (rows < self.size)
+            ranks = np.broadcast_to(rank[:, None], inside.shape)
+            np.maximum.at(owner, rows[inside] * self.size + cols[inside], ranks[inside])
+
+        colours = np.rint(255 * colour[order, :3]).astype(np.uint8)
+        flat = self.buffer.reshape(-1, 3)
+        flat[:] = self.background
+        covered = owner >= 0
+        flat[covered] = colours[owner[covered]]
+        return self.buffer
+
+    def __get_stencil(self, r):
+        """ Returns the row and column offsets of the pixels of a disc with radius r (cached) """
+        if r not in self.__stencils:
+            dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+            disc = dx * dx + dy * dy <= r * r
+            self.__stencils[r] = dy[disc], dx[disc]
+        return self.__stencils[r]
+
+    def __get_background(self):
+        """ Draws the edges of the bounding box on an empty image """
+        image = np.empty((self.size * self.size, 3), dtype=np.uint8)
+        image[:] = BACKGROUND
+        b = self.simconf.bbox_size
+        corners = [np.array(c) * b for c in np.ndindex(2, 2, 2)]
+        edges = [(p, q) for i, p in enumerate(corners) for q in corners[i + 1:] if np.sum(p != q) == 1]
+        samples = np.linspace(0, 1, 4 * self.size)
+        for p, q in edges:
+            column, row, _ = self.project(p[:, None] + (q - p)[:, None] * samples)
+            column, row = np.rint(column).astype(int), np.rint(row).astype(int)
+            inside = (column >= 0) & (column < self.size) & (row >= 0) & (row < self.size)
+            image[row[inside] * self.size + column[inside]] = BOX_COLOUR
+        return image
+
+
+class FFMpegPipe:
+    """ Streams raw RGB frames to an ffmpeg subprocess that encodes them to a video file """
+
+    def __init__(self, filename, size, framerate, ffmpeg='ffmpeg'):
+        self.process = subprocess.Popen(
+            [ffmpeg, '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{size}x{size}', '-r', str(framerate), '-i', '-',
+             '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', filename],
+            stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        """ Writes a (size, size, 3) uint8 frame without copying it """
+        self.process.stdin.write(memoryview(frame).cast('B'))
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self.process.returncode}.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def export_video(simulator, frames=None):
+    """ Exports the simulation to simconf.filename at simconf.framerate
+
+    :param simulator: the simulator to export
+    :type simulator: Simulator
+    :param frames: recorded positions with shape (frames, 3, count), or any iterable of (3, count)
+        positions. If None, the simulator is stepped once for every one of the simconf.total_frames frames
+    :type frames: numpy.ndarray | FramePipeline
+    """
+    renderer = RasterRenderer(simulator)
+    simconf = simulator.simconf
+    profiler = simulator.profiler
+    with FFMpegPipe(simconf.filename, renderer.size, simconf.framerate) as pipe:
+        stepping = frames is None
+        for pos in [None] * simconf.total_frames if stepping else frames:
+            if stepping:
+                simulator.step()
+            else:
+                profiler.start_frame()
+            with profiler.phase('render'):
+                image = renderer.draw(pos)
+            with profiler.phase('encode'):
+                pipe.write(image)